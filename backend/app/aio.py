@@ -0,0 +1,111 @@
+import asyncio
+import base64
+import functools
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from .config import get_settings
+
+T = TypeVar("T")
+
+# Below this many bytes, base64 runs inline; a thread hop would cost more than the work
+INLINE_LIMIT = 64 * 1024
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, get_settings().io_threads), thread_name_prefix="io")
+    return _executor
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking file or encoding work on the I/O thread pool.
+
+    The pool is separate from the default executor, which the image hashing
+    and preprocessing use, so slow disks do not queue behind CPU work.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_io() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+# ---- files ----
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write a file via a temp file and rename, so readers never see half of it.
+
+    The temp file gets a unique name in the same directory: writes run on
+    the I/O pool, and two of them to the same path must not share one.
+    Blocking; call it from a thread (e.g. through ``run_io``).
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates the file owner-only; keep the usual permissions
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_json_atomic(path: str, value: Any) -> None:
+    write_atomic(path, json.dumps(value).encode("utf-8"))
+
+
+async def read_bytes(path: str) -> bytes:
+    return await run_io(_read_bytes, path)
+
+
+# ---- base64 ----
+
+async def b64encode(data: bytes) -> str:
+    if len(data) <= INLINE_LIMIT:
+        return base64.b64encode(data).decode("ascii")
+    return await run_io(lambda: base64.b64encode(data).decode("ascii"))
+
+
+async def b64decode(text: str) -> bytes:
+    if len(text) <= INLINE_LIMIT:
+        return base64.b64decode(text)
+    return await run_io(base64.b64decode, text)
+
+
+async def to_data_url(image: bytes, mime: str = "image/png") -> str:
+    return f"data:{mime};base64,{await b64encode(image)}"
+
+
+def split_data_url(data_url: str) -> Tuple[str, str]:
+    """Return (mime type, base64 text) for a base64 data URL or bare base64 string."""
+    if data_url.startswith("data:") and "," in data_url:
+        meta, encoded = data_url.split(",", 1)
+        return meta[5:].split(";", 1)[0] or "image/png", encoded
+    return "image/png", data_url
+
+
+async def from_data_url(data_url: str) -> Tuple[str, bytes]:
+    """Return (mime type, raw bytes) for a base64 data URL or bare base64 string."""
+    mime, encoded = split_data_url(data_url)
+    return mime, await b64decode(encoded)
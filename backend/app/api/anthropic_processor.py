@@ -1,11 +1,38 @@
+import asyncio
+import base64
+import binascii
 import json
 import logging
 import httpx
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import re
+import time
+from datetime import datetime
+
+from .. import aio
+from ..config import get_settings
+from ..metrics import metrics
+from .extraction_cache import get_extraction_cache
+from .http_client import get_http_client
+from .image_hash import extraction_scope, get_near_duplicate_index, screenshot_hashes, drop_near_duplicates
+from .json_stream import IncrementalJSONParser, ItemSink, item_sink
+from .image_preprocess import (
+    ImageProfile,
+    preprocess_image,
+    PATIENT_GRID_PROFILE,
+    PATIENT_CHART_PROFILE,
+    ACCOUNT_TABLE_PROFILE,
+    SCHEDULE_PROFILE,
+    TITLE_BAR_PROFILE,
+)
 
 logger = logging.getLogger(__name__)
 
+ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+
+# USD per million (input, output) tokens, for the cost estimate in /metrics
+ANTHROPIC_PRICE_PER_MTOK = (3.0, 15.0)
+
 PATIENT_EXTRACTION_PROMPT = """
 Analyze this screenshot of Open Dental "Select Patient" dialog.
 Extract all visible patient information from the table into this JSON format:
@@ -120,108 +147,208 @@ Return ONLY the JSON object, no additional text.
 """
 
 
-async def _call_anthropic(screenshot_base64: str, api_key: str, prompt: str) -> Dict[str, Any]:
+def _parse_model_json(text_response: str) -> Dict[str, Any]:
+    """Parse the JSON object out of a model text response."""
+    try:
+        return json.loads(text_response)
+    except json.JSONDecodeError:
+        # Try to extract JSON from markdown code blocks
+        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text_response, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(1))
+
+        # Try to find raw JSON object
+        json_match = re.search(r'\{.*\}', text_response, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+
+        logger.error(f"Could not parse JSON from response: {text_response[:500]}")
+        return {"error": "Could not parse response", "raw_response": text_response[:500]}
+
+
+def _preprocess_images(
+    images: List[Tuple[str, str]], image_bytes: List[bytes], profile: ImageProfile
+) -> List[Tuple[str, str]]:
+    """Run the preprocessing profile over decoded screenshots (blocking)."""
+    processed = []
+    for (media_type, _), data in zip(images, image_bytes):
+        media_type, data = preprocess_image(data, media_type, profile)
+        processed.append((media_type, base64.b64encode(data).decode("utf-8")))
+    return processed
+
+
+def _record_usage(usage: Dict[str, Any], labels: Dict[str, str]) -> None:
+    """Count tokens and estimated spend for one successful Messages API call."""
+    input_tokens = usage.get("input_tokens", 0) or 0
+    output_tokens = usage.get("output_tokens", 0) or 0
+    input_price, output_price = ANTHROPIC_PRICE_PER_MTOK
+    metrics.inc("anthropic_requests_total", outcome="ok", **labels)
+    metrics.inc("anthropic_tokens_total", input_tokens, direction="input", **labels)
+    metrics.inc("anthropic_tokens_total", output_tokens, direction="output", **labels)
+    metrics.inc(
+        "anthropic_cost_usd_total",
+        (input_tokens * input_price + output_tokens * output_price) / 1_000_000,
+        **labels,
+    )
+
+
+async def _stream_message(
+    client: httpx.AsyncClient,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    timeout: float,
+    sink: ItemSink,
+    labels: Dict[str, str],
+) -> Dict[str, Any]:
+    """POST a streaming Messages request, forwarding each completed array row to ``sink``.
+
+    Returns a dict shaped like the non-streaming response (text content and usage).
+    """
+    parser = IncrementalJSONParser()
+    parts: List[str] = []
+    usage: Dict[str, Any] = {}
+    started = time.perf_counter()
+    first_item = True
+
+    async with client.stream(
+        "POST", "/v1/messages", headers=headers, json={**payload, "stream": True}, timeout=timeout
+    ) as response:
+        if response.is_error:
+            await response.aread()
+            response.raise_for_status()
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[5:].strip())
+            event_type = event.get("type")
+
+            if event_type == "content_block_delta":
+                delta = event.get("delta", {})
+                if delta.get("type") != "text_delta":
+                    continue
+                text = delta.get("text", "")
+                parts.append(text)
+                for path, item in parser.feed(text):
+                    if first_item:
+                        metrics.observe("anthropic_first_item_seconds", time.perf_counter() - started, **labels)
+                        first_item = False
+                    await sink(path, item)
+            elif event_type == "message_start":
+                usage.update(event.get("message", {}).get("usage") or {})
+            elif event_type == "message_delta":
+                usage.update(event.get("usage") or {})
+            elif event_type == "error":
+                raise RuntimeError(event.get("error", {}).get("message", "Streaming error"))
+
+    return {"content": [{"type": "text", "text": "".join(parts)}], "usage": usage}
+
+
+async def _call_anthropic(
+    screenshot_base64: str,
+    api_key: str,
+    prompt: str,
+    profile: Optional[ImageProfile] = None,
+    reuse_near_duplicates: bool = True,
+) -> Dict[str, Any]:
     """Generic function to call Anthropic API with an image."""
+    return await _call_anthropic_multiple(
+        [screenshot_base64], api_key, prompt, timeout=60.0, profile=profile,
+        reuse_near_duplicates=reuse_near_duplicates,
+    )
 
-    # Handle both raw base64 and data URL format
-    if screenshot_base64.startswith("data:"):
-        parts = screenshot_base64.split(",", 1)
-        if len(parts) == 2:
-            image_data = parts[1]
-            media_type = "image/png"
-            if "jpeg" in parts[0]:
-                media_type = "image/jpeg"
-        else:
-            image_data = screenshot_base64
-            media_type = "image/png"
-    else:
-        image_data = screenshot_base64
-        media_type = "image/png"
 
-    headers = {
-        "x-api-key": api_key,
-        "anthropic-version": "2023-06-01",
-        "content-type": "application/json",
-    }
+async def extract_patient_data(screenshot_base64: str, api_key: str) -> Dict[str, Any]:
+    """Extract patient data from screenshot."""
+    logger.info("Sending patient screenshot to Anthropic for analysis...")
+    result = await _call_anthropic(screenshot_base64, api_key, PATIENT_EXTRACTION_PROMPT, PATIENT_GRID_PROFILE)
+    if "patients" in result:
+        logger.info(f"Successfully extracted {len(result.get('patients', []))} patients")
+    return result
 
-    payload = {
-        "model": "claude-sonnet-4-20250514",
-        "max_tokens": 4096,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": image_data,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt,
-                    },
-                ],
-            }
-        ],
-    }
 
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers=headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            result = response.json()
+PATIENT_GRID_SCROLLED_PROMPT = PATIENT_EXTRACTION_PROMPT.replace(
+    "Return ONLY the JSON object, no additional text.",
+    """NOTE: The table in this screenshot is scrolled horizontally, so some columns (possibly the names) are hidden.
+- Still include one entry per visible row, in on-screen order from top to bottom
+- Set fields for hidden columns to null
 
-            content = result.get("content", [])
-            if content and len(content) > 0:
-                text_response = content[0].get("text", "")
+Return ONLY the JSON object, no additional text.""",
+)
 
-                try:
-                    return json.loads(text_response)
-                except json.JSONDecodeError:
-                    # Try to extract JSON from markdown code blocks
-                    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text_response, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group(1))
 
-                    # Try to find raw JSON object
-                    json_match = re.search(r'\{.*\}', text_response, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group(0))
+async def extract_patient_grid(screenshot_base64: str, api_key: str, scrolled: bool = False) -> Dict[str, Any]:
+    """Extract the rows of one Select Patient grid screenshot.
 
-                    logger.error(f"Could not parse JSON from response: {text_response[:500]}")
-                    return {"error": "Could not parse response", "raw_response": text_response[:500]}
+    Never answered from the near-duplicate index: adjacent pages that share
+    most of their rows hash within a few bits of each other.
+    """
+    prompt = PATIENT_GRID_SCROLLED_PROMPT if scrolled else PATIENT_EXTRACTION_PROMPT
+    logger.info(f"Sending {'scrolled ' if scrolled else ''}patient grid screenshot to Anthropic for analysis...")
+    return await _call_anthropic(screenshot_base64, api_key, prompt, PATIENT_GRID_PROFILE, reuse_near_duplicates=False)
 
-            logger.error("Empty response from Anthropic")
-            return {"error": "Empty response from Anthropic"}
 
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Anthropic API error: {e.response.status_code} - {e.response.text}")
-        return {"error": f"API error: {e.response.status_code}"}
-    except Exception as e:
-        logger.error(f"Error calling Anthropic API: {e}")
-        return {"error": str(e)}
+SELECTED_PATIENT_PROMPT = """
+This is the top strip of an Open Dental window. The title bar names the currently selected patient,
+e.g. "Open Dental ... - Smith, Jane - PatNum: 1234".
 
+Return this JSON:
 
-async def extract_patient_data(screenshot_base64: str, api_key: str) -> Dict[str, Any]:
-    """Extract patient data from screenshot."""
-    logger.info("Sending patient screenshot to Anthropic for analysis...")
-    result = await _call_anthropic(screenshot_base64, api_key, PATIENT_EXTRACTION_PROMPT)
-    if "patients" in result:
-        logger.info(f"Successfully extracted {len(result.get('patients', []))} patients")
-    return result
+{
+  "patient_name": "<string exactly as shown, or null if no patient is selected>",
+  "patient_id": <int PatNum or null>
+}
+
+Return ONLY the JSON object, no additional text.
+"""
+
+
+async def read_selected_patient(screenshot_base64: str, api_key: str) -> Dict[str, Any]:
+    """Read the selected patient's name and PatNum from the Open Dental title bar.
+
+    Never answered from the near-duplicate index: title bars of two patients
+    differ only by the name.
+    """
+    return await _call_anthropic(
+        screenshot_base64, api_key, SELECTED_PATIENT_PROMPT, TITLE_BAR_PROFILE, reuse_near_duplicates=False
+    )
+
+
+def merge_patient_grids(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine the unscrolled and horizontally scrolled grid extractions.
+
+    Rows are matched by PatNum only; columns missing on the left are filled
+    from the matching right row. A right row without a match is appended as
+    its own row rather than joined by on-screen position, since one skipped
+    or extra row would shift every row after it onto the wrong patient.
+    """
+    if "error" in left and "error" in right:
+        return left
+    if "error" in left or not left:
+        return right
+    if "error" in right or not right:
+        return left
+
+    patients = [dict(patient) for patient in left.get("patients", [])]
+    by_id = {p["patient_id"]: p for p in patients if p.get("patient_id") is not None}
+
+    for row in right.get("patients", []):
+        patient_id = row.get("patient_id")
+        target = by_id.get(patient_id) if patient_id is not None else None
+        if target is None:
+            patients.append(dict(row))
+            continue
+        for key, value in row.items():
+            if target.get(key) is None and value is not None:
+                target[key] = value
+
+    return {"patients": patients, "total_count": len(patients)}
 
 
 async def extract_appointment_data(screenshot_base64: str, api_key: str) -> Dict[str, Any]:
     """Extract appointment data from screenshot."""
     logger.info("Sending appointment screenshot to Anthropic for analysis...")
-    result = await _call_anthropic(screenshot_base64, api_key, APPOINTMENT_EXTRACTION_PROMPT)
+    result = await _call_anthropic(screenshot_base64, api_key, APPOINTMENT_EXTRACTION_PROMPT, SCHEDULE_PROFILE)
     if "appointments" in result:
         logger.info(f"Successfully extracted {len(result.get('appointments', []))} appointments")
     return result
@@ -230,33 +357,88 @@ async def extract_appointment_data(screenshot_base64: str, api_key: str) -> Dict
 async def extract_report_data(screenshot_base64: str, api_key: str) -> Dict[str, Any]:
     """Extract report data from screenshot."""
     logger.info("Sending report screenshot to Anthropic for analysis...")
-    result = await _call_anthropic(screenshot_base64, api_key, REPORT_EXTRACTION_PROMPT)
+    result = await _call_anthropic(screenshot_base64, api_key, REPORT_EXTRACTION_PROMPT, ACCOUNT_TABLE_PROFILE)
     logger.info("Successfully extracted report data")
     return result
 
 
-async def _call_anthropic_multiple(screenshots: List[str], api_key: str, prompt: str) -> Dict[str, Any]:
-    """Call Anthropic API with multiple images."""
+async def _call_anthropic_multiple(
+    screenshots: List[str],
+    api_key: str,
+    prompt: str,
+    timeout: float = 90.0,
+    dedupe_frames: bool = False,
+    profile: Optional[ImageProfile] = None,
+    reuse_near_duplicates: bool = True,
+) -> Dict[str, Any]:
+    """Call Anthropic API with multiple images.
+
+    With dedupe_frames, screenshots that are near-identical to an earlier one
+    in the list are dropped before upload. A profile crops, downscales and
+    re-encodes each screenshot before upload. Without reuse_near_duplicates,
+    only the exact cache can answer without calling the model.
+    """
+
+    if not get_settings().image_preprocess_enabled:
+        profile = None
+    variant = profile.name if profile else ""
+
+    images = [aio.split_data_url(screenshot_base64) for screenshot_base64 in screenshots]
+    try:
+        image_bytes = list(await asyncio.gather(*(aio.b64decode(image_data) for _, image_data in images)))
+    except binascii.Error as e:
+        logger.error(f"Invalid screenshot data: {e}")
+        metrics.inc("anthropic_requests_total", outcome="invalid_image", profile=variant or "none")
+        return {"error": f"Invalid screenshot data: {e}"}
+
+    # Unchanged screenshots with the same prompt return the previous result
+    cache = get_extraction_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(image_bytes, prompt, ANTHROPIC_MODEL, variant)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for {len(screenshots)} screenshot(s)")
+            metrics.inc("extraction_cache_hits_total", kind="exact", profile=variant or "none")
+            return cached
+
+    # Near-identical screenshots (cursor blink, taskbar clock) reuse a prior result of the same run
+    index = get_near_duplicate_index()
+    scope = extraction_scope.get() if reuse_near_duplicates else None
+    hashes = None
+    namespace = None
+    if index is not None and (scope is not None or dedupe_frames):
+        try:
+            hashes = await asyncio.to_thread(screenshot_hashes, image_bytes)
+        except Exception as e:
+            logger.warning(f"Could not hash screenshots, skipping near-duplicate check: {e}")
+
+    if hashes is not None:
+        if scope is not None:
+            namespace = index.namespace(prompt + variant, ANTHROPIC_MODEL, scope)
+            reused = index.lookup(namespace, hashes)
+            if reused is not None:
+                logger.info(f"Reusing extraction for {len(screenshots)} near-identical screenshot(s)")
+                metrics.inc("extraction_cache_hits_total", kind="near_duplicate", profile=variant or "none")
+                return reused
+
+        if dedupe_frames:
+            kept = drop_near_duplicates(hashes, index.max_distance)
+            if len(kept) < len(images):
+                logger.info(f"Dropped {len(images) - len(kept)} near-duplicate screenshot(s)")
+                images = [images[i] for i in kept]
+                image_bytes = [image_bytes[i] for i in kept]
+
+    if profile is not None:
+        try:
+            images = await asyncio.to_thread(_preprocess_images, images, image_bytes, profile)
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed, uploading originals: {e}")
 
     content = []
 
     # Add all images
-    for screenshot_base64 in screenshots:
-        # Handle both raw base64 and data URL format
-        if screenshot_base64.startswith("data:"):
-            parts = screenshot_base64.split(",", 1)
-            if len(parts) == 2:
-                image_data = parts[1]
-                media_type = "image/png"
-                if "jpeg" in parts[0]:
-                    media_type = "image/jpeg"
-            else:
-                image_data = screenshot_base64
-                media_type = "image/png"
-        else:
-            image_data = screenshot_base64
-            media_type = "image/png"
-
+    for media_type, image_data in images:
         content.append({
             "type": "image",
             "source": {
@@ -279,7 +461,7 @@ async def _call_anthropic_multiple(screenshots: List[str], api_key: str, prompt:
     }
 
     payload = {
-        "model": "claude-sonnet-4-20250514",
+        "model": ANTHROPIC_MODEL,
         "max_tokens": 4096,
         "messages": [
             {
@@ -289,44 +471,46 @@ async def _call_anthropic_multiple(screenshots: List[str], api_key: str, prompt:
         ],
     }
 
+    labels = {"profile": variant or "none"}
+    # Stream when someone is listening for rows as they decode
+    sink = item_sink.get() if get_settings().anthropic_streaming else None
     try:
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers=headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            result = response.json()
-
-            content = result.get("content", [])
-            if content and len(content) > 0:
-                text_response = content[0].get("text", "")
-
-                try:
-                    return json.loads(text_response)
-                except json.JSONDecodeError:
-                    # Try to extract JSON from markdown code blocks
-                    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text_response, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group(1))
-
-                    # Try to find raw JSON object
-                    json_match = re.search(r'\{.*\}', text_response, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group(0))
-
-                    logger.error(f"Could not parse JSON from response: {text_response[:500]}")
-                    return {"error": "Could not parse response", "raw_response": text_response[:500]}
-
-            logger.error("Empty response from Anthropic")
-            return {"error": "Empty response from Anthropic"}
+        client = get_http_client()
+        with metrics.span("anthropic_request_duration_seconds", **labels):
+            if sink is not None:
+                result = await _stream_message(client, headers, payload, timeout, sink, labels)
+            else:
+                response = await client.post(
+                    "/v1/messages",
+                    headers=headers,
+                    json=payload,
+                    timeout=timeout,
+                )
+                response.raise_for_status()
+                result = response.json()
+        _record_usage(result.get("usage") or {}, labels)
+
+        content = result.get("content", [])
+        if content and len(content) > 0:
+            text_response = content[0].get("text", "")
+            parsed = _parse_model_json(text_response)
+            if "error" not in parsed:
+                if cache_key is not None:
+                    await cache.aset(cache_key, parsed)
+                if namespace is not None:
+                    index.add(namespace, hashes, parsed)
+            return parsed
+
+        logger.error("Empty response from Anthropic")
+        return {"error": "Empty response from Anthropic"}
 
     except httpx.HTTPStatusError as e:
         logger.error(f"Anthropic API error: {e.response.status_code} - {e.response.text}")
+        metrics.inc("anthropic_requests_total", outcome=f"http_{e.response.status_code}", **labels)
         return {"error": f"API error: {e.response.status_code}"}
     except Exception as e:
         logger.error(f"Error calling Anthropic API: {e}")
+        metrics.inc("anthropic_requests_total", outcome="error", **labels)
         return {"error": str(e)}
 
 
@@ -381,7 +565,9 @@ Return ONLY the JSON object, no additional text.
 async def extract_patient_data_from_multiple(screenshots: List[str], api_key: str) -> Dict[str, Any]:
     """Extract patient data from multiple screenshots."""
     logger.info(f"Sending {len(screenshots)} patient screenshots to Anthropic for analysis...")
-    result = await _call_anthropic_multiple(screenshots, api_key, PATIENT_EXTRACTION_MULTIPLE_PROMPT)
+    result = await _call_anthropic_multiple(
+        screenshots, api_key, PATIENT_EXTRACTION_MULTIPLE_PROMPT, dedupe_frames=True, profile=PATIENT_GRID_PROFILE
+    )
     if "patients" in result:
         logger.info(f"Successfully extracted {len(result.get('patients', []))} patients from {len(screenshots)} screenshots")
     return result
@@ -641,13 +827,357 @@ Return ONLY the JSON object, no additional text.
 async def extract_patient_report_from_multiple(screenshots: List[str], api_key: str) -> Dict[str, Any]:
     """Extract comprehensive patient report from multiple tab screenshots."""
     logger.info(f"Sending {len(screenshots)} patient report screenshots to Anthropic for analysis...")
-    result = await _call_anthropic_multiple(screenshots, api_key, PATIENT_REPORT_EXTRACTION_PROMPT)
+    result = await _call_anthropic_multiple(
+        screenshots, api_key, PATIENT_REPORT_EXTRACTION_PROMPT, profile=ACCOUNT_TABLE_PROFILE
+    )
     if "patient_report" in result:
         patient_name = result.get("patient_report", {}).get("patient_info", {}).get("last_name", "Unknown")
         logger.info(f"Successfully extracted comprehensive report for patient: {patient_name}")
     return result
 
 
+FAMILY_TAB_EXTRACTION_PROMPT = """
+Analyze this screenshot of the Family tab in Open Dental for a single patient.
+
+Extract ALL visible information into this JSON format:
+
+{
+  "patient_info": {
+    "patient_id": <int or null>,
+    "last_name": "<string>",
+    "first_name": "<string>",
+    "middle_name": "<string or null>",
+    "preferred_name": "<string or null>",
+    "title": "<string or null>",
+    "salutation": "<string or null>",
+    "gender": "<Male/Female/Other or null>",
+    "birthdate": "<string MM/DD/YYYY or null>",
+    "age": <int or null>,
+    "ssn_last_four": "<string or null>",
+    "address": {
+      "street": "<string or null>",
+      "street2": "<string or null>",
+      "city": "<string or null>",
+      "state": "<string or null>",
+      "zip": "<string or null>"
+    },
+    "contact": {
+      "home_phone": "<string or null>",
+      "work_phone": "<string or null>",
+      "wireless_phone": "<string or null>",
+      "email": "<string or null>",
+      "preferred_contact_method": "<string or null>"
+    },
+    "billing_type": "<string or null>",
+    "primary_provider": "<string or null>",
+    "secondary_provider": "<string or null>"
+  },
+  "family_members": [
+    {
+      "name": "<string>",
+      "position": "<Head/Spouse/Child or null>",
+      "gender": "<string or null>",
+      "status": "<Patient/NonPatient or null>",
+      "age": "<string or null>",
+      "recall_due": "<string or null>"
+    }
+  ],
+  "insurance": {
+    "primary": {
+      "subscriber_name": "<string or null>",
+      "subscriber_id": "<string or null>",
+      "relationship_to_subscriber": "<string or null>",
+      "patient_id": "<string or null>",
+      "employer": "<string or null>",
+      "carrier": "<string or null>",
+      "group_name": "<string or null>",
+      "group_number": "<string or null>",
+      "plan_type": "<string or null>",
+      "fee_schedule": "<string or null>",
+      "benefit_period": "<string or null>",
+      "coverage_percentages": {
+        "diagnostic": "<string or null>",
+        "preventive": "<string or null>",
+        "restorative": "<string or null>",
+        "endodontics": "<string or null>",
+        "oral_surgery": "<string or null>",
+        "periodontics": "<string or null>",
+        "prosthodontics": "<string or null>",
+        "max_prosth": "<string or null>",
+        "implants": "<string or null>"
+      }
+    },
+    "secondary": {
+      "subscriber_name": "<string or null>",
+      "subscriber_id": "<string or null>",
+      "relationship_to_subscriber": "<string or null>",
+      "employer": "<string or null>",
+      "carrier": "<string or null>",
+      "group_name": "<string or null>",
+      "group_number": "<string or null>"
+    }
+  },
+  "recall": {
+    "type": "<string or null>",
+    "interval": "<string or null>",
+    "previous_date": "<string or null>",
+    "due_date": "<string or null>",
+    "scheduled_date": "<string or null>"
+  }
+}
+
+IMPORTANT:
+- Extract all patient demographic information from the left panel
+- Extract family members table (Name, Position, Gender, Status, Age, Recall Due)
+- Extract Primary and Secondary insurance details including all coverage percentages
+- Extract recall information
+- Use null for any field that is not visible or readable
+
+Return ONLY the JSON object, no additional text.
+"""
+
+
+ACCOUNT_TAB_EXTRACTION_PROMPT = """
+Analyze this screenshot of the Account tab in Open Dental for a single patient.
+
+Extract ALL visible information into this JSON format:
+
+{
+  "account": {
+    "transactions": [
+      {
+        "date": "<string MM/DD/YYYY>",
+        "patient": "<string>",
+        "provider": "<string or null>",
+        "code": "<string or null>",
+        "tooth": "<string or null>",
+        "description": "<string>",
+        "charges": <float or null>,
+        "credits": <float or null>,
+        "balance": <float or null>
+      }
+    ],
+    "claims": [
+      {
+        "date": "<string>",
+        "carrier": "<string>",
+        "amount": <float or null>,
+        "status": "<string or null>",
+        "estimated_payment": <float or null>,
+        "patient_portion": <float or null>
+      }
+    ],
+    "balances": {
+      "patient_balance": <float or null>,
+      "family_balances": [
+        {
+          "name": "<string>",
+          "balance": <float>
+        }
+      ],
+      "total_family_balance": <float or null>
+    }
+  }
+}
+
+IMPORTANT:
+- Extract all visible transactions from the Patient Account table
+- Extract claim information with status and amounts
+- Extract individual and family balances from the right panel
+- Extract currency values as numbers without $ symbol
+- Use null for any field that is not visible or readable
+
+Return ONLY the JSON object, no additional text.
+"""
+
+
+TX_PLAN_TAB_EXTRACTION_PROMPT = """
+Analyze this screenshot of the Tx Plan (Treatment Plan) tab in Open Dental for a single patient.
+
+Extract ALL visible information into this JSON format:
+
+{
+  "treatment_plans": {
+    "active_plans": [
+      {
+        "date": "<string or null>",
+        "status": "<Active/Inactive>",
+        "heading": "<string or null>",
+        "signed": "<Yes/No or null>"
+      }
+    ],
+    "procedures": [
+      {
+        "done": "<Yes/No or blank>",
+        "priority": "<int or null>",
+        "tooth": "<string or null>",
+        "surface": "<string or null>",
+        "code": "<string>",
+        "sub": "<string or null>",
+        "description": "<string>",
+        "fee": <float>,
+        "allowed": <float or null>,
+        "insurance_estimate": <float or null>,
+        "secondary_estimate": <float or null>,
+        "patient_portion": <float or null>
+      }
+    ],
+    "totals": {
+      "total_fee": <float or null>,
+      "total_allowed": <float or null>,
+      "total_insurance_estimate": <float or null>,
+      "total_patient_portion": <float or null>
+    },
+    "insurance_benefits": {
+      "primary": {
+        "annual_max": <float or null>,
+        "family_deductible": <float or null>,
+        "individual_deductible": <float or null>,
+        "deductible_remaining": <float or null>,
+        "insurance_used": <float or null>,
+        "pending": <float or null>,
+        "remaining": <float or null>
+      },
+      "secondary": {
+        "annual_max": <float or null>,
+        "deductible": <float or null>,
+        "insurance_used": <float or null>,
+        "pending": <float or null>,
+        "remaining": <float or null>
+      }
+    }
+  }
+}
+
+IMPORTANT:
+- Extract active treatment plans
+- Extract all procedures with their codes, fees, and insurance estimates
+- Extract subtotals and totals
+- Extract insurance benefits used/pending/remaining
+- Extract currency values as numbers without $ symbol
+- Use null for any field that is not visible or readable
+
+Return ONLY the JSON object, no additional text.
+"""
+
+
+APPTS_TAB_EXTRACTION_PROMPT = """
+Analyze this screenshot of the Appts (Appointments) tab in Open Dental for a single patient.
+
+Extract ALL visible information into this JSON format:
+
+{
+  "appointments": {
+    "past_appointments": [
+      {
+        "date": "<string>",
+        "time": "<string or null>",
+        "provider": "<string or null>",
+        "status": "<Completed/Broken/etc or null>",
+        "procedures": "<string or null>",
+        "notes": "<string or null>"
+      }
+    ],
+    "scheduled_appointments": [
+      {
+        "date": "<string>",
+        "time": "<string or null>",
+        "provider": "<string or null>",
+        "status": "<Scheduled/Confirmed or null>",
+        "procedures": "<string or null>",
+        "operatory": "<string or null>",
+        "notes": "<string or null>"
+      }
+    ],
+    "next_appointment": {
+      "date": "<string or null>",
+      "time": "<string or null>",
+      "provider": "<string or null>",
+      "procedures": "<string or null>"
+    }
+  }
+}
+
+IMPORTANT:
+- Extract appointment history
+- Extract scheduled/upcoming appointments
+- Note provider, time, status for each appointment
+- Use null for any field that is not visible or readable
+
+Return ONLY the JSON object, no additional text.
+"""
+
+
+# Report tabs in navigation order: (prompt, sections of patient_report it fills)
+REPORT_TABS = {
+    "family": (FAMILY_TAB_EXTRACTION_PROMPT, ["patient_info", "family_members", "insurance", "recall"]),
+    "account": (ACCOUNT_TAB_EXTRACTION_PROMPT, ["account"]),
+    "tx_plan": (TX_PLAN_TAB_EXTRACTION_PROMPT, ["treatment_plans"]),
+    "appts": (APPTS_TAB_EXTRACTION_PROMPT, ["appointments"]),
+}
+
+
+async def extract_report_tab(tab: str, screenshot: str, api_key: str) -> Dict[str, Any]:
+    """Extract the sections of a patient report visible on a single tab."""
+    prompt, _ = REPORT_TABS[tab]
+    logger.info(f"Sending {tab} tab screenshot to Anthropic for analysis...")
+    return await _call_anthropic_multiple([screenshot], api_key, prompt, profile=ACCOUNT_TABLE_PROFILE)
+
+
+def _summarize_patient_report(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive the cross-tab summary block from the merged sections."""
+    balances = (report.get("account") or {}).get("balances") or {}
+    claims = (report.get("account") or {}).get("claims") or []
+    treatment = report.get("treatment_plans") or {}
+    totals = treatment.get("totals") or {}
+    benefits = ((treatment.get("insurance_benefits") or {}).get("primary")) or {}
+    recall = report.get("recall") or {}
+
+    pending_claims = [
+        claim for claim in claims
+        if (claim.get("status") or "").strip().lower() not in ("received", "paid", "closed")
+    ]
+
+    return {
+        # The model may return an explicit null for the family total
+        "total_outstanding_balance": (
+            balances.get("total_family_balance")
+            if balances.get("total_family_balance") is not None
+            else balances.get("patient_balance")
+        ),
+        "pending_insurance_claims": len(pending_claims) if claims else None,
+        "pending_treatment_value": totals.get("total_fee"),
+        "next_recall_due": recall.get("due_date"),
+        "insurance_benefits_remaining": benefits.get("remaining"),
+    }
+
+
+def merge_patient_report(tab_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Assemble per-tab extraction results into the patient_report shape."""
+    report: Dict[str, Any] = {"generated_at": datetime.now().isoformat()}
+    errors = {}
+
+    for tab, (_, sections) in REPORT_TABS.items():
+        result = tab_results.get(tab)
+        if result is None:
+            continue
+        if "error" in result:
+            errors[tab] = result["error"]
+            continue
+        for section in sections:
+            if section in result:
+                report[section] = result[section]
+
+    if errors and len(errors) == len(tab_results):
+        return {"error": "; ".join(f"{tab}: {error}" for tab, error in errors.items())}
+
+    report["summary"] = _summarize_patient_report(report)
+    merged: Dict[str, Any] = {"patient_report": report}
+    if errors:
+        merged["tab_errors"] = errors
+    return merged
+
+
 PATIENT_CHART_EXTRACTION_PROMPT = """
 Analyze this screenshot from Open Dental showing the Chart tab for a single patient.
 
@@ -776,7 +1306,9 @@ Return ONLY the JSON object, no additional text.
 async def extract_patient_chart_from_multiple(screenshots: List[str], api_key: str) -> Dict[str, Any]:
     """Extract patient chart data from Chart tab screenshot."""
     logger.info(f"Sending {len(screenshots)} patient chart screenshot(s) to Anthropic for analysis...")
-    result = await _call_anthropic_multiple(screenshots, api_key, PATIENT_CHART_EXTRACTION_PROMPT)
+    result = await _call_anthropic_multiple(
+        screenshots, api_key, PATIENT_CHART_EXTRACTION_PROMPT, profile=PATIENT_CHART_PROFILE
+    )
     if "patient_chart" in result:
         patient_name = result.get("patient_chart", {}).get("patient_info", {}).get("name", "Unknown")
         logger.info(f"Successfully extracted chart data for patient: {patient_name}")
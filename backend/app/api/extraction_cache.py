@@ -0,0 +1,167 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .. import aio
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    value: Dict[str, Any]
+    expires_at: float
+
+
+class ExtractionCache:
+    """Content-addressed cache of model extraction results.
+
+    Keys are derived from the decoded screenshot bytes, the prompt text and
+    the model, so an unchanged dialog or chart tab maps to the same entry no
+    matter which run captured it. Entries live in an in-memory LRU and, when
+    ``disk_dir`` is set, in one JSON file per key so they survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, disk_dir: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(images: List[bytes], prompt: str, model: str, variant: str = "") -> str:
+        """Hash decoded image bytes, prompt identity, model and preprocessing variant into a cache key."""
+        digest = hashlib.sha256()
+        for image in images:
+            digest.update(hashlib.sha256(image).digest())
+        digest.update(hashlib.sha256(prompt.encode("utf-8")).digest())
+        digest.update(model.encode("utf-8"))
+        digest.update(variant.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached result, or None if missing or expired."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key, now)
+            if entry is not None:
+                self._store(key, entry)
+        return self._result(key, entry)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Cache a successful extraction result."""
+        entry = CacheEntry(value=copy.deepcopy(value), expires_at=time.time() + self.ttl)
+        self._store(key, entry)
+        if self.disk_dir:
+            self._write_disk(key, entry)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """``get`` for async callers: memory hits stay inline, disk reads go to the I/O pool."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self.disk_dir:
+            entry = await aio.run_io(self._read_disk, key, now)
+            if entry is not None:
+                self._store(key, entry)
+        return self._result(key, entry)
+
+    def _result(self, key: str, entry: Optional[CacheEntry]) -> Optional[Dict[str, Any]]:
+        if entry is None:
+            self.misses += 1
+            return None
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry.value)
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        """``set`` for async callers; the disk write runs on the I/O pool."""
+        entry = CacheEntry(value=copy.deepcopy(value), expires_at=time.time() + self.ttl)
+        self._store(key, entry)
+        if self.disk_dir:
+            await aio.run_io(self._write_disk, key, entry)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache file {path}: {e}")
+            self._remove(path)
+            return None
+
+        if record.get("expires_at", 0) <= now:
+            self._remove(path)
+            return None
+        return CacheEntry(value=record["value"], expires_at=record["expires_at"])
+
+    def _write_disk(self, key: str, entry: CacheEntry) -> None:
+        path = self._path(key)
+        try:
+            aio.write_json_atomic(path, {"expires_at": entry.expires_at, "value": entry.value})
+        except OSError as e:
+            logger.warning(f"Could not persist cache entry {key}: {e}")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process-wide extraction cache, or None when disabled."""
+    global _cache
+    settings = get_settings()
+    if not settings.extraction_cache_enabled:
+        return None
+    if _cache is None:
+        _cache = ExtractionCache(
+            max_entries=settings.extraction_cache_max_entries,
+            ttl=settings.extraction_cache_ttl,
+            disk_dir=settings.extraction_cache_dir,
+        )
+    return _cache
@@ -0,0 +1,39 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Optional
+
+
+@dataclass
+class BufferedFrame:
+    """A screenshot kept as raw image bytes; base64 is produced only when a consumer needs it."""
+    image: bytes
+    mime: str = "image/png"
+    timestamp: float = field(default_factory=time.time)
+
+
+class FrameBuffer:
+    """The last ``capacity`` screenshots of a run, newest last.
+
+    Frames come straight from the agent's ``computer_call_output`` items
+    and direct sandbox screenshots, so the latest screen never has to be
+    read back from the trajectory on disk. Raw bytes take about three
+    quarters of the space of the data URL they came from.
+    """
+
+    def __init__(self, capacity: int = 8):
+        self._frames: Deque[BufferedFrame] = deque(maxlen=max(1, capacity))
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def push(self, image: bytes, mime: str = "image/png") -> BufferedFrame:
+        frame = BufferedFrame(image, mime)
+        self._frames.append(frame)
+        return frame
+
+    def latest(self) -> Optional[BufferedFrame]:
+        return self._frames[-1] if self._frames else None
+
+    def clear(self) -> None:
+        self._frames.clear()
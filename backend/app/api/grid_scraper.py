@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .. import aio
+from ..config import get_settings
+from ..metrics import metrics
+from .anthropic_processor import merge_patient_grids
+from .image_hash import hamming, page_fingerprints
+from .patient_store import extract_grid_page, get_patient_store
+
+if TYPE_CHECKING:
+    from .workflow import WorkflowRunner
+
+logger = logging.getLogger(__name__)
+
+
+def _row_identity(patient: Dict[str, Any]) -> Tuple:
+    """Key used to stitch rows across overlapping pages."""
+    if patient.get("patient_id") is not None:
+        return ("id", patient["patient_id"])
+    return (
+        "name",
+        (patient.get("last_name") or "").lower(),
+        (patient.get("first_name") or "").lower(),
+        patient.get("wireless_phone") or patient.get("home_phone"),
+    )
+
+
+class PatientGridScraper:
+    """Pages through the whole Select Patient grid without the agent.
+
+    For each vertical page it screenshots the grid, scrolls right for the
+    hidden columns, screenshots again and scrolls back, then scrolls down.
+    Each page is extracted in the background while scrolling continues;
+    pages are merged left/right, stitched into the running table by row
+    identity, and every batch of newly seen patients is emitted at once.
+    Scrolling stops when a scroll no longer changes the screen. The
+    stitched table is written to the patient store at the end, unless a
+    page failed; the result then lists ``failed_pages`` and is not synced.
+    """
+
+    def __init__(self, runner: "WorkflowRunner"):
+        self.runner = runner
+        self.settings = get_settings()
+        self.interface = runner.computer.interface
+        self.patients: Dict[Tuple, Dict[str, Any]] = {}
+        # (page, row) where each patient was first seen, for top-to-bottom output order
+        self._order: Dict[Tuple, Tuple[int, int]] = {}
+        self.pages = 0
+        # 1-based numbers of pages whose extraction failed
+        self.failed_pages: List[int] = []
+        self.batches = 0
+        self._semaphore = asyncio.Semaphore(max(1, self.settings.patient_grid_concurrency))
+        self._lock = asyncio.Lock()
+
+    async def _capture(self) -> Tuple[str, int, str]:
+        """Screenshot the grid; returns its data URL, dHash and content digest."""
+        png = await self.interface.screenshot()
+        fingerprint, digest = await asyncio.to_thread(
+            page_fingerprints, png, self.settings.phash_mask_regions, self.settings.phash_hash_size
+        )
+        return await aio.to_data_url(png), fingerprint, digest
+
+    async def _settle(self) -> None:
+        await asyncio.sleep(self.settings.patient_grid_settle)
+
+    async def scrape(self) -> Dict[str, Any]:
+        settings = self.settings
+        size = await self.interface.get_screen_size()
+        x = int(settings.patient_grid_point[0] * size["width"])
+        y = int(settings.patient_grid_point[1] * size["height"])
+
+        # One task per page, so tasks[n] extracts page n
+        tasks: List[asyncio.Task] = []
+        try:
+            previous: Optional[int] = None
+            for page in range(settings.patient_grid_max_pages):
+                if not self.runner.is_running:
+                    break
+
+                left, fingerprint, left_digest = await self._capture()
+                if previous is not None and hamming(previous, fingerprint) <= settings.phash_max_distance:
+                    self.runner._log(f"Reached the end of the patient grid after {page} page(s)")
+                    break
+                previous = fingerprint
+
+                await self.interface.move_cursor(x, y)
+                await self.interface.scroll(settings.patient_grid_horizontal_scroll, 0)
+                await self._settle()
+                right, _, right_digest = await self._capture()
+                await self.interface.scroll(-settings.patient_grid_horizontal_scroll, 0)
+
+                tasks.append(asyncio.create_task(
+                    self._extract_page(page, (left, left_digest), (right, right_digest))
+                ))
+                self.runner._log(f"Captured grid page {page + 1}")
+
+                await self.interface.scroll_down(settings.patient_grid_scroll_clicks)
+                await self._settle()
+
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            # Don't leave extractions running against the API once the scrape is over
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+        for page, outcome in enumerate(outcomes):
+            if isinstance(outcome, BaseException):
+                self.runner._log(f"Grid page {page + 1} failed: {outcome}", level="warning")
+                self.failed_pages.append(page + 1)
+        self.failed_pages.sort()
+
+        if self.failed_pages and not self.pages:
+            raise RuntimeError(f"All {len(self.failed_pages)} grid page(s) failed to extract")
+
+        patients = [self.patients[identity] for identity in sorted(self.patients, key=self._order.get)]
+        result = {
+            "patients": patients,
+            "total_count": len(patients),
+            "pages": self.pages,
+            "failed_pages": self.failed_pages,
+            "complete": not self.failed_pages,
+            "sync": None,
+        }
+        if self.failed_pages:
+            self.runner._log(
+                f"Grid page(s) {', '.join(map(str, self.failed_pages))} failed; not syncing the partial grid",
+                level="warning",
+            )
+        else:
+            result["sync"] = await aio.run_io(get_patient_store().upsert_patients, patients)
+        return result
+
+    async def _extract_page(self, page: int, left: Tuple[str, str], right: Tuple[str, str]) -> None:
+        """Extract one page from its (data URL, content digest) screenshots."""
+        api_key = self.runner.settings.anthropic_api_key
+        async with self._semaphore:
+            left_result, right_result = await asyncio.gather(
+                extract_grid_page(f"page{page}_left", left[0], api_key, digest=left[1]),
+                extract_grid_page(f"page{page}_right", right[0], api_key, scrolled=True, digest=right[1]),
+            )
+        merged = merge_patient_grids(left_result, right_result)
+        if "error" in merged:
+            self.runner._log(f"Grid page {page + 1} failed: {merged['error']}", level="warning")
+            self.failed_pages.append(page + 1)
+            return
+
+        async with self._lock:
+            self.pages += 1
+            fresh = []
+            for position, row in enumerate(merged.get("patients", [])):
+                identity = _row_identity(row)
+                known = self.patients.get(identity)
+                if known is None:
+                    self.patients[identity] = dict(row)
+                    self._order[identity] = (page, position)
+                    fresh.append(row)
+                else:
+                    for key, value in row.items():
+                        if known.get(key) is None and value is not None:
+                            known[key] = value
+            metrics.inc("patient_grid_rows_total", len(fresh))
+
+            if fresh:
+                self.batches += 1
+                await self.runner.emit("patients", {
+                    "batch": self.batches,
+                    "page": page + 1,
+                    "items": fresh,
+                    "total_so_far": len(self.patients),
+                })
+
+
+async def scrape_patient_grid(runner: "WorkflowRunner") -> Optional[str]:
+    """Workflow step: scrape every page of the open Select Patient grid."""
+    scraper = PatientGridScraper(runner)
+    with metrics.span("cua_stage_duration_seconds", stage="grid_scrape", workflow=runner.workflow.name):
+        runner.step_results["patients"] = await scraper.scrape()
+    runner._log(f"Scraped {len(scraper.patients)} patients from {scraper.pages} page(s)")
+    return None
@@ -0,0 +1,53 @@
+import logging
+import httpx
+from typing import Optional
+
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create the shared client for the Anthropic Messages API."""
+    settings = get_settings()
+    limits = httpx.Limits(
+        max_connections=settings.anthropic_max_connections,
+        max_keepalive_connections=settings.anthropic_max_keepalive_connections,
+        keepalive_expiry=settings.anthropic_keepalive_expiry,
+    )
+    kwargs = dict(
+        base_url=settings.anthropic_base_url,
+        limits=limits,
+        timeout=httpx.Timeout(90.0, connect=10.0),
+    )
+
+    try:
+        return httpx.AsyncClient(http2=settings.anthropic_http2, **kwargs)
+    except ImportError:
+        # http2=True needs the optional "h2" package (httpx[http2])
+        logger.warning("HTTP/2 support not installed, falling back to HTTP/1.1 for Anthropic calls")
+        return httpx.AsyncClient(**kwargs)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide Anthropic client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_http_client() -> None:
+    """Open the shared client. Called on application startup."""
+    client = get_http_client()
+    logger.info(f"Anthropic HTTP client ready (base_url={client.base_url})")
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its pooled connections. Called on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,176 @@
+import copy
+import hashlib
+import io
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+from ..config import get_settings
+
+# (left, top, right, bottom) as fractions of the image size
+MaskRegion = Tuple[float, float, float, float]
+
+# Workflow run the current extraction belongs to. Near-duplicate results are
+# only reused within one run: screens of different patients can differ by
+# little more than the name, which a perceptual hash does not see.
+extraction_scope: ContextVar[Optional[str]] = ContextVar("extraction_scope", default=None)
+
+
+def _mask(img: Image.Image, masks: Sequence[MaskRegion]) -> Image.Image:
+    """Paint masked regions a flat gray, in place."""
+    if masks:
+        width, height = img.size
+        draw = ImageDraw.Draw(img)
+        fill = 128 if img.mode == "L" else (128,) * len(img.getbands())
+        for left, top, right, bottom in masks:
+            draw.rectangle(
+                [int(left * width), int(top * height), int(right * width), int(bottom * height)],
+                fill=fill,
+            )
+    return img
+
+
+def _difference_hash(gray: Image.Image, hash_size: int) -> int:
+    small = gray.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _pixel_digest(rgb: Image.Image) -> str:
+    digest = hashlib.sha256(f"{rgb.width}x{rgb.height}".encode("ascii"))
+    digest.update(rgb.tobytes())
+    return digest.hexdigest()
+
+
+def dhash(image_bytes: bytes, masks: Sequence[MaskRegion] = (), hash_size: int = 32) -> int:
+    """Difference hash of an encoded image.
+
+    Masked regions (e.g. the taskbar clock) are painted a flat gray before
+    hashing so changes inside them do not affect the result.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        gray = _mask(img.convert("L"), masks)
+    return _difference_hash(gray, hash_size)
+
+
+def content_digest(image_bytes: bytes, masks: Sequence[MaskRegion] = ()) -> str:
+    """SHA-256 of an image's pixels with masked regions painted flat.
+
+    Matches only when every unmasked pixel is identical, so unlike ``dhash``
+    it tells apart screens that differ by a few characters of text.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        rgb = _mask(img.convert("RGB"), masks)
+    return _pixel_digest(rgb)
+
+
+def page_fingerprints(image_bytes: bytes, masks: Sequence[MaskRegion] = (), hash_size: int = 32) -> Tuple[int, str]:
+    """``dhash`` and ``content_digest`` of one image, decoding it once."""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        rgb = _mask(img.convert("RGB"), masks)
+    return _difference_hash(rgb.convert("L"), hash_size), _pixel_digest(rgb)
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+def is_near_duplicate(a: int, b: int, max_distance: int) -> bool:
+    return hamming(a, b) <= max_distance
+
+
+class NearDuplicateIndex:
+    """Extraction results indexed by the perceptual hashes of their screenshots.
+
+    A lookup matches when every screenshot is within ``max_distance`` bits of
+    the corresponding screenshot of a stored entry, so frames that differ only
+    by a blinking cursor reuse the earlier result. Namespaces include the run
+    (see ``extraction_scope``) and entries expire after ``ttl`` seconds;
+    unchanged frames across runs are covered by the exact extraction cache.
+    """
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 256, ttl: float = 300.0):
+        self.max_distance = max_distance
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # Values are (stored_at, result)
+        self._entries: "OrderedDict[Tuple[str, Tuple[int, ...]], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def namespace(prompt: str, model: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\n{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for key in [key for key, (stored_at, _) in self._entries.items() if stored_at < cutoff]:
+            del self._entries[key]
+
+    def lookup(self, namespace: str, hashes: List[int]) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest stored result for these hashes, if any."""
+        self._expire()
+        best_key = None
+        best_distance = None
+        for key in self._entries:
+            entry_namespace, entry_hashes = key
+            if entry_namespace != namespace or len(entry_hashes) != len(hashes):
+                continue
+            distances = [hamming(a, b) for a, b in zip(entry_hashes, hashes)]
+            if max(distances) > self.max_distance:
+                continue
+            if best_distance is None or sum(distances) < best_distance:
+                best_key, best_distance = key, sum(distances)
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return copy.deepcopy(self._entries[best_key][1])
+
+    def add(self, namespace: str, hashes: List[int], result: Dict[str, Any]) -> None:
+        key = (namespace, tuple(hashes))
+        self._entries[key] = (time.time(), copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def screenshot_hashes(images: List[bytes]) -> List[int]:
+    """Perceptual hashes for decoded screenshots using the configured masks."""
+    settings = get_settings()
+    return [
+        dhash(image, masks=settings.phash_mask_regions, hash_size=settings.phash_hash_size)
+        for image in images
+    ]
+
+
+def drop_near_duplicates(hashes: List[int], max_distance: int) -> List[int]:
+    """Indices of frames to keep, skipping frames near-identical to an earlier kept one."""
+    kept: List[int] = []
+    for i, value in enumerate(hashes):
+        if any(is_near_duplicate(value, hashes[j], max_distance) for j in kept):
+            continue
+        kept.append(i)
+    return kept
+
+
+_index: Optional[NearDuplicateIndex] = None
+
+
+def get_near_duplicate_index() -> Optional[NearDuplicateIndex]:
+    """Return the process-wide perceptual-hash index, or None when disabled."""
+    global _index
+    settings = get_settings()
+    if not settings.phash_enabled:
+        return None
+    if _index is None:
+        _index = NearDuplicateIndex(max_distance=settings.phash_max_distance, ttl=settings.phash_ttl)
+    return _index
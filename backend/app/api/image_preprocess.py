@@ -0,0 +1,92 @@
+import io
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from .image_hash import MaskRegion
+
+# Long edge the model works at; larger uploads are downscaled server-side anyway
+DEFAULT_MAX_LONG_EDGE = 1568
+
+# Everything above the Windows taskbar
+ABOVE_TASKBAR: MaskRegion = (0.0, 0.0, 1.0, 0.96)
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    """How a screenshot is reduced before it is uploaded for one extraction prompt."""
+    name: str
+    crop: Optional[MaskRegion] = None
+    max_long_edge: Optional[int] = DEFAULT_MAX_LONG_EDGE
+    grayscale: bool = False
+    colors: Optional[int] = None
+    format: str = "PNG"
+    quality: int = 85
+
+
+# Grid dialogs are text only; placement varies, so only the taskbar is cropped.
+PATIENT_GRID_PROFILE = ImageProfile(
+    name="patient_grid", crop=ABOVE_TASKBAR, grayscale=True, colors=32, format="PNG"
+)
+
+# Tooth chart markings are color coded, so keep color and use lossy WebP.
+PATIENT_CHART_PROFILE = ImageProfile(
+    name="patient_chart", crop=ABOVE_TASKBAR, format="WEBP", quality=90
+)
+
+# Family / Account / Tx Plan / Appts tabs are tables and panels of text.
+ACCOUNT_TABLE_PROFILE = ImageProfile(
+    name="account_table", crop=ABOVE_TASKBAR, grayscale=True, colors=64, format="PNG"
+)
+
+# Appointment blocks are colored by type and provider.
+SCHEDULE_PROFILE = ImageProfile(
+    name="schedule", crop=ABOVE_TASKBAR, format="WEBP", quality=85
+)
+
+# Window title bar, which names the selected patient and their PatNum.
+TITLE_BAR_PROFILE = ImageProfile(
+    name="title_bar", crop=(0.0, 0.0, 1.0, 0.06), grayscale=True, colors=16, format="PNG"
+)
+
+_MEDIA_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def preprocess_image(image_bytes: bytes, media_type: str, profile: ImageProfile) -> Tuple[str, bytes]:
+    """Crop, downscale, reduce colors and re-encode a screenshot.
+
+    Returns (media_type, encoded bytes). The original image is returned when
+    re-encoding would not make it smaller.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        img = source.convert("RGB")
+
+    if profile.crop:
+        left, top, right, bottom = profile.crop
+        width, height = img.size
+        img = img.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+
+    if profile.max_long_edge and max(img.size) > profile.max_long_edge:
+        scale = profile.max_long_edge / max(img.size)
+        img = img.resize(
+            (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+            Image.LANCZOS,
+        )
+
+    if profile.grayscale:
+        img = img.convert("L")
+
+    if profile.colors and profile.format == "PNG":
+        img = img.quantize(colors=profile.colors)
+
+    out = io.BytesIO()
+    if profile.format == "PNG":
+        img.save(out, format="PNG", optimize=True)
+    else:
+        img.save(out, format=profile.format, quality=profile.quality)
+    encoded = out.getvalue()
+
+    if len(encoded) >= len(image_bytes):
+        return media_type, image_bytes
+    return _MEDIA_TYPES[profile.format], encoded
@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from ..config import get_settings
+from ..cua.sandbox_router import get_sandbox_router
+from ..metrics import metrics
+from .workflow import APIResult, LogEntry, Workflow, WorkflowRunner
+
+logger = logging.getLogger(__name__)
+
+LogCallback = Callable[[LogEntry], Awaitable[None]]
+EventCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a sandbox already has the maximum number of pending jobs."""
+
+
+@dataclass
+class Job:
+    """One queued workflow run."""
+    id: str
+    workflow: Workflow
+    params: Dict[str, Any]
+    client_id: str
+    sandbox_name: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[APIResult] = None
+    log_callback: Optional[LogCallback] = None
+    event_callback: Optional[EventCallback] = None
+    runner: Optional[WorkflowRunner] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the job finishes; returns False if the timeout elapsed first."""
+        try:
+            await asyncio.wait_for(self.done.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        logs = self.runner.logs if self.runner else []
+        info = {
+            "job_id": self.id,
+            "workflow": self.workflow.name,
+            "params": self.params,
+            "sandbox": self.sandbox_name,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": logs[-1].message if logs else None,
+            "partial_results": self.runner.events_sent if self.runner else 0,
+        }
+        if self.result:
+            info["data"] = self.result.data
+            info["error"] = self.result.error
+        return info
+
+
+class SandboxQueue:
+    """Pending jobs for one sandbox, served round-robin across clients.
+
+    Each client has its own FIFO; the scheduler takes one job from the
+    client at the head of the rotation and moves that client to the back,
+    so one caller submitting a burst cannot starve the others.
+    """
+
+    def __init__(self, name: str, max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self._clients: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._pending = 0
+        self._cond = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return self._pending
+
+    async def put(self, job: Job, force: bool = False) -> None:
+        async with self._cond:
+            if self._pending >= self.max_pending and not force:
+                raise QueueFullError(
+                    f"Sandbox '{self.name}' already has {self._pending} pending job(s)"
+                )
+            self._clients.setdefault(job.client_id, deque()).append(job)
+            self._pending += 1
+            self._cond.notify()
+
+    async def get(self) -> Job:
+        """Wait for the next job in client round-robin order."""
+        async with self._cond:
+            while not self._pending:
+                await self._cond.wait()
+            client_id, jobs = next(iter(self._clients.items()))
+            job = jobs.popleft()
+            del self._clients[client_id]
+            if jobs:
+                self._clients[client_id] = jobs
+            self._pending -= 1
+            return job
+
+    async def remove(self, job: Job) -> bool:
+        """Drop a job that has not been dispatched yet."""
+        async with self._cond:
+            jobs = self._clients.get(job.client_id)
+            if not jobs or job not in jobs:
+                return False
+            jobs.remove(job)
+            if not jobs:
+                del self._clients[job.client_id]
+            self._pending -= 1
+            return True
+
+    async def take_all(self) -> List[Job]:
+        """Remove and return every pending job, in dispatch order."""
+        async with self._cond:
+            jobs = []
+            while self._clients:
+                client_id, pending = next(iter(self._clients.items()))
+                jobs.append(pending.popleft())
+                del self._clients[client_id]
+                if pending:
+                    self._clients[client_id] = pending
+            self._pending = 0
+            return jobs
+
+    def position(self, job: Job) -> Optional[int]:
+        """0-based dispatch position of a queued job, following the rotation."""
+        queues = [list(jobs) for jobs in self._clients.values()]
+        order = 0
+        for depth in range(max((len(jobs) for jobs in queues), default=0)):
+            for jobs in queues:
+                if depth < len(jobs):
+                    if jobs[depth] is job:
+                        return order
+                    order += 1
+        return None
+
+
+class JobScheduler:
+    """Admits workflow runs into per-sandbox queues and dispatches them to workers.
+
+    Each sandbox gets ``workers_per_sandbox`` worker tasks, which bounds how
+    many agent runs drive that sandbox at once. Jobs without an explicit
+    sandbox are placed by the SandboxRouter; when the router drains a
+    failing sandbox its queued jobs move to the remaining ones. Finished
+    jobs are kept for ``result_ttl`` seconds so clients can poll for their
+    results.
+    """
+
+    def __init__(self, max_pending: int = 32, workers_per_sandbox: int = 1, result_ttl: float = 3600.0):
+        self.max_pending = max_pending
+        self.workers_per_sandbox = max(1, workers_per_sandbox)
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._queues: Dict[str, SandboxQueue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._active: Dict[str, int] = {}
+        self._running = False
+
+    async def start(self, sandbox_names: List[str]) -> None:
+        self._running = True
+        for name in sandbox_names:
+            self._ensure_sandbox(name)
+        logger.info(
+            f"[JobScheduler] Started {len(self._workers)} worker(s) for {len(self._queues)} sandbox(es)"
+        )
+
+    async def close(self) -> None:
+        """Stop workers and cancel every unfinished job."""
+        self._running = False
+        for job in list(self._jobs.values()):
+            if not job.finished:
+                await self.cancel(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        self._active.clear()
+        logger.info("[JobScheduler] Closed")
+
+    def _ensure_sandbox(self, name: str) -> SandboxQueue:
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = SandboxQueue(name, self.max_pending)
+            self._queues[name] = queue
+            for i in range(self.workers_per_sandbox):
+                self._workers.append(asyncio.create_task(self._worker(queue, i)))
+        return queue
+
+    async def submit(
+        self,
+        workflow: Workflow,
+        params: Optional[Dict[str, Any]] = None,
+        client_id: str = "anonymous",
+        log_callback: Optional[LogCallback] = None,
+        sandbox_name: Optional[str] = None,
+        event_callback: Optional[EventCallback] = None,
+    ) -> Job:
+        """Queue a workflow run. Raises ValueError for bad params, QueueFullError when saturated."""
+        if not self._running:
+            raise RuntimeError("Job scheduler is not running")
+
+        params = dict(params or {})
+        missing = [name for name in workflow.params if not params.get(name)]
+        if missing:
+            raise ValueError(f"Missing parameter(s) for {workflow.name}: {', '.join(missing)}")
+
+        self._prune()
+        if sandbox_name is None:
+            sandbox_name = get_sandbox_router().choose(self._loads(), params.get("patient_name"))
+        job = Job(
+            id=uuid.uuid4().hex,
+            workflow=workflow,
+            params=params,
+            client_id=client_id,
+            sandbox_name=sandbox_name,
+            log_callback=log_callback,
+            event_callback=event_callback,
+        )
+        await self._ensure_sandbox(sandbox_name).put(job)
+        self._jobs[job.id] = job
+        metrics.inc("cua_jobs_total", workflow=workflow.name, status=QUEUED)
+        logger.info(f"[JobScheduler] Queued job {job.id} ({workflow.name}) for client {client_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        if job.status != QUEUED:
+            return None
+        queue = self._queues.get(job.sandbox_name)
+        return queue.position(job) if queue else None
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        queue = self._queues.get(job.sandbox_name)
+        if job.status == QUEUED and queue and await queue.remove(job):
+            self._finish(job, CANCELLED, APIResult(status="error", error="Job cancelled"))
+        elif job.runner:
+            await job.runner.stop()
+        return job
+
+    def _loads(self) -> Dict[str, int]:
+        """Queued plus running jobs per sandbox."""
+        return {name: len(queue) + self._active.get(name, 0) for name, queue in self._queues.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "pending": {name: len(queue) for name, queue in self._queues.items()},
+            "running": dict(self._active),
+            "workers_per_sandbox": self.workers_per_sandbox,
+            "max_pending": self.max_pending,
+            "jobs": counts,
+        }
+
+    async def _worker(self, queue: SandboxQueue, index: int) -> None:
+        while True:
+            job = await queue.get()
+            if job.finished:
+                continue
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            metrics.observe(
+                "cua_stage_duration_seconds",
+                job.started_at - job.created_at,
+                stage="queue_wait",
+                workflow=job.workflow.name,
+            )
+            logger.info(f"[JobScheduler] Worker {queue.name}#{index} running job {job.id}")
+
+            self._active[queue.name] = self._active.get(queue.name, 0) + 1
+            try:
+                job.runner = WorkflowRunner(
+                    job.workflow,
+                    params=job.params,
+                    log_callback=job.log_callback,
+                    sandbox_name=job.sandbox_name,
+                    event_callback=job.event_callback,
+                )
+                result = await job.runner.run()
+            except asyncio.CancelledError:
+                if not job.finished:
+                    self._finish(job, CANCELLED, APIResult(status="error", error="Job cancelled"))
+                raise
+            except Exception as e:
+                logger.error(f"[JobScheduler] Job {job.id} crashed: {e}")
+                result = APIResult(status="error", error=str(e))
+            finally:
+                self._active[queue.name] -= 1
+
+            await self._record_sandbox_outcome(job, result)
+            if job.runner and job.runner.stop_requested:
+                self._finish(job, CANCELLED, result)
+            else:
+                self._finish(job, SUCCEEDED if result.status == "success" else FAILED, result)
+
+    async def _record_sandbox_outcome(self, job: Job, result: APIResult) -> None:
+        """Feed sandbox health back to the router."""
+        router = get_sandbox_router()
+        if job.runner and job.runner.sandbox_failed:
+            if router.record_failure(job.sandbox_name):
+                await self._rebalance(job.sandbox_name)
+            return
+        router.record_success(job.sandbox_name)
+
+    async def _rebalance(self, name: str) -> None:
+        """Move jobs queued on a drained sandbox to the healthy ones."""
+        queue = self._queues.get(name)
+        if queue is None:
+            return
+        router = get_sandbox_router()
+        for job in await queue.take_all():
+            target = router.choose(self._loads(), job.params.get("patient_name"))
+            job.sandbox_name = target
+            try:
+                await self._queues[target].put(job)
+            except QueueFullError:
+                job.sandbox_name = name
+                await queue.put(job, force=True)
+                continue
+            if target != name:
+                logger.info(f"[JobScheduler] Moved job {job.id} from drained {name} to {target}")
+
+    def _finish(self, job: Job, status: str, result: APIResult) -> None:
+        job.status = status
+        job.result = result
+        job.finished_at = time.time()
+        job.done.set()
+        metrics.inc("cua_jobs_total", workflow=job.workflow.name, status=status)
+        logger.info(f"[JobScheduler] Job {job.id} {status}")
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than result_ttl."""
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_scheduler: Optional[JobScheduler] = None
+
+
+def get_job_scheduler() -> JobScheduler:
+    """Return the process-wide job scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        settings = get_settings()
+        _scheduler = JobScheduler(
+            max_pending=settings.job_queue_max_pending,
+            workers_per_sandbox=settings.job_workers_per_sandbox,
+            result_ttl=settings.job_result_ttl,
+        )
+    return _scheduler
+
+
+async def start_job_scheduler() -> None:
+    """Start workers for every configured sandbox. Called on application startup."""
+    router = get_sandbox_router()
+    await router.start()
+    await get_job_scheduler().start(router.names)
+
+
+async def close_job_scheduler() -> None:
+    """Cancel outstanding jobs and stop workers. Called on application shutdown."""
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.close()
+        _scheduler = None
+    await get_sandbox_router().close()
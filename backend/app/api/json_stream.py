@@ -0,0 +1,93 @@
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Receives (path, item) for each completed array element, e.g. ("procedures", {...})
+ItemSink = Callable[[str, Any], Awaitable[None]]
+
+# Set by whoever wants partial results (the extraction pipeline); read by the Messages API call
+item_sink: ContextVar[Optional[ItemSink]] = ContextVar("item_sink", default=None)
+
+
+class IncrementalJSONParser:
+    """Finds array elements that are complete while a JSON document is still streaming.
+
+    ``feed`` takes the next chunk of model output and returns ``(path,
+    element)`` for every object element that closed in that chunk, where
+    ``path`` is the dotted key path of its array (``"patients"``,
+    ``"account.transactions"``). Only rows of arrays that are not themselves
+    inside an array element are reported. Text before the first ``{`` (e.g.
+    a code fence) is ignored, and each character is scanned once.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        # One frame per open container: [kind, key in parent, start offset, pending key]
+        self._stack: List[list] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        completed: List[Tuple[str, Any]] = []
+        if self._done or not chunk:
+            return completed
+
+        base = len(self._text)
+        self._text += chunk
+
+        for i, char in enumerate(chunk):
+            offset = base + i
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = self._text[self._string_start + 1:offset]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = offset
+            elif char == ":":
+                if self._stack and self._stack[-1][0] == "object":
+                    self._stack[-1][3] = self._last_string
+            elif char in "{[":
+                parent = self._stack[-1] if self._stack else None
+                key = parent[3] if parent and parent[0] == "object" else None
+                self._stack.append(["object" if char == "{" else "array", key, offset, None])
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                kind, _, start, _ = self._stack.pop()
+                if not self._stack:
+                    self._done = True
+                    break
+                if kind == "object" and self._is_row_array():
+                    try:
+                        element = json.loads(self._text[start:offset + 1])
+                    except ValueError:
+                        continue
+                    completed.append((self._path(), element))
+
+        return completed
+
+    def _is_row_array(self) -> bool:
+        """The innermost open container is an array not nested inside another array."""
+        return self._stack[-1][0] == "array" and all(frame[0] == "object" for frame in self._stack[:-1])
+
+    def _path(self) -> str:
+        return ".".join(frame[1] for frame in self._stack if frame[1])
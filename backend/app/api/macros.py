@@ -0,0 +1,344 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..aio import write_json_atomic
+from ..config import get_settings
+from .image_hash import hamming
+
+logger = logging.getLogger(__name__)
+
+# Actions that only look at the screen; they are not replayed
+PASSIVE_ACTIONS = {"screenshot"}
+
+# Params holding a person's name; Open Dental has separate last/first name fields,
+# so the agent may type only part of one
+NAME_PARAMS = {"patient_name"}
+
+PLACEHOLDER = re.compile(r"(?<!\{)\{\w+\}(?!\})")
+
+
+@dataclass
+class MacroAction:
+    """One recorded computer action and the screen it should lead to."""
+    action: Dict[str, Any]
+    # dHash of the screen after the action (None = no screenshot was seen)
+    checkpoint: Optional[int] = None
+    # Screen depends on the workflow params (e.g. search results for the typed name)
+    loose: bool = False
+
+
+@dataclass
+class Macro:
+    """A replayable action script for one workflow step."""
+    key: str
+    actions: List[MacroAction]
+    start_hash: Optional[int] = None
+    start_loose: bool = False
+    recorded_at: float = field(default_factory=time.time)
+    replays: int = 0
+
+    def to_json(self) -> Dict[str, Any]:
+        data = asdict(self)
+        # JSON numbers lose precision past 2**53; hashes are 1024-bit ints
+        data["start_hash"] = _hex(self.start_hash)
+        for action in data["actions"]:
+            action["checkpoint"] = _hex(action["checkpoint"])
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Macro":
+        actions = [
+            MacroAction(action=a["action"], checkpoint=_unhex(a.get("checkpoint")), loose=a.get("loose", False))
+            for a in data.get("actions", [])
+        ]
+        return cls(
+            key=data["key"],
+            actions=actions,
+            start_hash=_unhex(data.get("start_hash")),
+            start_loose=data.get("start_loose", False),
+            recorded_at=data.get("recorded_at", 0.0),
+            replays=data.get("replays", 0),
+        )
+
+    def types_literal_text(self) -> bool:
+        """True if any typed text is not made only of param placeholders."""
+        return any(
+            has_literal_text(step.action.get("text", ""))
+            for step in self.actions
+            if step.action.get("type") == "type"
+        )
+
+
+def _hex(value: Optional[int]) -> Optional[str]:
+    return format(value, "x") if value is not None else None
+
+
+def _unhex(value: Optional[str]) -> Optional[int]:
+    return int(value, 16) if value else None
+
+
+def has_literal_text(text: str) -> bool:
+    """True if typed text has letters or digits outside ``{param}`` placeholders."""
+    return any(char.isalnum() for char in PLACEHOLDER.sub("", text))
+
+
+def expand_params(params: Dict[str, Any]) -> Dict[str, str]:
+    """Params plus ``{name}_last`` and ``{name}_first`` for every name param.
+
+    "Smith, Jane" and "Jane Smith" both give last "Smith" and first "Jane",
+    so a macro that typed only the last name replays correctly for a
+    patient whose name was given in the other order.
+    """
+    expanded = {name: str(value) for name, value in params.items() if value}
+    for name in NAME_PARAMS:
+        value = expanded.get(name, "").strip()
+        if not value:
+            continue
+        if "," in value:
+            last, rest = (part.strip() for part in value.split(",", 1))
+            first = rest.split()[0] if rest.split() else ""
+        else:
+            words = value.split()
+            first, last = words[0], words[-1]
+        if last and last != value:
+            expanded[f"{name}_last"] = last
+        if first and first != value and first != last:
+            expanded[f"{name}_first"] = first
+    return expanded
+
+
+def macro_key(workflow: str, step: str, plan: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", step.lower()).strip("_")
+    return f"{workflow}__{slug}__{plan}"
+
+
+class MacroRecorder:
+    """Compiles the agent's computer calls for one step into a parameterized Macro.
+
+    Typed text containing a workflow param value (e.g. the patient name, or
+    just its last or first name) is stored as a ``{param}`` placeholder, and
+    every checkpoint after it is marked loose since the screen now depends on
+    that value. With ``strict``, a step that typed any other text is not
+    compiled: for patient selection, leftover text is most likely a name the
+    placeholders did not catch, which would be replayed for the next patient
+    and written to disk.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        params: Dict[str, Any],
+        start_hash: Optional[int],
+        start_loose: bool,
+        strict: bool = False,
+    ):
+        self.key = key
+        self.params = expand_params(params)
+        self.start_hash = start_hash
+        self.start_loose = start_loose
+        self.strict = strict
+        self.actions: List[MacroAction] = []
+        self._loose = start_loose
+        self.typed_literal = False
+
+    def on_action(self, action: Dict[str, Any]) -> None:
+        action_type = action.get("type")
+        if action_type in PASSIVE_ACTIONS:
+            return
+        action = {k: v for k, v in action.items() if k != "pending_safety_checks"}
+        if action_type == "type":
+            text, parameterized = self._parameterize(action.get("text", ""))
+            action["text"] = text
+            self._loose = self._loose or parameterized
+            self.typed_literal = self.typed_literal or has_literal_text(text)
+        self.actions.append(MacroAction(action=action, loose=self._loose))
+
+    def on_screenshot(self, screen_hash: int) -> None:
+        """Attach the latest screen to the most recent action as its checkpoint."""
+        if self.actions:
+            self.actions[-1].checkpoint = screen_hash
+
+    def _parameterize(self, text: str):
+        escaped = text.replace("{", "{{").replace("}", "}}")
+        parameterized = False
+        # Longest values first, so the full name wins over its last name
+        for name, value in sorted(self.params.items(), key=lambda item: len(item[1]), reverse=True):
+            pattern = re.compile(rf"(?<!\w){re.escape(value)}(?!\w)", re.IGNORECASE)
+            escaped, count = pattern.subn("{" + name + "}", escaped)
+            parameterized = parameterized or count > 0
+        return escaped, parameterized
+
+    def compile(self) -> Optional[Macro]:
+        if not self.actions:
+            return None
+        if self.strict and self.typed_literal:
+            logger.info(f"[MacroRecorder] Not keeping {self.key}: it typed text that is not a workflow param")
+            return None
+        return Macro(
+            key=self.key,
+            actions=self.actions,
+            start_hash=self.start_hash,
+            start_loose=self.start_loose,
+        )
+
+
+class MacroStore:
+    """Recorded macros in memory, mirrored to one JSON file per macro."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or None
+        self._macros: Dict[str, Macro] = {}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self) -> None:
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    macro = Macro.from_json(json.load(f))
+                self._macros[macro.key] = macro
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"[MacroStore] Skipping unreadable macro {name}: {e}")
+        logger.info(f"[MacroStore] Loaded {len(self._macros)} macro(s)")
+
+    def get(self, key: str) -> Optional[Macro]:
+        return self._macros.get(key)
+
+    def put(self, macro: Macro) -> None:
+        self._macros[macro.key] = macro
+        self._write(macro)
+
+    def delete(self, key: str) -> None:
+        self._macros.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _write(self, macro: Macro) -> None:
+        if not self.directory:
+            return
+        path = self._path(macro.key)
+        try:
+            write_json_atomic(path, macro.to_json())
+        except OSError as e:
+            logger.warning(f"[MacroStore] Failed to write {path}: {e}")
+
+    def keys(self) -> List[str]:
+        return list(self._macros)
+
+
+async def perform_action(interface: Any, action: Dict[str, Any], params: Dict[str, Any]) -> None:
+    """Execute one recorded agent action directly against a Computer interface.
+
+    ``params`` must already be expanded with ``expand_params``.
+    """
+    action_type = action.get("type")
+    x, y = action.get("x"), action.get("y")
+
+    if action_type == "click":
+        button = action.get("button", "left")
+        if button == "right":
+            await interface.right_click(x, y)
+        else:
+            await interface.left_click(x, y)
+    elif action_type == "double_click":
+        await interface.double_click(x, y)
+    elif action_type == "type":
+        await interface.type_text(action.get("text", "").format(**params))
+    elif action_type == "keypress":
+        keys = [key.lower() for key in action.get("keys", [])]
+        if len(keys) == 1:
+            await interface.press_key(keys[0])
+        elif keys:
+            await interface.hotkey(*keys)
+    elif action_type == "scroll":
+        if x is not None and y is not None:
+            await interface.move_cursor(x, y)
+        await interface.scroll(action.get("scroll_x", 0), action.get("scroll_y", 0))
+    elif action_type == "move":
+        await interface.move_cursor(x, y)
+    elif action_type == "drag":
+        path = [(point["x"], point["y"]) for point in action.get("path", [])]
+        await interface.drag(path)
+    elif action_type == "wait":
+        await asyncio.sleep(1.0)
+    else:
+        raise ValueError(f"Cannot replay action type: {action_type}")
+
+
+async def replay_macro(
+    macro: Macro,
+    interface: Any,
+    params: Dict[str, Any],
+    screen_hash: Callable[[], Awaitable[int]],
+    log: Callable[[str], None] = logger.info,
+) -> bool:
+    """Replay a macro, checking each checkpoint; returns False on divergence.
+
+    A checkpoint passes when the live screen is within ``macro_max_distance``
+    bits of the recorded one (``macro_loose_max_distance`` for screens that
+    depend on params). The screen is polled until ``macro_checkpoint_timeout``
+    to give dialogs time to load, just like the agent would wait.
+    """
+    settings = get_settings()
+    params = expand_params(params)
+
+    async def reached(expected: Optional[int], loose: bool) -> bool:
+        if expected is None:
+            return True
+        limit = settings.macro_loose_max_distance if loose else settings.macro_max_distance
+        deadline = time.monotonic() + settings.macro_checkpoint_timeout
+        while True:
+            distance = hamming(await screen_hash(), expected)
+            if distance <= limit:
+                return True
+            if time.monotonic() >= deadline:
+                log(f"Checkpoint diverged by {distance} bits (limit {limit})")
+                return False
+            await asyncio.sleep(settings.macro_action_delay)
+
+    if not await reached(macro.start_hash, macro.start_loose):
+        return False
+
+    for i, step in enumerate(macro.actions):
+        try:
+            await perform_action(interface, step.action, params)
+        except Exception as e:
+            log(f"Replay action {i + 1}/{len(macro.actions)} failed: {e}")
+            return False
+        await asyncio.sleep(settings.macro_action_delay)
+        if not await reached(step.checkpoint, step.loose):
+            log(f"Replay diverged at action {i + 1}/{len(macro.actions)} ({step.action.get('type')})")
+            return False
+    return True
+
+
+_store: Optional[MacroStore] = None
+
+
+def get_macro_store() -> Optional[MacroStore]:
+    """Return the process-wide macro store, or None when replay is disabled."""
+    global _store
+    settings = get_settings()
+    if not settings.macro_replay_enabled:
+        return None
+    if _store is None:
+        directory = settings.macro_dir or os.path.join(
+            os.path.dirname(__file__), "..", "..", "trajectories", "macros"
+        )
+        _store = MacroStore(directory)
+    return _store
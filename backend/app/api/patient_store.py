@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .. import aio
+from ..config import get_settings
+from ..metrics import metrics
+from .anthropic_processor import extract_patient_grid
+from .image_hash import content_digest
+
+logger = logging.getLogger(__name__)
+
+PATIENT_FIELDS = (
+    "first_name",
+    "last_name",
+    "age",
+    "wireless_phone",
+    "home_phone",
+    "work_phone",
+    "address",
+    "city",
+    "status",
+)
+
+SORTABLE = {"patient_id", "last_name", "first_name", "age", "city", "status", "updated_at"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id INTEGER PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    age INTEGER,
+    wireless_phone TEXT,
+    home_phone TEXT,
+    work_phone TEXT,
+    address TEXT,
+    city TEXT,
+    status TEXT,
+    fingerprint TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_patients_name ON patients (last_name COLLATE NOCASE, first_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_patients_status ON patients (status);
+CREATE INDEX IF NOT EXISTS idx_patients_city ON patients (city COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS grid_pages (
+    page_key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    extraction TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+"""
+
+
+def row_fingerprint(patient: Dict[str, Any]) -> str:
+    """Stable digest of a patient's visible fields, used to skip no-op writes."""
+    values = [str(patient.get(name) or "").strip() for name in PATIENT_FIELDS]
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+class PatientStore:
+    """SQLite index of patients extracted from the Select Patient grid.
+
+    Patients are keyed by PatNum. ``grid_pages`` keeps the extraction of
+    each grid screenshot together with its content digest, so a refresh
+    within the page TTL only sends pages whose pixels changed to the model.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---- patients ----
+
+    def upsert_patients(self, patients: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Insert or update patients by PatNum; rows without a PatNum are skipped."""
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        now = time.time()
+        with self._lock, self._conn:
+            for patient in patients:
+                patient_id = _as_int(patient.get("patient_id"))
+                if patient_id is None:
+                    counts["skipped"] += 1
+                    continue
+
+                fingerprint = row_fingerprint(patient)
+                existing = self._conn.execute(
+                    "SELECT fingerprint FROM patients WHERE patient_id = ?", (patient_id,)
+                ).fetchone()
+
+                if existing is None:
+                    self._conn.execute(
+                        f"INSERT INTO patients (patient_id, {', '.join(PATIENT_FIELDS)}, fingerprint, first_seen, last_seen, updated_at) "
+                        f"VALUES (?, {', '.join('?' for _ in PATIENT_FIELDS)}, ?, ?, ?, ?)",
+                        (patient_id, *_field_values(patient), fingerprint, now, now, now),
+                    )
+                    counts["inserted"] += 1
+                elif existing["fingerprint"] != fingerprint:
+                    assignments = ", ".join(f"{name} = ?" for name in PATIENT_FIELDS)
+                    self._conn.execute(
+                        f"UPDATE patients SET {assignments}, fingerprint = ?, last_seen = ?, updated_at = ? WHERE patient_id = ?",
+                        (*_field_values(patient), fingerprint, now, now, patient_id),
+                    )
+                    counts["updated"] += 1
+                else:
+                    self._conn.execute("UPDATE patients SET last_seen = ? WHERE patient_id = ?", (now, patient_id))
+                    counts["unchanged"] += 1
+        return counts
+
+    def get_patient(self, patient_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
+        return _patient_dict(row) if row else None
+
+    def query(
+        self,
+        search: Optional[str] = None,
+        status: Optional[str] = None,
+        city: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+        sort: str = "last_name",
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Filter and page through stored patients; returns (page, total matches)."""
+        clauses = []
+        args: List[Any] = []
+        if search:
+            like = f"%{search.strip()}%"
+            clauses.append(
+                "(last_name LIKE ? OR first_name LIKE ? OR wireless_phone LIKE ? "
+                "OR home_phone LIKE ? OR CAST(patient_id AS TEXT) = ?)"
+            )
+            args.extend([like, like, like, like, search.strip()])
+        if status:
+            clauses.append("status = ? COLLATE NOCASE")
+            args.append(status)
+        if city:
+            clauses.append("city = ? COLLATE NOCASE")
+            args.append(city)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        descending = sort.startswith("-")
+        column = sort.lstrip("-")
+        if column not in SORTABLE:
+            raise ValueError(f"Cannot sort by {column}")
+        collate = " COLLATE NOCASE" if column in ("last_name", "first_name", "city") else ""
+        order = f"ORDER BY {column}{collate} {'DESC' if descending else 'ASC'}, patient_id ASC"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM patients {where}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM patients {where} {order} LIMIT ? OFFSET ?",
+                [*args, limit, offset],
+            ).fetchall()
+        return [_patient_dict(row) for row in rows], total
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def last_synced(self) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute("SELECT MAX(last_seen) FROM patients").fetchone()[0]
+
+    # ---- grid pages ----
+
+    def get_page(self, page_key: str, max_age: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return (digest, extraction) recorded for a grid page within the last ``max_age`` seconds."""
+        cutoff = time.time() - max_age
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM grid_pages WHERE scraped_at < ?", (cutoff,))
+            row = self._conn.execute(
+                "SELECT fingerprint, extraction FROM grid_pages WHERE page_key = ?", (page_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row["fingerprint"], json.loads(row["extraction"])
+
+    def set_page(self, page_key: str, digest: str, extraction: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO grid_pages (page_key, fingerprint, extraction, scraped_at) VALUES (?, ?, ?, ?)",
+                (page_key, digest, json.dumps(extraction), time.time()),
+            )
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _field_values(patient: Dict[str, Any]) -> List[Any]:
+    values = [patient.get(name) for name in PATIENT_FIELDS]
+    values[PATIENT_FIELDS.index("age")] = _as_int(patient.get("age"))
+    return values
+
+
+def _patient_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {"patient_id": row["patient_id"], **{name: row[name] for name in PATIENT_FIELDS}}
+
+
+async def extract_grid_page(
+    page_key: str, screenshot: str, api_key: str, scrolled: bool = False, digest: Optional[str] = None
+) -> Dict[str, Any]:
+    """Extract one Select Patient grid screenshot, reusing the stored extraction if the page is unchanged.
+
+    Only an identical page (apart from the masked taskbar) is reused: rows of
+    different patients differ by a few characters, which a perceptual hash
+    does not see. Pass ``digest`` when the caller already computed it.
+    """
+    settings = get_settings()
+    store = get_patient_store()
+    if digest is None:
+        _, png = await aio.from_data_url(screenshot)
+        digest = await asyncio.to_thread(content_digest, png, settings.phash_mask_regions)
+
+    known = await aio.run_io(store.get_page, page_key, settings.patient_grid_page_ttl)
+    if known is not None and known[0] == digest:
+        logger.info(f"[PatientStore] Grid page {page_key} unchanged, skipping extraction")
+        metrics.inc("patient_store_pages_total", outcome="unchanged")
+        return known[1]
+
+    result = await extract_patient_grid(screenshot, api_key, scrolled=scrolled)
+    if "error" not in result:
+        await aio.run_io(store.set_page, page_key, digest, result)
+        metrics.inc("patient_store_pages_total", outcome="extracted")
+    return result
+
+
+_store: Optional[PatientStore] = None
+
+
+def get_patient_store() -> PatientStore:
+    """Return the process-wide patient store."""
+    global _store
+    if _store is None:
+        path = get_settings().patient_store_path or os.path.join(
+            os.path.dirname(__file__), "..", "..", "data", "patients.db"
+        )
+        _store = PatientStore(path)
+    return _store
+
+
+def close_patient_store() -> None:
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..metrics import metrics
+from .json_stream import item_sink
+
+logger = logging.getLogger(__name__)
+
+# Called with the stage's screenshots (in input order) and the Anthropic API key
+Extractor = Callable[[List[str], str], Awaitable[Dict[str, Any]]]
+
+# Called with (stage name, array path, row) for each row decoded before its stage finishes
+ItemCallback = Callable[[str, str, Any], Awaitable[None]]
+
+
+@dataclass
+class PipelineStage:
+    """An extraction that runs as soon as all of its named captures are available."""
+    name: str
+    inputs: List[str]
+    extract: Extractor
+    # Run with whatever inputs were captured if navigation ends before all arrive
+    allow_partial: bool = False
+
+
+class ExtractionPipeline:
+    """Overlaps model extraction with agent navigation.
+
+    Services ``feed`` each screenshot as it is captured; any stage whose
+    inputs are now complete starts in a background task immediately.
+    ``results`` waits for the started stages once navigation has ended.
+    """
+
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        api_key: str,
+        log: Optional[Callable[[str], None]] = None,
+        on_item: Optional[ItemCallback] = None,
+    ):
+        self.stages = stages
+        self.api_key = api_key
+        self.on_item = on_item
+        self.captures: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._log = log or logger.info
+
+    def feed(self, capture: str, screenshot: str) -> None:
+        """Record a captured screenshot and start every stage it completes."""
+        self.captures[capture] = screenshot
+        for stage in self.stages:
+            if stage.name in self._tasks:
+                continue
+            if all(name in self.captures for name in stage.inputs):
+                self._log(f"Starting extraction stage '{stage.name}' in background...")
+                screenshots = [self.captures[name] for name in stage.inputs]
+                self._tasks[stage.name] = asyncio.create_task(self._run_stage(stage, screenshots))
+
+    async def _run_stage(self, stage: PipelineStage, screenshots: List[str]) -> Dict[str, Any]:
+        if self.on_item:
+            # Each stage runs in its own task, so this only affects this stage's model calls
+            item_sink.set(lambda path, item: self.on_item(stage.name, path, item))
+        with metrics.span("cua_stage_duration_seconds", stage=f"extract_{stage.name}"):
+            return await stage.extract(screenshots, self.api_key)
+
+    @property
+    def started(self) -> List[str]:
+        return list(self._tasks)
+
+    async def results(self) -> Dict[str, Dict[str, Any]]:
+        """Wait for every started stage and return results by stage name."""
+        for stage in self.stages:
+            if stage.name in self._tasks or not stage.allow_partial:
+                continue
+            screenshots = [self.captures[name] for name in stage.inputs if name in self.captures]
+            if screenshots:
+                self._log(f"Starting extraction stage '{stage.name}' with {len(screenshots)} of {len(stage.inputs)} captures...")
+                self._tasks[stage.name] = asyncio.create_task(self._run_stage(stage, screenshots))
+
+        names = list(self._tasks)
+        outputs = await asyncio.gather(*(self._tasks[name] for name in names), return_exceptions=True)
+        results = {}
+        for name, output in zip(names, outputs):
+            if isinstance(output, BaseException):
+                logger.error(f"Extraction stage '{name}' failed: {output}")
+                output = {"error": str(output)}
+            results[name] = output
+        return results
+
+    def cancel(self) -> None:
+        """Cancel any stage still running."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
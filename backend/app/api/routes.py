@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import logging
 
+from .. import aio
+from .jobs import Job, QueueFullError, get_job_scheduler
+from .patient_store import get_patient_store
+from .workflows import WORKFLOWS
+
 router = APIRouter(prefix="/api", tags=["OpenDental APIs"])
 logger = logging.getLogger(__name__)
 
@@ -13,22 +18,46 @@ class APIResponse(BaseModel):
     error: Optional[str] = None
 
 
-@router.get("/health")
-async def api_health():
-    """API health check."""
-    return {"status": "healthy", "api": "opendental-cua"}
+class JobRequest(BaseModel):
+    workflow: str
+    params: Dict[str, Any] = {}
+    client_id: Optional[str] = None
 
 
-@router.post("/patients")
-async def get_patients():
-    """
-    Extract patient list from Open Dental via CUA.
-    This endpoint triggers the CUA agent to navigate Open Dental and extract patient data.
-    """
-    from .patient_service import PatientAPIService
+def _client_id(request: Request, explicit: Optional[str] = None) -> str:
+    """Fair-queuing key: explicit id, then X-Client-Id header, then caller address."""
+    if explicit:
+        return explicit
+    header = request.headers.get("x-client-id")
+    if header:
+        return header
+    return request.client.host if request.client else "anonymous"
+
+
+async def _submit(
+    request: Request,
+    workflow_name: str,
+    params: Optional[Dict[str, Any]] = None,
+    client_id: Optional[str] = None,
+) -> Job:
+    """Queue a workflow, mapping scheduler errors to HTTP status codes."""
+    workflow = WORKFLOWS.get(workflow_name)
+    if workflow is None:
+        raise HTTPException(status_code=404, detail=f"Unknown workflow: {workflow_name}")
+
+    try:
+        return await get_job_scheduler().submit(workflow, params=params, client_id=_client_id(request, client_id))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
 
-    service = PatientAPIService()
-    result = await service.run()
+
+async def _run(request: Request, workflow_name: str, params: Optional[Dict[str, Any]] = None) -> APIResponse:
+    """Queue a workflow and wait for its result within the HTTP request."""
+    job = await _submit(request, workflow_name, params)
+    await job.wait()
+    result = job.result
 
     if result.status == "error":
         raise HTTPException(status_code=500, detail=result.error)
@@ -40,47 +69,129 @@ async def get_patients():
     )
 
 
-@router.post("/patient_chart")
-async def get_patient_chart(patient_name: str):
+@router.get("/health")
+async def api_health():
+    """API health check."""
+    return {"status": "healthy", "api": "opendental-cua"}
+
+
+@router.get("/patients")
+async def list_patients(
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    city: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    sort: str = "last_name",
+):
     """
-    Extract patient chart with procedures and tooth conditions from Open Dental via CUA.
+    List patients from the local patient index without touching the sandbox.
 
     Query params:
-        patient_name: Name of the patient to search for (e.g., "Smith" or "Smith, Jane")
+        q: Matches last/first name, phone numbers or an exact PatNum
+        status, city: Exact (case-insensitive) filters
+        sort: Column to sort by, prefix with "-" for descending
     """
-    from .patient_chart_service import PatientChartAPIService
+    store = get_patient_store()
+    try:
+        patients, total = await aio.run_io(store.query, q, status, city, limit, offset, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {
+        "patients": patients,
+        "total_count": total,
+        "limit": limit,
+        "offset": offset,
+        "synced_at": await aio.run_io(store.last_synced),
+    }
+
+
+@router.get("/patients/{patient_id}")
+async def get_patient(patient_id: int):
+    """Look up one indexed patient by PatNum."""
+    patient = await aio.run_io(get_patient_store().get_patient, patient_id)
+    if patient is None:
+        raise HTTPException(status_code=404, detail=f"Unknown patient: {patient_id}")
+    return patient
 
-    service = PatientChartAPIService(patient_name=patient_name)
-    result = await service.run()
 
-    if result.status == "error":
-        raise HTTPException(status_code=500, detail=result.error)
+@router.post("/patients")
+async def get_patients(request: Request, full: bool = False):
+    """
+    Extract patient list from Open Dental via CUA.
+    This endpoint triggers the CUA agent to navigate Open Dental and refreshes the
+    local patient index. With the pipelined extraction mode or ``full``, grid pages
+    identical to one extracted within PATIENT_GRID_PAGE_TTL are not re-extracted.
+
+    Query params:
+        full: Page through the entire Select Patient grid instead of the first screen
+    """
+    return await _run(request, "patients_full" if full else "patients")
 
-    return APIResponse(
-        status=result.status,
-        data=result.data,
-        error=result.error
-    )
+
+@router.post("/patient_chart")
+async def get_patient_chart(request: Request, patient_name: str):
+    """
+    Extract patient chart with procedures and tooth conditions from Open Dental via CUA.
+
+    Query params:
+        patient_name: Name of the patient to search for (e.g., "Smith" or "Smith, Jane")
+    """
+    return await _run(request, "patient_chart", {"patient_name": patient_name})
 
 
 @router.post("/reports")
-async def get_reports(patient_name: str):
+async def get_reports(request: Request, patient_name: str):
     """
     Generate and extract detailed patient report from Open Dental via CUA.
 
     Query params:
         patient_name: Name of the patient to search for (e.g., "Smith" or "Smith, John")
     """
-    from .reports_service import ReportsAPIService
+    return await _run(request, "reports", {"patient_name": patient_name})
 
-    service = ReportsAPIService(patient_name=patient_name)
-    result = await service.run()
 
-    if result.status == "error":
-        raise HTTPException(status_code=500, detail=result.error)
+@router.post("/workflows/{workflow_name}")
+async def run_workflow(request: Request, workflow_name: str, params: Optional[Dict[str, Any]] = None):
+    """
+    Run any registered CUA workflow by name.
 
-    return APIResponse(
-        status=result.status,
-        data=result.data,
-        error=result.error
-    )
+    Body: JSON object of workflow parameters (e.g. {"patient_name": "Smith"})
+    """
+    return await _run(request, workflow_name, params)
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: Request, body: JobRequest):
+    """
+    Queue a workflow run and return immediately with a job id.
+
+    Body: {"workflow": "reports", "params": {"patient_name": "Smith"}, "client_id": "front-desk-1"}
+    Returns 429 when the sandbox queue is full.
+    """
+    job = await _submit(request, body.workflow, body.params, body.client_id)
+    return {**job.to_dict(), "position": get_job_scheduler().position(job)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0):
+    """
+    Poll a job. With ``wait`` (seconds, max 60) the request long-polls until the job finishes.
+    """
+    scheduler = get_job_scheduler()
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    if wait > 0 and not job.finished:
+        await job.wait(timeout=min(wait, 60.0))
+    return {**job.to_dict(), "position": scheduler.position(job)}
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or ask a running one to stop after its current agent turn."""
+    job = await get_job_scheduler().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..aio import write_json_atomic
+from ..config import get_settings
+from ..metrics import metrics
+from .image_hash import dhash, hamming
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+# Directories under the trajectory root that are not runs
+RESERVED = {"macros"}
+
+
+@dataclass
+class Frame:
+    """One screenshot saved by the agent during a run."""
+    path: str  # relative to the run directory
+    step: str  # directory the agent saved it under (one per agent turn)
+    timestamp: float
+    size: int
+    # dHash as hex, filled in when the run is compacted
+    hash: Optional[str] = None
+
+
+@dataclass
+class TrajectoryRun:
+    """Manifest of one run directory: its frames in the order they were written."""
+    run_id: str
+    path: str
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    compacted: bool = False
+    frames: List[Frame] = field(default_factory=list)
+    # mtime of every directory already indexed, so syncs only list changed ones
+    dir_mtimes: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return sum(frame.size for frame in self.frames)
+
+    def latest(self) -> Optional[str]:
+        """Absolute path of the newest frame."""
+        return os.path.join(self.path, self.frames[-1].path) if self.frames else None
+
+    def sync(self) -> int:
+        """Index frames written since the last sync; returns how many were added.
+
+        The agent writes PNGs into per-turn subdirectories. A directory is
+        only listed again when its mtime changed, so a sync after each step
+        touches the new turn directories instead of the whole tree.
+        """
+        known = {frame.path for frame in self.frames}
+        children: Dict[str, List[str]] = {}
+        for directory in self.dir_mtimes:
+            if directory != ".":
+                children.setdefault(os.path.dirname(directory) or ".", []).append(directory)
+
+        added: List[Frame] = []
+        pending = ["."]
+        while pending:
+            relative_dir = pending.pop()
+            directory = os.path.normpath(os.path.join(self.path, relative_dir))
+            try:
+                mtime = os.stat(directory).st_mtime
+            except FileNotFoundError:
+                continue
+            if self.dir_mtimes.get(relative_dir) == mtime:
+                pending.extend(children.get(relative_dir, []))
+                continue
+            self.dir_mtimes[relative_dir] = mtime
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    relative = os.path.relpath(entry.path, self.path)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(relative)
+                    elif entry.name.endswith(".png") and relative not in known:
+                        stat = entry.stat()
+                        added.append(Frame(relative, relative_dir, stat.st_mtime, stat.st_size))
+        added.sort(key=lambda frame: (frame.timestamp, frame.path))
+        self.frames.extend(added)
+        return len(added)
+
+    def to_json(self) -> Dict[str, object]:
+        data = asdict(self)
+        # The run is located by its directory, not by what the manifest says
+        data.pop("path")
+        return data
+
+    @classmethod
+    def from_json(cls, path: str, data: Dict[str, object]) -> "TrajectoryRun":
+        return cls(
+            run_id=data["run_id"],
+            path=path,
+            created_at=data.get("created_at", 0.0),
+            finished_at=data.get("finished_at"),
+            compacted=data.get("compacted", False),
+            frames=[Frame(**frame) for frame in data.get("frames", [])],
+            dir_mtimes=data.get("dir_mtimes", {}),
+        )
+
+
+class TrajectoryStore:
+    """Indexes run directories under the trajectory root and enforces retention.
+
+    Every run keeps a ``manifest.json`` listing its frames, so the latest
+    frame is a lookup instead of a recursive glob. A background sweep
+    compacts finished runs by deleting intermediate frames (all but the
+    last frame of each agent turn, and turns that look the same as the
+    one before), removes runs older than ``max_age``, and then removes
+    the oldest runs until the total is under ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_age: float = 7 * 24 * 3600.0,
+        max_bytes: int = 2 * 1024 ** 3,
+        compact_after: float = 3600.0,
+        sweep_interval: float = 600.0,
+    ):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.compact_after = compact_after
+        self.sweep_interval = sweep_interval
+        self.runs: Dict[str, TrajectoryRun] = {}
+        self._lock = threading.Lock()
+        self._sweep_task: Optional[asyncio.Task] = None
+        os.makedirs(root, exist_ok=True)
+
+    def load(self) -> None:
+        """Index existing run directories, building manifests for runs that predate them."""
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name in RESERVED or not os.path.isdir(path):
+                continue
+            run = self._read_manifest(name, path)
+            if run is None:
+                run = TrajectoryRun(run_id=name, path=path, created_at=os.path.getmtime(path))
+                run.sync()
+                run.finished_at = run.frames[-1].timestamp if run.frames else run.created_at
+                self._write_manifest(run)
+            with self._lock:
+                self.runs[name] = run
+        logger.info(f"[TrajectoryStore] Indexed {len(self.runs)} run(s)")
+
+    def _read_manifest(self, name: str, path: str) -> Optional[TrajectoryRun]:
+        try:
+            with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+                return TrajectoryRun.from_json(path, json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"[TrajectoryStore] Rebuilding unreadable manifest for {name}: {e}")
+            return None
+
+    def _write_manifest(self, run: TrajectoryRun) -> None:
+        path = os.path.join(run.path, MANIFEST)
+        try:
+            write_json_atomic(path, run.to_json())
+        except OSError as e:
+            logger.warning(f"[TrajectoryStore] Failed to write {path}: {e}")
+
+    def create_run(self, prefix: str) -> TrajectoryRun:
+        run_id = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        run = TrajectoryRun(run_id=run_id, path=os.path.join(self.root, run_id))
+        os.makedirs(run.path, exist_ok=True)
+        with self._lock:
+            self.runs[run_id] = run
+        return run
+
+    def latest_frame(self, run: TrajectoryRun) -> Optional[str]:
+        run.sync()
+        return run.latest()
+
+    def finish(self, run: TrajectoryRun) -> None:
+        """Index the run's last frames and persist its manifest."""
+        run.sync()
+        run.finished_at = time.time()
+        self._write_manifest(run)
+
+    # ---- retention ----
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.load)
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def close(self) -> None:
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"[TrajectoryStore] Sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def sweep(self) -> None:
+        now = time.time()
+        with self._lock:
+            finished = sorted(
+                (run for run in self.runs.values() if run.finished_at is not None),
+                key=lambda run: run.created_at,
+            )
+
+        for run in finished:
+            if now - run.created_at > self.max_age:
+                self._remove(run, reason="age")
+            elif not run.compacted and now - run.finished_at > self.compact_after:
+                self._compact(run)
+
+        with self._lock:
+            runs = sorted(self.runs.values(), key=lambda run: run.created_at)
+        total = sum(run.size for run in runs)
+        for run in runs:
+            if total <= self.max_bytes:
+                break
+            if run.finished_at is None:
+                continue
+            total -= run.size
+            self._remove(run, reason="size")
+
+    def _compact(self, run: TrajectoryRun) -> None:
+        """Keep the last frame of each turn, minus turns that look like the previous kept one."""
+        settings = get_settings()
+        last_in_step: Dict[str, Frame] = {}
+        for frame in run.frames:
+            last_in_step[frame.step] = frame
+        candidates = set(id(frame) for frame in last_in_step.values())
+
+        kept: List[Frame] = []
+        previous: Optional[int] = None
+        for i, frame in enumerate(run.frames):
+            keep = id(frame) in candidates
+            if keep:
+                try:
+                    with open(os.path.join(run.path, frame.path), "rb") as f:
+                        fingerprint = dhash(f.read(), settings.phash_mask_regions, settings.phash_hash_size)
+                except (OSError, ValueError):
+                    fingerprint = None
+                frame.hash = format(fingerprint, "x") if fingerprint is not None else None
+                # Always keep the final frame; drop turns that did not visibly change the screen
+                if (
+                    fingerprint is not None
+                    and previous is not None
+                    and i != len(run.frames) - 1
+                    and hamming(previous, fingerprint) <= settings.phash_max_distance
+                ):
+                    keep = False
+                elif fingerprint is not None:
+                    previous = fingerprint
+            if keep:
+                kept.append(frame)
+            else:
+                try:
+                    os.remove(os.path.join(run.path, frame.path))
+                except FileNotFoundError:
+                    pass
+
+        removed = len(run.frames) - len(kept)
+        run.frames = kept
+        run.compacted = True
+        self._write_manifest(run)
+        metrics.inc("trajectory_frames_removed_total", removed, reason="compaction")
+        logger.info(f"[TrajectoryStore] Compacted {run.run_id}: dropped {removed} frame(s), kept {len(kept)}")
+
+    def _remove(self, run: TrajectoryRun, reason: str) -> None:
+        shutil.rmtree(run.path, ignore_errors=True)
+        with self._lock:
+            self.runs.pop(run.run_id, None)
+        metrics.inc("trajectory_runs_removed_total", reason=reason)
+        logger.info(f"[TrajectoryStore] Removed {run.run_id} ({reason})")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            runs = list(self.runs.values())
+        return {
+            "runs": len(runs),
+            "active": sum(1 for run in runs if run.finished_at is None),
+            "frames": sum(len(run.frames) for run in runs),
+            "bytes": sum(run.size for run in runs),
+        }
+
+
+_store: Optional[TrajectoryStore] = None
+
+
+def get_trajectory_store() -> TrajectoryStore:
+    """Return the process-wide trajectory store."""
+    global _store
+    if _store is None:
+        settings = get_settings()
+        root = settings.trajectory_dir or os.path.join(os.path.dirname(__file__), "..", "..", "trajectories")
+        _store = TrajectoryStore(
+            root,
+            max_age=settings.trajectory_max_age_hours * 3600.0,
+            max_bytes=settings.trajectory_max_bytes,
+            compact_after=settings.trajectory_compact_after,
+            sweep_interval=settings.trajectory_sweep_interval,
+        )
+    return _store
+
+
+async def start_trajectory_store() -> None:
+    await get_trajectory_store().start()
+
+
+async def close_trajectory_store() -> None:
+    if _store is not None:
+        await _store.close()
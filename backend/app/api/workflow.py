@@ -0,0 +1,593 @@
+import asyncio
+import logging
+import os
+import certifi
+from typing import Awaitable, Callable, Optional, List, Dict, Any, Tuple
+from dataclasses import dataclass, field
+import time
+import uuid
+
+# Fix SSL certificate verification for macOS
+os.environ["SSL_CERT_FILE"] = certifi.where()
+os.environ["REQUESTS_CA_BUNDLE"] = certifi.where()
+
+from computer import Computer
+from agent import ComputerAgent
+from .. import aio
+from ..config import get_settings, Settings
+from ..cua.sandbox_pool import get_sandbox_pool, PooledSandbox
+from ..cua.ui_state import get_ui_state_store, patient_key, same_patient
+from ..metrics import metrics
+from .anthropic_processor import read_selected_patient
+from .frame_buffer import BufferedFrame, FrameBuffer
+from .image_hash import dhash, extraction_scope
+from .macros import Macro, MacroRecorder, get_macro_store, macro_key, replay_macro
+from .pipeline import ExtractionPipeline, PipelineStage
+from .trajectory_store import TrajectoryRun, get_trajectory_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LogEntry:
+    timestamp: float
+    message: str
+    level: str = "info"
+
+
+@dataclass
+class APIResult:
+    status: str  # "success", "error"
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    logs: List[LogEntry] = field(default_factory=list)
+    final_screenshot: Optional[str] = None
+
+
+@dataclass
+class WorkflowStep:
+    """One agent task. ``task`` is formatted with the workflow params."""
+    name: str
+    task: str
+    # Name under which the step's final screenshot is fed to the extraction pipeline
+    capture: Optional[str] = None
+    # View the UI is left on after this step (None = unknown)
+    module: Optional[str] = None
+    # Whether the step selects the workflow's patient_name
+    selects_patient: bool = False
+    # Shorter task used when the patient is already selected in the sandbox
+    resume_task: Optional[str] = None
+    # Code run instead of the agent; may add to ``runner.step_results`` and return a screenshot
+    run: Optional[Callable[["WorkflowRunner"], Awaitable[Optional[str]]]] = None
+
+
+@dataclass
+class Workflow:
+    """Declarative description of a CUA extraction endpoint."""
+    name: str
+    log_prefix: str
+    trajectory_prefix: str
+    instructions: str
+    steps: List[WorkflowStep]
+    # Extraction stages per mode; ``mode_setting`` names the Settings field choosing the mode
+    stages: Dict[str, List[PipelineStage]]
+    # Builds the response data from stage results
+    assemble: Callable[[Dict[str, Dict[str, Any]]], Dict[str, Any]]
+    mode_setting: Optional[str] = None
+    params: List[str] = field(default_factory=list)
+    describe_result: Callable[[Dict[str, Any]], str] = lambda data: "Extraction complete"
+    model: str = "cua/anthropic/claude-sonnet-4.5"
+    only_n_most_recent_images: int = 2
+    max_trajectory_budget: float = 15.0
+    # Per-step wall-clock budget in seconds (None = unbounded)
+    step_timeout: Optional[float] = None
+
+    def stages_for(self, settings: Settings) -> List[PipelineStage]:
+        mode = getattr(settings, self.mode_setting) if self.mode_setting else "default"
+        return self.stages[mode]
+
+
+class WorkflowRunner:
+    """Runs a Workflow against a pooled sandbox and extracts its captures."""
+
+    def __init__(
+        self,
+        workflow: Workflow,
+        params: Optional[Dict[str, Any]] = None,
+        log_callback=None,
+        sandbox_name: Optional[str] = None,
+        event_callback: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
+    ):
+        missing = [name for name in workflow.params if not (params or {}).get(name)]
+        if missing:
+            raise ValueError(f"Missing parameter(s) for {workflow.name}: {', '.join(missing)}")
+
+        self.workflow = workflow
+        self.params = params or {}
+        self.settings = get_settings()
+        self.sandbox_name = sandbox_name or self.settings.cua_sandbox_name
+        self.sandbox: Optional[PooledSandbox] = None
+        self.computer: Optional[Computer] = None
+        self.agent: Optional[ComputerAgent] = None
+        self.is_running = False
+        self.stop_requested = False
+        # Set when the sandbox itself (not the agent or extraction) failed
+        self.sandbox_failed = False
+        self.logs: List[LogEntry] = []
+        self.screenshots: List[str] = []
+        # Recent screens of this run as raw bytes; base64 only when a step's result needs it
+        self.frames = FrameBuffer(self.settings.frame_buffer_size)
+        self.pipeline: Optional[ExtractionPipeline] = None
+        self.log_callback = log_callback
+        self.event_callback = event_callback
+        # Results produced directly by coded steps, merged with the pipeline's
+        self.step_results: Dict[str, Dict[str, Any]] = {}
+        self.events_sent = 0
+        self.trajectory: Optional[TrajectoryRun] = None
+        self.trajectory_path: Optional[str] = None
+        # Tracked UI state of the sandbox during this run
+        self.ui_patient: Optional[str] = None
+        self.ui_module: Optional[str] = None
+        self.ui_trusted = True
+        # Macro compiled from the current agent step, and macros kept until the run succeeds
+        self.recorder: Optional[MacroRecorder] = None
+        self.recordings: List[Macro] = []
+
+    def _log(self, message: str, level: str = "info"):
+        """Add a log entry and optionally stream it."""
+        entry = LogEntry(timestamp=time.time(), message=message, level=level)
+        self.logs.append(entry)
+        logger.info(f"[{self.workflow.log_prefix}] {message}")
+        if self.log_callback:
+            asyncio.create_task(self.log_callback(entry))
+
+    async def emit(self, event: str, payload: Dict[str, Any]) -> None:
+        """Push a partial result (e.g. a batch of rows) to whoever is streaming this run."""
+        self.events_sent += 1
+        if self.event_callback:
+            try:
+                await self.event_callback(event, payload)
+            except Exception as e:
+                logger.warning(f"[{self.workflow.log_prefix}] Dropping {event} event: {e}")
+
+    async def _emit_item(self, stage: str, path: str, item: Any) -> None:
+        """Forward one row decoded by a still-running extraction stage."""
+        await self.emit("partial", {"stage": stage, "path": path, "index": self.events_sent, "item": item})
+
+    async def _latest_screenshot(self) -> Optional[str]:
+        """Latest screen of the run from memory, or from the saved trajectory as a last resort."""
+        frame = self.frames.latest()
+        if frame is None and self.trajectory:
+            with metrics.span("cua_stage_duration_seconds", stage="trajectory_scan", workflow=self.workflow.name):
+                latest = await aio.run_io(get_trajectory_store().latest_frame, self.trajectory)
+            if not latest:
+                return None
+            self._log(f"Found screenshot: {latest}")
+            frame = self.frames.push(await aio.read_bytes(latest))
+        if frame is None:
+            return None
+
+        with metrics.span("cua_stage_duration_seconds", stage="screenshot_encode", workflow=self.workflow.name):
+            return await aio.to_data_url(frame.image, frame.mime)
+
+    async def initialize(self) -> None:
+        """Lease a pre-connected Computer from the sandbox pool."""
+        self._log("Leasing sandbox from pool...")
+        with metrics.span("cua_stage_duration_seconds", stage="sandbox_lease", workflow=self.workflow.name):
+            self.sandbox = await get_sandbox_pool(self.sandbox_name).acquire()
+        self.computer = self.sandbox.computer
+
+    async def _screen(self) -> Tuple[BufferedFrame, int]:
+        """Grab the live screen straight from the sandbox, without the agent."""
+        png = await self.computer.interface.screenshot()
+        return self.frames.push(png), await self._hash_png(png)
+
+    async def _screen_hash(self) -> int:
+        return (await self._screen())[1]
+
+    async def _hash_png(self, png: bytes) -> int:
+        return await asyncio.to_thread(
+            dhash, png, self.settings.phash_mask_regions, self.settings.phash_hash_size
+        )
+
+    async def _restore_ui_state(self) -> None:
+        """Trust the sandbox's last known UI state if the live screen still matches it."""
+        self.ui_patient = None
+        self.ui_module = None
+        self.ui_trusted = True
+        if not self.settings.ui_state_reuse_enabled:
+            return
+
+        store = get_ui_state_store()
+        state = store.get(self.sandbox_name)
+        if not state.is_fresh(self.settings.ui_state_ttl):
+            return
+
+        try:
+            frame, screen_hash = await self._screen()
+        except Exception as e:
+            self._log(f"UI state check failed: {e}", level="warning")
+            return
+
+        if not state.matches_screen(screen_hash, self.settings.ui_state_max_distance):
+            self._log("Screen changed since the last run; using the full task plan")
+            store.invalidate(self.sandbox_name)
+            return
+
+        # Another patient's chart differs from this one by little more than the name,
+        # which the screen hash does not see; read the title bar before skipping selection
+        requested = patient_key(self.params.get("patient_name"))
+        if "patient_name" in self.workflow.params and state.patient is not None and state.patient == requested:
+            screenshot = await aio.to_data_url(frame.image, frame.mime)
+            matches, shown = await self._shows_patient(screenshot)
+            outcome = "ok" if matches else "wrong_patient"
+            metrics.inc("cua_ui_state_checks_total", workflow=self.workflow.name, outcome=outcome)
+            if not matches:
+                self._log(
+                    f"Sandbox shows {shown.get('patient_name') or 'an unknown patient'} instead of "
+                    f"{self.params.get('patient_name')}; using the full task plan",
+                    level="warning",
+                )
+                store.invalidate(self.sandbox_name)
+                return
+
+        self.ui_patient = state.patient
+        self.ui_module = state.module
+        self._log(f"Sandbox is still on {state.module or 'an unknown view'} for {state.patient or 'no patient'}")
+
+    async def _save_ui_state(self, failed: bool) -> None:
+        """Record where this run left the UI so the next run can skip navigation."""
+        if not self.settings.ui_state_reuse_enabled:
+            return
+
+        store = get_ui_state_store()
+        if failed or self.stop_requested or not self.ui_trusted:
+            store.invalidate(self.sandbox_name)
+            return
+
+        try:
+            _, screen_hash = await self._screen()
+        except Exception as e:
+            self._log(f"Could not snapshot UI state: {e}", level="warning")
+            store.invalidate(self.sandbox_name)
+            return
+        store.update(self.sandbox_name, self.ui_patient, self.ui_module, screen_hash)
+
+    def _plan_step(self, step: WorkflowStep) -> Tuple[str, Optional[str]]:
+        """Choose how to run a step: ("skip", None), ("resume", task) or ("full", task)."""
+        patient = patient_key(self.params.get("patient_name"))
+        on_patient = "patient_name" not in self.workflow.params or (
+            patient is not None and self.ui_patient == patient
+        )
+        if step.capture and step.module and on_patient and self.ui_module == step.module:
+            return "skip", None
+        if step.resume_task and on_patient and self.ui_patient is not None:
+            return "resume", step.resume_task.format(**self.params)
+        return "full", step.task.format(**self.params)
+
+    async def _execute_step(self, step: WorkflowStep) -> Optional[str]:
+        """Run one step by the cheapest route that works; returns its final screenshot.
+
+        In order of preference: capture directly if the UI is already there,
+        replay a recorded macro, or run the agent (recording a macro as it goes).
+        """
+        if step.run:
+            self._log(f"Starting {step.name}...")
+            screenshot = await step.run(self)
+            self.ui_module = step.module
+            return screenshot
+
+        plan, task = self._plan_step(step)
+        if plan == "skip":
+            self._log(f"{step.name}: UI already on {step.module}, capturing without the agent")
+            try:
+                frame, _ = await self._screen()
+                metrics.inc("cua_workflow_steps_total", workflow=self.workflow.name, plan=plan)
+                return await aio.to_data_url(frame.image, frame.mime)
+            except Exception as e:
+                self._log(f"Direct capture failed ({e}); running the step", level="warning")
+                plan, task = "full", step.task.format(**self.params)
+
+        metrics.inc("cua_workflow_steps_total", workflow=self.workflow.name, plan=plan)
+        if plan == "resume":
+            self._log(f"{step.name}: patient already selected, using shortened plan")
+
+        screenshot = None
+        macros = get_macro_store()
+        key = macro_key(self.workflow.name, step.name, plan)
+        macro = macros.get(key) if macros else None
+        if macro and step.selects_patient and macro.types_literal_text():
+            # Recorded before names were fully parameterized; it would type the old patient's name
+            self._log(f"{step.name}: dropping macro that types a literal name", level="warning")
+            await aio.run_io(macros.delete, key)
+            macro = None
+        if macro:
+            screenshot = await self._replay(step, macro)
+            if screenshot is not None and step.selects_patient and not await self._verify_patient(screenshot):
+                await aio.run_io(macros.delete, key)
+                screenshot = None
+            if screenshot is None:
+                task = (
+                    "A scripted replay of this step stopped partway. "
+                    "Check the current screen and continue from there.\n" + task
+                )
+        if screenshot is None:
+            # Only record from the step's real starting screen, not after a diverged replay
+            record_key = key if macros and not macro else None
+            screenshot = await self._run_task(task, step.name, record_key=record_key, strict=step.selects_patient)
+
+        if step.selects_patient:
+            self.ui_patient = patient_key(self.params.get("patient_name"))
+        self.ui_module = step.module
+        return screenshot
+
+    async def _shows_patient(self, screenshot: str) -> Tuple[bool, Dict[str, Any]]:
+        """Whether the title bar shows the requested patient, and what it shows."""
+        shown = await read_selected_patient(screenshot, self.settings.anthropic_api_key)
+        matches = "error" not in shown and same_patient(self.params.get("patient_name"), shown.get("patient_name"))
+        return matches, shown
+
+    async def _verify_patient(self, screenshot: str) -> bool:
+        """Check the title bar shows the requested patient before later steps trust the screen."""
+        matches, shown = await self._shows_patient(screenshot)
+        if matches:
+            return True
+        self._log(
+            f"Replay selected {shown.get('patient_name') or 'an unknown patient'} "
+            f"(PatNum {shown.get('patient_id')}) instead of {self.params.get('patient_name')}; falling back to the agent",
+            level="warning",
+        )
+        metrics.inc("cua_macro_replays_total", workflow=self.workflow.name, outcome="wrong_patient")
+        return False
+
+    async def _save_recordings(self) -> None:
+        """Keep the macros recorded during this run now that it succeeded."""
+        store = get_macro_store()
+        if not store or not self.recordings:
+            return
+        for macro in self.recordings:
+            await aio.run_io(store.put, macro)
+        self._log(f"Saved {len(self.recordings)} macro(s) for replay")
+        self.recordings = []
+
+    async def create_agent(self) -> None:
+        """Create the ComputerAgent with the workflow's instructions and budget."""
+        if not self.computer:
+            raise RuntimeError("Computer not initialized")
+
+        self.agent = ComputerAgent(
+            model=self.workflow.model,
+            tools=[self.computer],
+            only_n_most_recent_images=self.workflow.only_n_most_recent_images,
+            max_trajectory_budget=self.workflow.max_trajectory_budget,
+            instructions=self.workflow.instructions.format(**self.params).strip(),
+            trajectory_dir=self.trajectory_path,
+        )
+
+    async def _consume(self, messages: List[Dict[str, Any]]) -> Optional[BufferedFrame]:
+        """Stream one agent run, logging progress; returns the last streamed screenshot."""
+        last_screenshot = None
+        turn_started = time.perf_counter()
+
+        async for result in self.agent.run(messages):
+            if not self.is_running:
+                break
+
+            actions = [
+                item.get("action", {}).get("type", "unknown")
+                for item in result.get("output", [])
+                if item.get("type") == "computer_call"
+            ]
+            metrics.observe(
+                "cua_agent_turn_seconds",
+                time.perf_counter() - turn_started,
+                workflow=self.workflow.name,
+                action=actions[0] if len(actions) == 1 else ("multiple" if actions else "none"),
+            )
+            for action_type in actions:
+                metrics.inc("cua_computer_calls_total", workflow=self.workflow.name, action=action_type)
+            cost = (result.get("usage") or {}).get("response_cost")
+            if cost:
+                metrics.inc("cua_agent_cost_usd_total", cost, workflow=self.workflow.name)
+            turn_started = time.perf_counter()
+
+            for item in result.get("output", []):
+                item_type = item.get("type", "")
+
+                if item_type == "message":
+                    content = item.get("content", [])
+                    for block in content:
+                        text = block.get("text", "") or block.get("output_text", "")
+                        if text:
+                            self._log(f"Agent: {text[:200]}...")
+
+                elif item_type == "computer_call_output":
+                    output_content = item.get("content", [])
+                    for output_item in output_content:
+                        if output_item.get("type") in ["computer_screenshot", "input_image"]:
+                            image_url = output_item.get("image_url", "")
+                            if image_url:
+                                mime, image = await aio.from_data_url(image_url)
+                                last_screenshot = self.frames.push(image, mime)
+                                self._log("Screenshot captured")
+                                if self.recorder:
+                                    self.recorder.on_screenshot(await self._hash_png(last_screenshot.image))
+
+                elif item_type == "computer_call":
+                    action = item.get("action", {})
+                    action_type = action.get("type", "unknown")
+                    self._log(f"Executing: {action_type}")
+                    if self.recorder:
+                        self.recorder.on_action(action)
+
+        return last_screenshot
+
+    async def _start_recording(self, key: str, strict: bool = False) -> None:
+        """Compile the next agent step into a macro, starting from the live screen."""
+        try:
+            start_hash = await self._screen_hash()
+        except Exception as e:
+            self._log(f"Not recording a macro for this step: {e}", level="warning")
+            return
+        start_loose = "patient_name" in self.workflow.params and self.ui_patient is not None
+        self.recorder = MacroRecorder(key, self.params, start_hash, start_loose, strict=strict)
+
+    async def _replay(self, step: WorkflowStep, macro: Macro) -> Optional[str]:
+        """Replay a recorded macro for a step; returns its final screen, or None if it diverged."""
+        self._log(f"{step.name}: replaying recorded macro ({len(macro.actions)} actions)")
+        with metrics.span("cua_stage_duration_seconds", stage="macro_replay", workflow=self.workflow.name, step=step.name):
+            ok = await replay_macro(macro, self.computer.interface, self.params, self._screen_hash, self._log)
+        metrics.inc("cua_macro_replays_total", workflow=self.workflow.name, outcome="ok" if ok else "diverged")
+
+        store = get_macro_store()
+        if not ok:
+            self._log(f"{step.name}: replay diverged, falling back to the agent", level="warning")
+            await aio.run_io(store.delete, macro.key)
+            return None
+
+        macro.replays += 1
+        await aio.run_io(store.put, macro)
+        self._log(f"{step.name} replayed")
+        frame, _ = await self._screen()
+        return await aio.to_data_url(frame.image, frame.mime)
+
+    async def _run_task(
+        self, task: str, task_name: str, record_key: Optional[str] = None, strict: bool = False
+    ) -> Optional[str]:
+        """Run a single task and return the final screenshot.
+
+        With ``strict``, the recorded macro is only kept if everything it typed is a workflow param.
+        """
+        self._log(f"Starting {task_name}...")
+
+        if record_key:
+            await self._start_recording(record_key, strict=strict)
+
+        messages = [{"role": "user", "content": task}]
+        try:
+            with metrics.span("cua_stage_duration_seconds", stage="agent_step", workflow=self.workflow.name, step=task_name):
+                last_screenshot = await asyncio.wait_for(
+                    self._consume(messages), timeout=self.workflow.step_timeout
+                )
+        except asyncio.TimeoutError:
+            self._log(f"{task_name} exceeded its {self.workflow.step_timeout:.0f}s budget", level="warning")
+            last_screenshot = None
+            # The step may have stopped anywhere; don't trust the tracked UI state
+            self.ui_trusted = False
+            self.recorder = None
+
+        if self.recorder and self.is_running:
+            macro = self.recorder.compile()
+            if macro:
+                self.recordings.append(macro)
+        self.recorder = None
+
+        self._log(f"{task_name} completed")
+
+        if last_screenshot is not None:
+            return await aio.to_data_url(last_screenshot.image, last_screenshot.mime)
+        # No screenshot in this step's stream; fall back to the latest one seen
+        return await self._latest_screenshot()
+
+    async def run(self) -> APIResult:
+        """Execute every workflow step, then assemble the extracted data."""
+        self.is_running = True
+        self.logs = []
+        self.screenshots = []
+        self.frames.clear()
+        self.recordings = []
+        self.step_results = {}
+        run_started = time.perf_counter()
+        failed = False
+        # Extraction tasks started from here inherit the scope
+        scope_token = extraction_scope.set(uuid.uuid4().hex)
+
+        try:
+            self.pipeline = ExtractionPipeline(
+                self.workflow.stages_for(self.settings),
+                self.settings.anthropic_api_key,
+                log=self._log,
+                on_item=self._emit_item if self.event_callback else None,
+            )
+            await self.initialize()
+            self._log("Sandbox leased successfully")
+
+            # Setup trajectory path
+            self.trajectory = await aio.run_io(get_trajectory_store().create_run, self.workflow.trajectory_prefix)
+            self.trajectory_path = self.trajectory.path
+            self._log(f"Trajectory will be saved to: {self.trajectory_path}")
+
+            self._log("Creating CUA agent...")
+            await self.create_agent()
+
+            await self._restore_ui_state()
+
+            for step in self.workflow.steps:
+                if not self.is_running:
+                    break
+
+                screenshot = await self._execute_step(step)
+                if step.capture and screenshot:
+                    self.screenshots.append(screenshot)
+                    self.pipeline.feed(step.capture, screenshot)
+                    self._log(f"{step.name} screenshot captured ({step.capture})")
+
+            # ============ PROCESS SCREENSHOTS WITH ANTHROPIC ============
+            if self.screenshots or self.step_results:
+                self._log("Waiting for extraction stages to finish...")
+                with metrics.span("cua_stage_duration_seconds", stage="extraction_wait", workflow=self.workflow.name):
+                    results = {**await self.pipeline.results(), **self.step_results}
+                # Assembly may write to the patient store
+                data = await aio.run_io(self.workflow.assemble, results)
+                self._log(self.workflow.describe_result(data))
+                await self._save_recordings()
+
+                return APIResult(
+                    status="success",
+                    data=data,
+                    logs=self.logs,
+                    final_screenshot=self.screenshots[-1] if self.screenshots else None,
+                )
+            else:
+                self._log("No screenshots captured", level="error")
+                return APIResult(
+                    status="error",
+                    error="No screenshots captured during task execution",
+                    logs=self.logs,
+                )
+
+        except Exception as e:
+            failed = True
+            if self.sandbox is None:
+                self.sandbox_failed = True
+            error_msg = str(e)
+            self._log(f"Error: {error_msg}", level="error")
+            logger.error(f"{self.workflow.log_prefix} error: {e}")
+            return APIResult(status="error", error=error_msg, logs=self.logs)
+        finally:
+            extraction_scope.reset(scope_token)
+            self.is_running = False
+            if self.pipeline:
+                self.pipeline.cancel()
+            if self.trajectory:
+                await aio.run_io(get_trajectory_store().finish, self.trajectory)
+            metrics.observe(
+                "cua_stage_duration_seconds",
+                time.perf_counter() - run_started,
+                stage="workflow_total",
+                workflow=self.workflow.name,
+            )
+            if self.sandbox:
+                await self._save_ui_state(failed)
+                if not await get_sandbox_pool(self.sandbox_name).release(self.sandbox, failed=failed):
+                    self.sandbox_failed = True
+                self.sandbox = None
+                self.computer = None
+                self._log("Returned sandbox to pool")
+
+    async def stop(self) -> None:
+        """Stop the running task."""
+        self._log("Stopping task...")
+        self.stop_requested = True
+        self.is_running = False
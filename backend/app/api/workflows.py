@@ -0,0 +1,342 @@
+from typing import Any, Dict
+
+from .anthropic_processor import (
+    REPORT_TABS,
+    extract_appointment_data,
+    extract_patient_chart_from_multiple,
+    extract_patient_data_from_multiple,
+    extract_patient_report_from_multiple,
+    extract_report_tab,
+    merge_patient_grids,
+    merge_patient_report,
+)
+from .grid_scraper import scrape_patient_grid
+from .patient_store import extract_grid_page, get_patient_store
+from .pipeline import PipelineStage
+from .workflow import Workflow, WorkflowStep
+
+GUIDELINES = """
+IMPORTANT GUIDELINES:
+- Always wait for windows and dialogs to fully load before interacting
+- Look for loading indicators and wait for them to disappear
+- Verify each action by checking on-screen confirmation
+- If a button or element is not visible, try scrolling or looking for it
+- Take screenshots to verify your progress
+"""
+
+SELECT_PATIENT_STEPS = """
+Look at the current desktop. Open Open Dental if not already open, then:
+1. Wait for the application to fully load
+2. Click the "Select Patient" button on the top toolbar
+3. When the Select Patient dialog opens, wait for it to fully load
+4. In the search field, type "{patient_name}" to search for the patient
+5. Wait for search results to appear
+6. Double-click on the patient row to select them
+7. Wait for the patient record to load and the dialog to close
+"""
+
+# Replaces SELECT_PATIENT_STEPS when the sandbox is already on the patient
+PATIENT_ALREADY_SELECTED = """
+Continue from the current state. The patient "{patient_name}" is already selected in Open Dental;
+do not search for them again.
+"""
+
+
+def _assemble_patients(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    if "patients" in results:
+        data = results["patients"]
+    else:
+        data = merge_patient_grids(results.get("grid_left", {}), results.get("grid_right", {}))
+    if "error" not in data:
+        data["sync"] = get_patient_store().upsert_patients(data.get("patients", []))
+    return data
+
+
+def _assemble_report(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    if "report" in results:
+        return results["report"]
+    return merge_patient_report(results)
+
+
+PATIENTS = Workflow(
+    name="patients",
+    log_prefix="PatientAPI",
+    trajectory_prefix="patient_api",
+    instructions="""
+You are automating Open Dental to navigate and capture patient data.
+""" + GUIDELINES,
+    steps=[
+        WorkflowStep(
+            name="Task 1: Open Select Patient Dialog",
+            task="""
+Look at the current desktop. Open Open Dental if not already open, then:
+1. Wait for the application to fully load
+2. Click the "Select Patient" button on the top toolbar
+3. When the Select Patient dialog opens, wait for it to fully load
+4. Take a screenshot of the Select Patient dialog
+            """,
+            capture="grid_left",
+            module="select_patient",
+        ),
+        WorkflowStep(
+            name="Task 2: Scroll Right",
+            task="""
+Continue from the current state:
+1. In the Select Patient dialog, click on the bottom horizontal scrollbar
+            """,
+            capture="grid_right",
+            module="select_patient_scrolled",
+        ),
+        WorkflowStep(
+            name="Task 3: Close Dialog",
+            task="""
+Continue from the current state:
+1. Close the Select Patient dialog by clicking the X button or pressing Escape
+2. Wait for the dialog to close and return to the main Open Dental window
+            """,
+        ),
+    ],
+    mode_setting="patient_extraction_mode",
+    stages={
+        "pipelined": [
+            PipelineStage("grid_left", ["grid_left"], lambda s, key: extract_grid_page("grid_left", s[0], key)),
+            PipelineStage(
+                "grid_right",
+                ["grid_right"],
+                lambda s, key: extract_grid_page("grid_right", s[0], key, scrolled=True),
+            ),
+        ],
+        "combined": [
+            PipelineStage(
+                "patients",
+                ["grid_left", "grid_right"],
+                extract_patient_data_from_multiple,
+                allow_partial=True,
+            ),
+        ],
+    },
+    assemble=_assemble_patients,
+    describe_result=lambda data: f"Extracted {len(data.get('patients', []))} patients",
+)
+
+
+PATIENTS_FULL = Workflow(
+    name="patients_full",
+    log_prefix="PatientSyncAPI",
+    trajectory_prefix="patient_sync_api",
+    instructions="""
+You are automating Open Dental to open the patient list so every patient can be captured.
+""" + GUIDELINES,
+    steps=[
+        WorkflowStep(
+            name="Task 1: Open Select Patient Dialog",
+            task="""
+Look at the current desktop. Open Open Dental if not already open, then:
+1. Wait for the application to fully load
+2. Click the "Select Patient" button on the top toolbar
+3. When the Select Patient dialog opens, wait for it to fully load
+4. Clear the search fields so that all patients are listed
+5. Scroll the patient table to the very top and leftmost position
+6. Take a screenshot of the Select Patient dialog
+            """,
+            module="select_patient",
+        ),
+        WorkflowStep(
+            name="Task 2: Page Through Grid",
+            task="",
+            run=scrape_patient_grid,
+            module="select_patient",
+        ),
+        WorkflowStep(
+            name="Task 3: Close Dialog",
+            task="""
+Continue from the current state:
+1. Close the Select Patient dialog by clicking the X button or pressing Escape
+2. Wait for the dialog to close and return to the main Open Dental window
+            """,
+        ),
+    ],
+    stages={"default": []},
+    assemble=lambda results: results["patients"],
+    describe_result=lambda data: f"Synced {data.get('total_count', 0)} patients from {data.get('pages', 0)} page(s)",
+)
+
+
+PATIENT_CHART = Workflow(
+    name="patient_chart",
+    log_prefix="PatientChartAPI",
+    trajectory_prefix="patient_chart_api",
+    params=["patient_name"],
+    instructions="""
+You are automating Open Dental to extract patient chart data.
+
+PATIENT TO FIND: "{patient_name}"
+""" + GUIDELINES,
+    steps=[
+        WorkflowStep(
+            name="Task 1: Select Patient & Chart Tab",
+            task=SELECT_PATIENT_STEPS + """8. In the left navigation panel, click on "Chart"
+9. Wait for the Chart tab to fully load showing the tooth chart and procedures table
+10. Take a screenshot of the Chart tab showing the tooth chart, procedures, and patient info
+            """,
+            capture="chart",
+            module="chart",
+            selects_patient=True,
+            resume_task=PATIENT_ALREADY_SELECTED + """1. In the left navigation panel, click on "Chart"
+2. Wait for the Chart tab to fully load showing the tooth chart and procedures table
+3. Take a screenshot of the Chart tab showing the tooth chart, procedures, and patient info
+            """,
+        ),
+        WorkflowStep(
+            name="Task 2: Appts Tab",
+            task="""
+Continue from the current state:
+1. In the left navigation panel, click on "Appts" (Appointments)
+2. Wait for the Appointments tab to fully load
+            """,
+            module="appts",
+        ),
+    ],
+    stages={
+        "default": [PipelineStage("chart", ["chart"], extract_patient_chart_from_multiple)],
+    },
+    assemble=lambda results: results["chart"],
+    describe_result=lambda data: "Extracted patient chart data",
+)
+
+
+REPORTS = Workflow(
+    name="reports",
+    log_prefix="ReportsAPI",
+    trajectory_prefix="reports_api",
+    params=["patient_name"],
+    instructions="""
+You are automating Open Dental to extract detailed patient report data.
+
+PATIENT TO FIND: "{patient_name}"
+""" + GUIDELINES,
+    steps=[
+        WorkflowStep(
+            name="Task 1: Select Patient & Family Tab",
+            task=SELECT_PATIENT_STEPS + """8. In the left navigation panel, click on "Family"
+9. Wait for the Family tab to fully load
+10. Take a screenshot of the Family tab showing patient info, family members, and insurance
+            """,
+            capture="family",
+            module="family",
+            selects_patient=True,
+            resume_task=PATIENT_ALREADY_SELECTED + """1. In the left navigation panel, click on "Family"
+2. Wait for the Family tab to fully load
+3. Take a screenshot of the Family tab showing patient info, family members, and insurance
+            """,
+        ),
+        WorkflowStep(
+            name="Task 2: Account Tab",
+            task="""
+Continue from the current state:
+1. In the left navigation panel, click on "Account"
+2. Wait for the Account tab to fully load
+3. Take a screenshot showing the Patient Account transactions, balances, and claims
+            """,
+            capture="account",
+            module="account",
+        ),
+        WorkflowStep(
+            name="Task 3: Tx Plan Tab",
+            task="""
+Continue from the current state:
+1. In the left navigation panel, click on "Tx Plan" (Treatment Plan)
+2. Wait for the Treatment Plan tab to fully load
+3. Take a screenshot showing the treatment plans, procedures, fees, and insurance estimates
+            """,
+            capture="tx_plan",
+            module="tx_plan",
+        ),
+        WorkflowStep(
+            name="Task 4: Appts Tab",
+            task="""
+Continue from the current state:
+1. In the left navigation panel, click on "Appts" (Appointments)
+2. Wait for the Appointments tab to fully load
+3. Take a screenshot showing the patient's appointments history and scheduled appointments
+            """,
+            capture="appts",
+            module="appts",
+        ),
+    ],
+    mode_setting="reports_extraction_mode",
+    stages={
+        "per_tab": [
+            PipelineStage(tab, [tab], lambda s, key, tab=tab: extract_report_tab(tab, s[0], key))
+            for tab in REPORT_TABS
+        ],
+        "combined": [
+            PipelineStage(
+                "report",
+                list(REPORT_TABS),
+                extract_patient_report_from_multiple,
+                allow_partial=True,
+            ),
+        ],
+    },
+    assemble=_assemble_report,
+    describe_result=lambda data: "Extracted comprehensive patient report",
+)
+
+
+APPOINTMENTS = Workflow(
+    name="appointments",
+    log_prefix="AppointmentAPI",
+    trajectory_prefix="appointment_api",
+    instructions="""
+You are automating Open Dental to extract appointment data.
+
+TASK: Open the appointment schedule and capture today's appointments.
+
+STEPS:
+1. Look at the current screen
+2. If Open Dental is not open:
+   - Press Windows key and search for "Open Dental"
+   - Open the application
+3. Once Open Dental is open:
+   - Click on "Appointments" in the main navigation
+   - Or look for the schedule/calendar view
+4. When the appointment schedule opens:
+   - Make sure you're viewing today's date
+   - Wait for it to fully load
+   - Take a screenshot showing the appointment schedule
+   - The schedule should show patient names, times, procedures
+
+IMPORTANT:
+- Always wait for windows and dialogs to fully load
+- If Open Dental is already open, navigate to appointments
+- Take a clear screenshot of the schedule
+""",
+    steps=[
+        WorkflowStep(
+            name="Task 1: Appointment Schedule",
+            task="""
+Look at the current desktop. Open Open Dental if not already open, then:
+1. Navigate to the Appointments/Schedule view
+2. Make sure you're viewing today's appointments
+3. Take a screenshot of the appointment schedule.
+
+Take a final screenshot showing the appointments clearly.
+            """,
+            capture="schedule",
+            module="appointments",
+        ),
+    ],
+    stages={
+        "default": [PipelineStage("appointments", ["schedule"], lambda s, key: extract_appointment_data(s[0], key))],
+    },
+    assemble=lambda results: results["appointments"],
+    describe_result=lambda data: f"Extracted {len(data.get('appointments', []))} appointments",
+)
+
+
+# Endpoint name -> workflow
+WORKFLOWS: Dict[str, Workflow] = {
+    workflow.name: workflow
+    for workflow in (PATIENTS, PATIENTS_FULL, PATIENT_CHART, REPORTS, APPOINTMENTS)
+}
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List, Literal, Tuple
 import os
 from dotenv import load_dotenv
 
@@ -10,6 +11,127 @@ class Settings(BaseSettings):
     anthropic_api_key: str = ""
     cua_api_key: str = ""
     cua_sandbox_name: str = "windows-opendental"
+    # Comma-separated sandboxes to shard work across; defaults to cua_sandbox_name alone
+    cua_sandbox_names: str = ""
+
+    # Warm pool of pre-connected sandbox sessions
+    sandbox_pool_min_size: int = 1
+    sandbox_pool_max_size: int = 1
+    sandbox_pool_idle_timeout: float = 600.0
+    sandbox_pool_acquire_timeout: float = 300.0
+    sandbox_health_check_interval: float = 30.0
+
+    # Routing across sandboxes
+    sandbox_max_failures: int = 3
+    sandbox_drain_seconds: float = 120.0
+    # Extra queued jobs tolerated to keep a patient on the sandbox already showing them
+    sandbox_affinity_slack: int = 1
+
+    # Job queue in front of the sandboxes
+    job_queue_max_pending: int = 32
+    job_workers_per_sandbox: int = 1
+    job_result_ttl: float = 3600.0
+
+    # Shared HTTP client for the Anthropic Messages API
+    anthropic_base_url: str = "https://api.anthropic.com"
+    anthropic_http2: bool = True
+    anthropic_max_connections: int = 20
+    anthropic_max_keepalive_connections: int = 10
+    anthropic_keepalive_expiry: float = 30.0
+    # Stream extraction responses so decoded rows reach WebSocket clients early
+    anthropic_streaming: bool = True
+
+    # Per-connection WebSocket send queue
+    ws_send_queue_size: int = 64
+    # Undroppable messages queued past this mean the client stopped reading
+    ws_send_queue_hard_limit: int = 256
+    ws_send_timeout: float = 10.0
+    # Dirty-rectangle screenshot updates for clients connecting with ?delta=tiles
+    ws_frame_tile_size: int = 64
+    ws_keyframe_interval: int = 30
+    # Send a keyframe instead when more than this fraction of the screen changed
+    ws_delta_max_dirty_ratio: float = 0.5
+    # Messages replayed to viewers joining a run late, and how long finished runs stay joinable
+    ws_channel_history: int = 200
+    ws_channel_linger: float = 300.0
+
+    # Content-addressed cache of extraction results
+    extraction_cache_enabled: bool = True
+    extraction_cache_ttl: float = 3600.0
+    extraction_cache_max_entries: int = 256
+    extraction_cache_dir: str = ""
+
+    # Perceptual-hash matching of near-identical screenshots
+    phash_enabled: bool = True
+    phash_hash_size: int = 32
+    phash_max_distance: int = 6
+    # Seconds a near-duplicate result is reused; reuse never crosses workflow runs
+    phash_ttl: float = 300.0
+    # Fractional (left, top, right, bottom) regions ignored when hashing; default is the taskbar
+    phash_mask_regions: List[Tuple[float, float, float, float]] = [(0.0, 0.96, 1.0, 1.0)]
+
+    # Skip re-navigation when the sandbox is still on the requested patient/module
+    ui_state_reuse_enabled: bool = True
+    # Seconds a recorded UI state is trusted (someone may use the VM in between)
+    ui_state_ttl: float = 600.0
+    # dHash bits the live screen may differ from the recorded one and still match
+    ui_state_max_distance: int = 24
+
+    # Replay recorded agent steps as macros, falling back to the agent on divergence
+    macro_replay_enabled: bool = True
+    macro_dir: str = ""
+    macro_max_distance: int = 40
+    # Looser limit for screens that depend on params (e.g. search results for the typed name)
+    macro_loose_max_distance: int = 160
+    macro_action_delay: float = 0.5
+    macro_checkpoint_timeout: float = 8.0
+
+    # Full-table scrape of the Select Patient grid (patients_full workflow)
+    # Fractional screen point over the grid where scroll events are sent
+    patient_grid_point: Tuple[float, float] = (0.5, 0.5)
+    patient_grid_scroll_clicks: int = 10
+    patient_grid_horizontal_scroll: int = 15
+    patient_grid_max_pages: int = 200
+    patient_grid_settle: float = 0.6
+    # Pages extracted concurrently while scrolling continues
+    patient_grid_concurrency: int = 4
+
+    # SQLite index of extracted patients (defaults to backend/data/patients.db)
+    patient_store_path: str = ""
+    # Seconds a stored grid page extraction is reused for an identical screenshot
+    patient_grid_page_ttl: float = 3600.0
+
+    # Trajectory retention (defaults to backend/trajectories)
+    trajectory_dir: str = ""
+    trajectory_max_age_hours: float = 168.0
+    trajectory_max_bytes: int = 2 * 1024 ** 3
+    # Finished runs are compacted to one frame per agent turn after this long
+    trajectory_compact_after: float = 3600.0
+    trajectory_sweep_interval: float = 600.0
+    # Recent screenshots kept in memory per run
+    frame_buffer_size: int = 8
+    # Threads for file I/O and base64 work kept off the event loop
+    io_threads: int = 8
+    # Event-loop lag sampler and slow-callback watchdog (seconds)
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval: float = 0.1
+    loop_slow_callback_threshold: float = 0.1
+    # Slow callbacks kept for /admin/event-loop
+    loop_monitor_top: int = 20
+
+    # Crop / downscale / re-encode screenshots before model upload
+    image_preprocess_enabled: bool = True
+
+    # "per_tab" extracts each report tab concurrently as it is captured; "combined" sends all four at once
+    reports_extraction_mode: Literal["per_tab", "combined"] = "per_tab"
+    # "combined" sends both Select Patient screenshots in one call; "pipelined" extracts each as it is
+    # captured and joins the rows by PatNum, so rows without a visible PatNum are not merged
+    patient_extraction_mode: Literal["pipelined", "combined"] = "combined"
+
+    @property
+    def sandbox_names(self) -> List[str]:
+        names = [name.strip() for name in self.cua_sandbox_names.split(",") if name.strip()]
+        return names or [self.cua_sandbox_name]
 
     class Config:
         env_file = ".env"
@@ -13,35 +13,43 @@ os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
 from computer import Computer
 from agent import ComputerAgent
 from .message_types import (
-    WebSocketMessage,
     MessageType,
     ScreenshotPayload,
     StatusPayload,
     AgentMessagePayload,
 )
+from .sandbox_pool import get_sandbox_pool, PooledSandbox
 from ..config import get_settings
+from ..websocket.encoding import OutboundMessage, StaticMessage, outbound
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CONNECTING = StaticMessage(
+    MessageType.STATUS, StatusPayload(status="connecting", message="Connecting to Windows sandbox...")
+)
+RUNNING = StaticMessage(
+    MessageType.STATUS, StatusPayload(status="running", message="Agent started, launching Open Dental...")
+)
+COMPLETED = StaticMessage(
+    MessageType.AGENT_COMPLETE, StatusPayload(status="completed", message="Agent task completed successfully")
+)
+
 
 class CUAAgentService:
     def __init__(self):
         self.settings = get_settings()
+        self.sandbox: Optional[PooledSandbox] = None
         self.computer: Optional[Computer] = None
         self.agent: Optional[ComputerAgent] = None
         self.is_running = False
         self.step_count = 0
 
     async def initialize(self) -> None:
-        """Initialize the Computer connection to the cloud sandbox."""
-        logger.info(f"Initializing computer connection to sandbox: {self.settings.cua_sandbox_name}")
-        self.computer = Computer(
-            os_type="windows",
-            provider_type="cloud",
-            name=self.settings.cua_sandbox_name,
-            api_key=self.settings.cua_api_key,
-        )
+        """Lease a pre-connected Computer from the sandbox pool."""
+        logger.info(f"Leasing computer connection to sandbox: {self.settings.cua_sandbox_name}")
+        self.sandbox = await get_sandbox_pool().acquire()
+        self.computer = self.sandbox.computer
 
     async def create_agent(self) -> None:
         """Create the ComputerAgent with Claude model."""
@@ -72,36 +80,26 @@ YOUR TASK:
             """.strip(),
         )
 
-    async def run_task(self) -> AsyncGenerator[WebSocketMessage, None]:
+    async def run_task(self) -> AsyncGenerator[OutboundMessage, None]:
         """
         Run the agent task and yield messages for WebSocket streaming.
         """
         self.is_running = True
         self.step_count = 0
+        failed = False
+        # The same frame often arrives as both computer_screenshot and input_image
+        last_image_url = None
 
         try:
             # Send status: connecting
-            yield WebSocketMessage(
-                type=MessageType.STATUS,
-                payload=StatusPayload(
-                    status="connecting",
-                    message="Connecting to Windows sandbox...",
-                ).model_dump(),
-            )
+            yield CONNECTING.render()
 
             # Initialize computer and agent
             await self.initialize()
-            await self.computer.run()
             await self.create_agent()
 
             # Send status: running
-            yield WebSocketMessage(
-                type=MessageType.STATUS,
-                payload=StatusPayload(
-                    status="running",
-                    message="Agent started, launching Open Dental...",
-                ).model_dump(),
-            )
+            yield RUNNING.render()
 
             # Define the task
             task_instruction = """
@@ -136,22 +134,22 @@ Steps:
                                 if block.get("type") == "text":
                                     text = block.get("text", "")
                                     if text:
-                                        yield WebSocketMessage(
-                                            type=MessageType.MESSAGE,
-                                            payload=AgentMessagePayload(
+                                        yield outbound(
+                                            MessageType.MESSAGE,
+                                            AgentMessagePayload(
                                                 role="assistant",
                                                 content=text,
-                                            ).model_dump(),
+                                            ),
                                         )
                                 elif block.get("type") == "output_text":
                                     text = block.get("text", "")
                                     if text:
-                                        yield WebSocketMessage(
-                                            type=MessageType.MESSAGE,
-                                            payload=AgentMessagePayload(
+                                        yield outbound(
+                                            MessageType.MESSAGE,
+                                            AgentMessagePayload(
                                                 role="assistant",
                                                 content=text,
-                                            ).model_dump(),
+                                            ),
                                         )
 
                     # Handle computer call output (contains screenshots)
@@ -160,36 +158,38 @@ Steps:
                         for output_item in output_content:
                             if output_item.get("type") == "computer_screenshot":
                                 image_url = output_item.get("image_url", "")
-                                if image_url:
-                                    yield WebSocketMessage(
-                                        type=MessageType.SCREENSHOT,
-                                        payload=ScreenshotPayload(
+                                if image_url and image_url != last_image_url:
+                                    last_image_url = image_url
+                                    yield outbound(
+                                        MessageType.SCREENSHOT,
+                                        ScreenshotPayload(
                                             image_data=image_url,
                                             step=self.step_count,
-                                        ).model_dump(),
+                                        ),
                                     )
                             elif output_item.get("type") == "input_image":
                                 image_url = output_item.get("image_url", "")
-                                if image_url:
-                                    yield WebSocketMessage(
-                                        type=MessageType.SCREENSHOT,
-                                        payload=ScreenshotPayload(
+                                if image_url and image_url != last_image_url:
+                                    last_image_url = image_url
+                                    yield outbound(
+                                        MessageType.SCREENSHOT,
+                                        ScreenshotPayload(
                                             image_data=image_url,
                                             step=self.step_count,
-                                        ).model_dump(),
+                                        ),
                                     )
 
                     # Handle computer call (agent is making an action)
                     elif item_type == "computer_call":
                         action = item.get("action", {})
                         action_type = action.get("type", "unknown")
-                        yield WebSocketMessage(
-                            type=MessageType.MESSAGE,
-                            payload=AgentMessagePayload(
+                        yield outbound(
+                            MessageType.MESSAGE,
+                            AgentMessagePayload(
                                 role="system",
                                 content=f"Executing action: {action_type}",
                                 action=action_type,
-                            ).model_dump(),
+                            ),
                         )
 
                     # Handle reasoning
@@ -199,39 +199,33 @@ Steps:
                             for s in summary:
                                 text = s.get("text", "")
                                 if text:
-                                    yield WebSocketMessage(
-                                        type=MessageType.MESSAGE,
-                                        payload=AgentMessagePayload(
+                                    yield outbound(
+                                        MessageType.MESSAGE,
+                                        AgentMessagePayload(
                                             role="reasoning",
                                             content=text,
-                                        ).model_dump(),
+                                        ),
                                     )
 
             # Send completion status
-            yield WebSocketMessage(
-                type=MessageType.AGENT_COMPLETE,
-                payload=StatusPayload(
-                    status="completed",
-                    message="Agent task completed successfully",
-                ).model_dump(),
-            )
+            yield COMPLETED.render()
 
         except Exception as e:
+            failed = True
             logger.error(f"Error during agent execution: {e}")
-            yield WebSocketMessage(
-                type=MessageType.ERROR,
-                payload=StatusPayload(
+            yield outbound(
+                MessageType.ERROR,
+                StatusPayload(
                     status="error",
                     message=str(e),
-                ).model_dump(),
+                ),
             )
         finally:
             self.is_running = False
-            if self.computer:
-                try:
-                    await self.computer.disconnect()
-                except Exception as e:
-                    logger.error(f"Error disconnecting computer: {e}")
+            if self.sandbox:
+                await get_sandbox_pool().release(self.sandbox, failed=failed)
+                self.sandbox = None
+                self.computer = None
 
     async def stop(self) -> None:
         """Stop the running agent."""
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Any
+from typing import Optional, Any, List
 from pydantic import BaseModel
 import time
 
@@ -9,21 +9,29 @@ class MessageType(str, Enum):
     START_AGENT = "start_agent"
     STOP_AGENT = "stop_agent"
     RUN_API = "run_api"
+    SUBSCRIBE = "subscribe"
+    UNSUBSCRIBE = "unsubscribe"
 
     # Outgoing to frontend
     SCREENSHOT = "screenshot"
+    SCREENSHOT_DELTA = "screenshot_delta"
     STATUS = "status"
     MESSAGE = "message"
     ERROR = "error"
     AGENT_COMPLETE = "agent_complete"
     API_LOG = "api_log"
     API_RESPONSE = "api_response"
+    API_BATCH = "api_batch"
+    API_PARTIAL = "api_partial"
+    RUN_STARTED = "run_started"
+    SUBSCRIBED = "subscribed"
 
 
 class WebSocketMessage(BaseModel):
     type: MessageType
     payload: Optional[Any] = None
     timestamp: Optional[float] = None
+    run_id: Optional[str] = None  # set on messages published to a run channel
 
     def __init__(self, **data):
         if "timestamp" not in data or data["timestamp"] is None:
@@ -36,6 +44,31 @@ class ScreenshotPayload(BaseModel):
     step: int
 
 
+class ScreenshotTile(BaseModel):
+    x: int
+    y: int
+    width: int
+    height: int
+    image_data: str  # base64 PNG data URL of just this rectangle
+
+
+class ScreenshotDeltaPayload(BaseModel):
+    """Changed rectangles to paint over the last screenshot received."""
+    step: int
+    width: int
+    height: int
+    tiles: List[ScreenshotTile]
+
+
+class RunPayload(BaseModel):
+    """Describes a run channel; share run_id so other clients can subscribe."""
+    run_id: str
+    kind: str  # "agent" or "api"
+    name: str
+    subscribers: int = 0
+    finished: bool = False
+
+
 class StatusPayload(BaseModel):
     status: str  # "connecting", "running", "idle", "error", "completed", "stopped"
     message: Optional[str] = None
@@ -62,6 +95,25 @@ class APIResponsePayload(BaseModel):
     error: Optional[str] = None
 
 
+class APIBatchPayload(BaseModel):
+    """Payload for a batch of rows streamed before the final API response."""
+    endpoint: str
+    kind: str  # e.g. "patients"
+    batch: int
+    items: List[Any]
+    page: Optional[int] = None
+    total_so_far: Optional[int] = None
+
+
+class APIPartialPayload(BaseModel):
+    """Payload for one row decoded while the extraction is still streaming."""
+    endpoint: str
+    stage: str
+    path: str  # array the row belongs to, e.g. "procedures" or "account.transactions"
+    index: int
+    item: Any
+
+
 class RunAPIPayload(BaseModel):
     """Payload for triggering an API endpoint."""
     endpoint: str
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import certifi
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional
+
+# Fix SSL certificate verification for macOS
+os.environ['SSL_CERT_FILE'] = certifi.where()
+os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
+
+from computer import Computer
+from ..config import get_settings
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledSandbox:
+    """A connected Computer owned by a SandboxPool."""
+    name: str
+    computer: Computer
+    created_at: float
+    last_used: float
+    lease_count: int = 0
+
+
+class SandboxPool:
+    """Keeps warm, pre-connected Computer sessions for one cloud sandbox.
+
+    Services lease a connection instead of connecting and disconnecting on
+    every request. Idle connections above ``min_size`` are closed after
+    ``idle_timeout`` seconds, and connections that sat idle longer than
+    ``health_check_interval`` are probed before being handed out.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        min_size: int = 1,
+        max_size: int = 1,
+        idle_timeout: float = 600.0,
+        health_check_interval: float = 30.0,
+        acquire_timeout: float = 300.0,
+    ):
+        self.name = name
+        self.api_key = api_key
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: Deque[PooledSandbox] = deque()
+        self._size = 0
+        self._leased = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Warm the pool up to min_size and start the idle reaper."""
+        for _ in range(self.min_size):
+            try:
+                sandbox = await self._create()
+            except Exception as e:
+                logger.warning(f"[SandboxPool:{self.name}] Warm-up connection failed: {e}")
+                break
+            async with self._cond:
+                self._idle.append(sandbox)
+                self._cond.notify()
+
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reap_idle())
+        logger.info(f"[SandboxPool:{self.name}] Started with {len(self._idle)} warm connection(s)")
+
+    async def close(self) -> None:
+        """Disconnect every idle connection and stop the reaper."""
+        self._closed = True
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            try:
+                await self._reaper_task
+            except asyncio.CancelledError:
+                pass
+            self._reaper_task = None
+
+        async with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for sandbox in idle:
+            await self._destroy(sandbox)
+        logger.info(f"[SandboxPool:{self.name}] Closed")
+
+    async def acquire(self, timeout: Optional[float] = None) -> PooledSandbox:
+        """Lease a healthy connection, connecting a new one if the pool has room."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            sandbox = None
+            create = False
+            async with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError(f"Sandbox pool '{self.name}' is closed")
+                    if self._idle:
+                        sandbox = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Timed out waiting for a sandbox from pool '{self.name}'")
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                self._leased += 1
+
+            if create:
+                try:
+                    sandbox = await self._create(counted=True)
+                except BaseException:
+                    # Cancellation included, or the slot would stay taken for good
+                    async with self._cond:
+                        self._size -= 1
+                        self._leased -= 1
+                        self._cond.notify()
+                    raise
+            elif time.time() - sandbox.last_used > self.health_check_interval:
+                if not await self._is_healthy(sandbox):
+                    logger.warning(f"[SandboxPool:{self.name}] Dropping unhealthy idle connection")
+                    await self._discard(sandbox)
+                    continue
+
+            sandbox.lease_count += 1
+            sandbox.last_used = time.time()
+            return sandbox
+
+    async def release(self, sandbox: PooledSandbox, failed: bool = False) -> bool:
+        """Return a leased connection. Failed leases are probed before reuse.
+
+        Returns False if the connection failed its probe and was discarded.
+        """
+        if failed and not await self._is_healthy(sandbox):
+            logger.warning(f"[SandboxPool:{self.name}] Discarding connection after failed lease")
+            await self._discard(sandbox)
+            return False
+
+        sandbox.last_used = time.time()
+        async with self._cond:
+            self._leased -= 1
+            if not self._closed:
+                self._idle.append(sandbox)
+                self._cond.notify()
+                return True
+            self._size -= 1
+        await self._destroy(sandbox)
+        return True
+
+    @asynccontextmanager
+    async def lease(self, timeout: Optional[float] = None) -> AsyncIterator[PooledSandbox]:
+        """Async context manager around acquire/release."""
+        sandbox = await self.acquire(timeout)
+        failed = False
+        try:
+            yield sandbox
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            await self.release(sandbox, failed=failed)
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of the pool's occupancy."""
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "leased": self._leased,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+        }
+
+    async def _create(self, counted: bool = False) -> PooledSandbox:
+        """Connect a new Computer session to the sandbox."""
+        if not counted:
+            async with self._cond:
+                self._size += 1
+
+        logger.info(f"[SandboxPool:{self.name}] Connecting new sandbox session...")
+        computer = Computer(
+            os_type="windows",
+            provider_type="cloud",
+            name=self.name,
+            api_key=self.api_key,
+        )
+        try:
+            with metrics.span("cua_stage_duration_seconds", stage="sandbox_connect", sandbox=self.name):
+                await computer.run()
+        except Exception:
+            if not counted:
+                async with self._cond:
+                    self._size -= 1
+            raise
+
+        now = time.time()
+        return PooledSandbox(name=self.name, computer=computer, created_at=now, last_used=now)
+
+    async def _is_healthy(self, sandbox: PooledSandbox) -> bool:
+        """Cheap liveness probe against the sandbox's computer-server."""
+        try:
+            await asyncio.wait_for(sandbox.computer.interface.get_screen_size(), timeout=10.0)
+            return True
+        except Exception as e:
+            logger.warning(f"[SandboxPool:{self.name}] Health probe failed: {e}")
+            return False
+
+    async def _discard(self, sandbox: PooledSandbox) -> None:
+        """Drop a leased connection from the pool entirely."""
+        async with self._cond:
+            self._size -= 1
+            self._leased -= 1
+            self._cond.notify()
+        await self._destroy(sandbox)
+
+    async def _destroy(self, sandbox: PooledSandbox) -> None:
+        try:
+            await sandbox.computer.disconnect()
+        except Exception as e:
+            logger.error(f"[SandboxPool:{self.name}] Error disconnecting: {e}")
+
+    async def _reap_idle(self) -> None:
+        """Close connections idle longer than idle_timeout, keeping min_size warm."""
+        interval = max(1.0, min(self.idle_timeout, 60.0))
+        while not self._closed:
+            await asyncio.sleep(interval)
+            now = time.time()
+            expired = []
+            async with self._cond:
+                for sandbox in list(self._idle):
+                    if self._size <= self.min_size:
+                        break
+                    if now - sandbox.last_used > self.idle_timeout:
+                        self._idle.remove(sandbox)
+                        self._size -= 1
+                        expired.append(sandbox)
+            for sandbox in expired:
+                logger.info(f"[SandboxPool:{self.name}] Closing idle connection")
+                await self._destroy(sandbox)
+
+
+_pools: Dict[str, SandboxPool] = {}
+
+
+def get_sandbox_pool(name: Optional[str] = None) -> SandboxPool:
+    """Return the process-wide pool for a sandbox, creating it from settings."""
+    settings = get_settings()
+    name = name or settings.cua_sandbox_name
+    pool = _pools.get(name)
+    if pool is None:
+        pool = SandboxPool(
+            name=name,
+            api_key=settings.cua_api_key,
+            min_size=settings.sandbox_pool_min_size,
+            max_size=settings.sandbox_pool_max_size,
+            idle_timeout=settings.sandbox_pool_idle_timeout,
+            health_check_interval=settings.sandbox_health_check_interval,
+            acquire_timeout=settings.sandbox_pool_acquire_timeout,
+        )
+        _pools[name] = pool
+    return pool
+
+
+async def start_sandbox_pools() -> None:
+    """Warm a pool for every configured sandbox. Called on application startup."""
+    await asyncio.gather(*(get_sandbox_pool(name).start() for name in get_settings().sandbox_names))
+
+
+async def close_sandbox_pools() -> None:
+    """Disconnect every pooled sandbox. Called on application shutdown."""
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from ..config import get_settings
+from .sandbox_pool import get_sandbox_pool
+from .ui_state import get_ui_state_store, patient_key
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SandboxHealth:
+    """Routing state the router keeps for one sandbox."""
+    name: str
+    healthy: bool = True
+    consecutive_failures: int = 0
+    drained_until: float = 0.0
+    last_assigned: float = 0.0
+
+
+class SandboxRouter:
+    """Chooses a sandbox for each job and drains sandboxes that keep failing.
+
+    Routing prefers a healthy sandbox whose UI was last left on the
+    requested patient, as long as its queue is not more than
+    ``affinity_slack`` jobs deeper than the least-loaded sandbox; otherwise
+    the least-loaded healthy sandbox wins. After ``max_failures``
+    consecutive sandbox failures a sandbox is drained for ``drain_seconds``
+    and then probed before it receives work again.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        max_failures: int = 3,
+        drain_seconds: float = 120.0,
+        affinity_slack: int = 1,
+        probe_interval: float = 30.0,
+    ):
+        self.sandboxes: Dict[str, SandboxHealth] = {name: SandboxHealth(name) for name in names}
+        self.max_failures = max_failures
+        self.drain_seconds = drain_seconds
+        self.affinity_slack = affinity_slack
+        self.probe_interval = probe_interval
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.sandboxes)
+
+    def healthy(self) -> List[str]:
+        return [name for name, state in self.sandboxes.items() if state.healthy]
+
+    def choose(self, loads: Dict[str, int], patient: Optional[str] = None) -> str:
+        """Pick a sandbox given each sandbox's current load (queued + running jobs)."""
+        candidates = self.healthy()
+        if not candidates:
+            # Everything is drained; fall back to the one drained longest ago
+            candidates = [min(self.sandboxes.values(), key=lambda s: s.drained_until).name]
+            logger.warning(f"[SandboxRouter] No healthy sandboxes, routing to {candidates[0]}")
+
+        least = min(loads.get(name, 0) for name in candidates)
+        key = patient_key(patient)
+        if key:
+            ui_states = get_ui_state_store()
+            for name in candidates:
+                if ui_states.current_patient(name) == key and loads.get(name, 0) <= least + self.affinity_slack:
+                    return self._assign(name)
+
+        best = min(
+            candidates,
+            key=lambda name: (loads.get(name, 0), self.sandboxes[name].last_assigned),
+        )
+        return self._assign(best)
+
+    def _assign(self, name: str) -> str:
+        self.sandboxes[name].last_assigned = time.monotonic()
+        return name
+
+    def record_success(self, name: str) -> None:
+        state = self.sandboxes.get(name)
+        if state is not None:
+            state.consecutive_failures = 0
+
+    def record_failure(self, name: str) -> bool:
+        """Count a sandbox-level failure; returns True if the sandbox was just drained."""
+        state = self.sandboxes.get(name)
+        if state is None or not state.healthy:
+            return False
+        state.consecutive_failures += 1
+        if state.consecutive_failures < self.max_failures:
+            return False
+
+        state.healthy = False
+        get_ui_state_store().invalidate(name)
+        state.drained_until = time.monotonic() + self.drain_seconds
+        logger.warning(
+            f"[SandboxRouter] Draining {name} for {self.drain_seconds:.0f}s "
+            f"after {state.consecutive_failures} consecutive failures"
+        )
+        return True
+
+    async def start(self) -> None:
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_drained())
+
+    async def close(self) -> None:
+        if self._probe_task:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    async def _probe_drained(self) -> None:
+        """Re-admit drained sandboxes once a fresh lease succeeds."""
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            for state in self.sandboxes.values():
+                if state.healthy or now < state.drained_until:
+                    continue
+                pool = get_sandbox_pool(state.name)
+                try:
+                    async with pool.lease(timeout=60.0):
+                        pass
+                except Exception as e:
+                    logger.warning(f"[SandboxRouter] {state.name} still unhealthy: {e}")
+                    state.drained_until = time.monotonic() + self.drain_seconds
+                    continue
+                state.healthy = True
+                state.consecutive_failures = 0
+                logger.info(f"[SandboxRouter] {state.name} is healthy again")
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        return {
+            name: {
+                "healthy": state.healthy,
+                "consecutive_failures": state.consecutive_failures,
+                "drained_for": max(0.0, state.drained_until - now) if not state.healthy else 0.0,
+                "current_patient": get_ui_state_store().current_patient(name),
+            }
+            for name, state in self.sandboxes.items()
+        }
+
+
+_router: Optional[SandboxRouter] = None
+
+
+def get_sandbox_router() -> SandboxRouter:
+    """Return the process-wide router over the configured sandboxes."""
+    global _router
+    if _router is None:
+        settings = get_settings()
+        _router = SandboxRouter(
+            settings.sandbox_names,
+            max_failures=settings.sandbox_max_failures,
+            drain_seconds=settings.sandbox_drain_seconds,
+            affinity_slack=settings.sandbox_affinity_slack,
+            probe_interval=settings.sandbox_health_check_interval,
+        )
+    return _router
@@ -0,0 +1,92 @@
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from ..api.image_hash import hamming
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def patient_key(patient: Optional[str]) -> Optional[str]:
+    """Normalize a patient name for comparison ("Smith,  Jane" == "smith, jane")."""
+    return " ".join(patient.lower().split()) if patient else None
+
+
+def same_patient(expected: Optional[str], shown: Optional[str]) -> bool:
+    """True if every word of the requested name appears in the displayed one.
+
+    Word order and punctuation are ignored, so "Jane Smith" matches the
+    title bar's "Smith, Jane A".
+    """
+    if not expected or not shown:
+        return False
+    return _words(expected) <= _words(shown)
+
+
+def _words(name: str) -> set:
+    return set(re.findall(r"\w+", name.lower()))
+
+
+@dataclass
+class UIState:
+    """What the backend last left on a sandbox's screen.
+
+    ``screen_hash`` is the dHash of the screen at the end of the last run;
+    a new run trusts ``patient`` and ``module`` only if the live screen
+    still hashes within ``max_distance`` bits of it.
+    """
+    patient: Optional[str] = None
+    module: Optional[str] = None
+    screen_hash: Optional[int] = None
+    updated_at: float = 0.0
+
+    def is_fresh(self, ttl: float) -> bool:
+        return self.screen_hash is not None and time.time() - self.updated_at <= ttl
+
+    def matches_screen(self, screen_hash: int, max_distance: int) -> bool:
+        return self.screen_hash is not None and hamming(self.screen_hash, screen_hash) <= max_distance
+
+
+class UIStateStore:
+    """Last known UI state per sandbox."""
+
+    def __init__(self):
+        self._states: Dict[str, UIState] = {}
+
+    def get(self, sandbox_name: str) -> UIState:
+        return self._states.setdefault(sandbox_name, UIState())
+
+    def update(
+        self,
+        sandbox_name: str,
+        patient: Optional[str],
+        module: Optional[str],
+        screen_hash: Optional[int],
+    ) -> None:
+        self._states[sandbox_name] = UIState(
+            patient=patient,
+            module=module,
+            screen_hash=screen_hash,
+            updated_at=time.time(),
+        )
+        logger.info(f"[UIState:{sandbox_name}] patient={patient!r} module={module!r}")
+
+    def invalidate(self, sandbox_name: str) -> None:
+        """Forget the state, e.g. after a failed run left the UI somewhere unknown."""
+        self._states[sandbox_name] = UIState()
+
+    def current_patient(self, sandbox_name: str) -> Optional[str]:
+        state = self._states.get(sandbox_name)
+        if state is None or not state.is_fresh(get_settings().ui_state_ttl):
+            return None
+        return state.patient
+
+
+_store = UIStateStore()
+
+
+def get_ui_state_store() -> UIStateStore:
+    return _store
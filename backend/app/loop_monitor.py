@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .config import get_settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Frames of the blocked thread's stack kept per offender
+STACK_DEPTH = 12
+
+
+@dataclass
+class SlowCallback:
+    """A stretch of time during which one callback kept the event loop busy."""
+    task: str  # task name, or "<callback>" for plain loop callbacks
+    coro: str  # qualified name of the task's coroutine, used as the metric label
+    duration: float
+    stack: List[str]
+    timestamp: float = field(default_factory=time.time)
+
+
+class LoopMonitor:
+    """Measures event-loop lag and catches the callbacks that cause it.
+
+    A sampler task sleeps for ``interval`` and records how late it wakes up
+    into ``event_loop_lag_seconds``. A watchdog thread checks that the
+    sampler keeps waking up; when it is more than ``threshold`` late, the
+    loop is stuck in a callback, so the watchdog records the running task
+    and the loop thread's stack while it is still blocking. Once the loop
+    recovers, the stall's full duration is attached and the offender is
+    kept if it is among the ``top`` worst.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, top: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.top = top
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._worst: List[Tuple[float, int, SlowCallback]] = []
+        self._recent: Deque[SlowCallback] = deque(maxlen=top)
+        self._lock = threading.Lock()
+        self._pending: Optional[SlowCallback] = None
+        self._deadline = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._sampler: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self) -> None:
+        if self._sampler is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._deadline = time.monotonic() + self.interval
+        self._stopped.clear()
+        self._sampler = asyncio.create_task(self._sample_loop(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        self._stopped.set()
+        if self._sampler:
+            self._sampler.cancel()
+            try:
+                await self._sampler
+            except asyncio.CancelledError:
+                pass
+            self._sampler = None
+        if self._watchdog:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _sample_loop(self) -> None:
+        while True:
+            self._deadline = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._deadline)
+            metrics.observe("event_loop_lag_seconds", lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock:
+                stall, self._pending = self._pending, None
+            if stall is not None:
+                stall.duration = lag
+                self._record(stall)
+
+    def _watch(self) -> None:
+        """Watchdog thread: snapshot the loop thread while it is blocked."""
+        poll = max(0.005, self.threshold / 4)
+        while not self._stopped.wait(poll):
+            late = time.monotonic() - self._deadline
+            if late < self.threshold:
+                continue
+            with self._lock:
+                if self._pending is None:
+                    self._pending = self._snapshot()
+
+    def _snapshot(self) -> SlowCallback:
+        task = asyncio.current_task(self._loop) if self._loop else None
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame else []
+        if task is None:
+            return SlowCallback("<callback>", "<callback>", 0.0, stack)
+        coro = task.get_coro()
+        return SlowCallback(task.get_name(), getattr(coro, "__qualname__", type(coro).__name__), 0.0, stack)
+
+    def _record(self, stall: SlowCallback) -> None:
+        self.stalls += 1
+        metrics.inc("event_loop_slow_callbacks_total", coro=stall.coro)
+        metrics.observe("event_loop_slow_callback_seconds", stall.duration, coro=stall.coro)
+        logger.warning(f"[LoopMonitor] {stall.task} ({stall.coro}) blocked the event loop for {stall.duration * 1000:.0f}ms")
+        with self._lock:
+            self._recent.append(stall)
+            entry = (stall.duration, self.stalls, stall)
+            if len(self._worst) < self.top:
+                heapq.heappush(self._worst, entry)
+            elif stall.duration > self._worst[0][0]:
+                heapq.heapreplace(self._worst, entry)
+
+    def report(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Worst and most recent slow callbacks, longest first, with their stacks."""
+        with self._lock:
+            worst = [stall for _, _, stall in sorted(self._worst, key=lambda entry: entry[0], reverse=True)]
+            recent = list(reversed(self._recent))
+        if limit is not None:
+            worst, recent = worst[:limit], recent[:limit]
+        return {
+            **self.stats(),
+            "worst": [asdict(stall) for stall in worst],
+            "recent": [asdict(stall) for stall in recent],
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._worst.clear()
+            self._recent.clear()
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._sampler is not None,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "max_lag": self.max_lag,
+            "stalls": self.stalls,
+        }
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def get_loop_monitor() -> LoopMonitor:
+    """Return the process-wide event-loop monitor."""
+    global _monitor
+    if _monitor is None:
+        settings = get_settings()
+        _monitor = LoopMonitor(
+            interval=settings.loop_monitor_interval,
+            threshold=settings.loop_slow_callback_threshold,
+            top=settings.loop_monitor_top,
+        )
+    return _monitor
+
+
+async def start_loop_monitor() -> None:
+    if get_settings().loop_monitor_enabled:
+        await get_loop_monitor().start()
+
+
+async def close_loop_monitor() -> None:
+    if _monitor is not None:
+        await _monitor.close()
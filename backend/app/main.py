@@ -6,21 +6,52 @@ import certifi
 os.environ['SSL_CERT_FILE'] = certifi.where()
 os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
 from .websocket.manager import ConnectionManager
 from .websocket.handler import WebSocketHandler
 from .api.routes import router as api_router
+from .api.http_client import start_http_client, close_http_client
+from .api.jobs import get_job_scheduler, start_job_scheduler, close_job_scheduler
+from .api.patient_store import close_patient_store
+from .api.trajectory_store import get_trajectory_store, start_trajectory_store, close_trajectory_store
+from .aio import shutdown_io
+from .loop_monitor import get_loop_monitor, start_loop_monitor, close_loop_monitor
+from .metrics import metrics
+from .cua.sandbox_pool import get_sandbox_pool, start_sandbox_pools, close_sandbox_pools
+from .cua.sandbox_router import get_sandbox_router
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm shared resources on startup and release them on shutdown."""
+    await start_loop_monitor()
+    await start_http_client()
+    await start_sandbox_pools()
+    await start_job_scheduler()
+    await start_trajectory_store()
+    yield
+    await close_trajectory_store()
+    await close_job_scheduler()
+    await close_sandbox_pools()
+    await close_http_client()
+    close_patient_store()
+    shutdown_io()
+    await close_loop_monitor()
+
+
 app = FastAPI(
     title="OpenDental CUA Backend",
     description="Computer User Agent backend for OpenDental APIs",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware for development
@@ -42,7 +73,40 @@ connection_manager = ConnectionManager()
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "opendental-cua-backend"}
+    return {
+        "status": "healthy",
+        "service": "opendental-cua-backend",
+        "sandboxes": {
+            name: {**get_sandbox_pool(name).stats(), **health}
+            for name, health in get_sandbox_router().stats().items()
+        },
+        "jobs": get_job_scheduler().stats(),
+        "websockets": connection_manager.stats(),
+        "trajectories": get_trajectory_store().stats(),
+        "event_loop": get_loop_monitor().stats(),
+    }
+
+
+@app.get("/runs")
+async def list_runs():
+    """Runs that WebSocket clients can subscribe to."""
+    return {"runs": connection_manager.channels.list()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus-style stage latency histograms, percentiles and cost counters."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/event-loop")
+async def event_loop_report(limit: int = 10, reset: bool = False):
+    """Worst and most recent callbacks that blocked the event loop, with stacks."""
+    monitor = get_loop_monitor()
+    report = monitor.report(limit)
+    if reset:
+        monitor.reset()
+    return report
 
 
 @app.websocket("/ws")
@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; spans range from base64 encodes (ms) to full agent runs (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket histogram plus a bounded sample window for percentiles."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 1024):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self._samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Nearest-rank quantile over the recent sample window."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(0, math.ceil(q * len(ordered)) - 1)
+        return ordered[rank]
+
+
+class MetricsRegistry:
+    """Process-wide histograms and counters rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = self._key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = self._key(labels)
+            series[key] = series.get(key, 0.0) + amount
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        """Time a block into the ``name`` histogram (seconds)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {_num(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.bucket_counts):
+                        lines.append(f"{name}_bucket{_labels(key, le=_num(bound))} {count}")
+                    lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {hist.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {_num(hist.sum)}")
+                    lines.append(f"{name}_count{_labels(key)} {hist.count}")
+
+                quantile_name = f"{name}_quantile"
+                lines.append(f"# HELP {quantile_name} Recent-window percentiles of {name}")
+                lines.append(f"# TYPE {quantile_name} gauge")
+                for key, hist in series.items():
+                    for q in QUANTILES:
+                        value = hist.quantile(q)
+                        if value is not None:
+                            lines.append(f"{quantile_name}{_labels(key, quantile=str(q))} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _labels(key: LabelKey, **extra: str) -> str:
+    pairs = list(key) + sorted(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return repr(float(value))
+
+
+metrics = MetricsRegistry()
+
+metrics.describe("cua_stage_duration_seconds", "Wall-clock time spent in each stage of a CUA workflow")
+metrics.describe("cua_agent_turn_seconds", "Time per agent turn (model call plus executed computer actions)")
+metrics.describe("cua_computer_calls_total", "Computer actions executed by the agent")
+metrics.describe("cua_agent_cost_usd_total", "Agent model spend reported by the CUA agent")
+metrics.describe("cua_workflow_steps_total", "Workflow steps by plan: full agent run, resumed on the selected patient, or skipped")
+metrics.describe("cua_macro_replays_total", "Macro replays of recorded workflow steps by outcome")
+metrics.describe("cua_ui_state_checks_total", "Title-bar checks of the patient a sandbox was left on")
+metrics.describe("cua_jobs_total", "Workflow jobs by lifecycle transition")
+metrics.describe("anthropic_request_duration_seconds", "Round trip of extraction calls to the Messages API")
+metrics.describe("anthropic_first_item_seconds", "Time from request to the first decoded row on streamed extractions")
+metrics.describe("anthropic_requests_total", "Extraction calls by outcome")
+metrics.describe("anthropic_tokens_total", "Tokens used by extraction calls")
+metrics.describe("anthropic_cost_usd_total", "Estimated extraction spend")
+metrics.describe("patient_store_pages_total", "Select Patient grid pages by refresh outcome")
+metrics.describe("patient_grid_rows_total", "Distinct patients stitched from paginated grid scrapes")
+metrics.describe("extraction_cache_hits_total", "Extractions answered without calling the model")
+metrics.describe("trajectory_frames_removed_total", "Trajectory screenshots deleted by compaction")
+metrics.describe("trajectory_runs_removed_total", "Trajectory runs deleted by retention")
+metrics.describe("ws_messages_dropped_total", "WebSocket messages dropped because the client's send queue was full")
+metrics.describe("ws_messages_coalesced_total", "Queued WebSocket screenshots replaced by a newer one")
+metrics.describe("ws_frames_total", "Screenshots sent to diffing WebSocket clients by encoding")
+metrics.describe("ws_frame_bytes_total", "Bytes of binary screenshot frames sent over WebSocket")
+metrics.describe("ws_slow_client_disconnects_total", "WebSocket clients disconnected for not reading")
+metrics.describe("event_loop_lag_seconds", "How late the event loop woke up a periodic sampler")
+metrics.describe("event_loop_slow_callbacks_total", "Callbacks that blocked the event loop past the slow-callback threshold")
+metrics.describe("event_loop_slow_callback_seconds", "How long slow callbacks blocked the event loop")
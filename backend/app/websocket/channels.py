@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Set, Union
+
+from fastapi import WebSocket
+
+from ..cua.message_types import MessageType
+from .encoding import OutboundMessage
+
+if TYPE_CHECKING:
+    from .manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class RunChannel:
+    """Event stream of one agent or API run, fanned out to every subscriber.
+
+    The run publishes each message once; the same encoded message is queued
+    on every subscribed connection's outbox. The last ``history_size`` messages are kept for
+    late joiners, plus the most recent screenshot so a new viewer sees the
+    current screen right away.
+    """
+
+    def __init__(self, run_id: str, kind: str, name: str, owner: WebSocket, history_size: int = 200):
+        self.run_id = run_id
+        self.kind = kind  # "agent" or "api"
+        self.name = name
+        self.owner = owner
+        self.subscribers: Set[WebSocket] = set()
+        self.history: Deque[OutboundMessage] = deque(maxlen=history_size)
+        self.last_screenshot: Optional[OutboundMessage] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.published = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def replay(self) -> List[OutboundMessage]:
+        messages = list(self.history)
+        if self.last_screenshot is not None:
+            messages.append(self.last_screenshot)
+        return messages
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "name": self.name,
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ChannelRegistry:
+    """Run-scoped channels, keyed by run id.
+
+    Finished channels linger for ``linger`` seconds so viewers that join
+    just after a run ends still get its final messages.
+    """
+
+    def __init__(self, manager: "ConnectionManager", history_size: int = 200, linger: float = 300.0):
+        self.manager = manager
+        self.history_size = history_size
+        self.linger = linger
+        self.channels: Dict[str, RunChannel] = {}
+
+    def open(self, run_id: str, kind: str, name: str, owner: WebSocket) -> RunChannel:
+        channel = RunChannel(run_id, kind, name, owner, history_size=self.history_size)
+        self.channels[run_id] = channel
+        self.subscribe(run_id, owner)
+        return channel
+
+    def get(self, run_id: str) -> Optional[RunChannel]:
+        return self.channels.get(run_id)
+
+    def publish(self, run_id: str, data: Union[Dict[str, Any], OutboundMessage]) -> None:
+        """Queue a run message on every subscriber; never waits on a socket."""
+        channel = self.channels.get(run_id)
+        if channel is None:
+            return
+        if not isinstance(data, OutboundMessage):
+            data = OutboundMessage(data)
+        message = data.for_run(run_id)
+        channel.published += 1
+        if message.type == MessageType.SCREENSHOT.value:
+            channel.last_screenshot = message
+        else:
+            channel.history.append(message)
+        for websocket in channel.subscribers:
+            outbox = self.manager.outboxes.get(websocket)
+            if outbox:
+                outbox.put(message)
+
+    def subscribe(self, run_id: str, websocket: WebSocket) -> Optional[RunChannel]:
+        """Attach a connection to a run and replay its recent messages to it."""
+        channel = self.channels.get(run_id)
+        outbox = self.manager.outboxes.get(websocket)
+        if channel is None or outbox is None:
+            return None
+        if websocket not in channel.subscribers:
+            channel.subscribers.add(websocket)
+            for message in channel.replay():
+                outbox.put(message)
+        return channel
+
+    def unsubscribe(self, run_id: str, websocket: WebSocket) -> None:
+        channel = self.channels.get(run_id)
+        if channel is not None:
+            channel.subscribers.discard(websocket)
+        outbox = self.manager.outboxes.get(websocket)
+        if outbox:
+            outbox.forget_run(run_id)
+
+    def unsubscribe_all(self, websocket: WebSocket) -> None:
+        for channel in self.channels.values():
+            channel.subscribers.discard(websocket)
+
+    def finish(self, run_id: str) -> None:
+        """Mark a run as done; its channel is dropped after the linger period."""
+        channel = self.channels.get(run_id)
+        if channel is None or channel.finished:
+            return
+        channel.finished_at = time.time()
+        asyncio.get_running_loop().call_later(self.linger, self._remove, run_id, channel)
+
+    def _remove(self, run_id: str, channel: RunChannel) -> None:
+        if self.channels.get(run_id) is channel:
+            del self.channels[run_id]
+        for websocket in channel.subscribers:
+            outbox = self.manager.outboxes.get(websocket)
+            if outbox:
+                outbox.forget_run(run_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [channel.to_dict() for channel in self.channels.values()]
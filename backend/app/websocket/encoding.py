@@ -0,0 +1,93 @@
+import time
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from ..cua.message_types import MessageType
+
+
+def dumps(data: Any) -> str:
+    """Compact JSON text, as ``WebSocket.send_json`` would send it.
+
+    Encoded by pydantic-core's Rust serializer instead of the stdlib
+    encoder; for screenshot messages nearly all the work is escaping the
+    base64 data URL, which it does several times faster.
+    """
+    return to_json(data).decode("utf-8")
+
+
+# How an encoded message without a run id ends; run_id is always the last key
+NULL_RUN_ID = '"run_id":null}'
+
+
+class OutboundMessage:
+    """A message for one or more clients, encoded to JSON at most once.
+
+    A run message is queued on every subscriber's outbox and kept in the
+    channel history for replays. They all share this object, so the JSON
+    text of a multi-megabyte screenshot is produced once, not once per send.
+    """
+
+    __slots__ = ("data", "_text")
+
+    def __init__(self, data: Dict[str, Any], text: Optional[str] = None):
+        self.data = data
+        self._text = text
+
+    @property
+    def type(self) -> Optional[str]:
+        msg_type = self.data.get("type")
+        return msg_type.value if isinstance(msg_type, MessageType) else msg_type
+
+    @property
+    def run_id(self) -> Optional[str]:
+        return self.data.get("run_id")
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = dumps(self.data)
+        return self._text
+
+    def for_run(self, run_id: str) -> "OutboundMessage":
+        """This message tagged with a run id (itself if it already is)."""
+        if self.run_id == run_id:
+            return self
+        text = None
+        # Already encoded (e.g. a static message): swap the trailing run id instead of encoding again
+        if self._text is not None and self._text.endswith(NULL_RUN_ID) and list(self.data)[-1] == "run_id":
+            text = f'{self._text[:-len(NULL_RUN_ID)]}"run_id":{dumps(run_id)}}}'
+        return OutboundMessage({**self.data, "run_id": run_id}, text)
+
+
+def outbound(msg_type: MessageType, payload: Optional[BaseModel] = None, run_id: Optional[str] = None) -> OutboundMessage:
+    """Build a message with the ``WebSocketMessage`` layout in one pass.
+
+    The payload is dumped once and the envelope is a plain dict, instead of
+    validating a ``WebSocketMessage`` around an already-dumped payload and
+    dumping it again.
+    """
+    return OutboundMessage({
+        "type": msg_type.value,
+        "payload": payload.model_dump() if payload is not None else None,
+        "timestamp": time.time(),
+        "run_id": run_id,
+    })
+
+
+class StaticMessage:
+    """A message whose type and payload never change, encoded once up front.
+
+    Each ``render`` only appends the timestamp and run id to the cached
+    JSON prefix.
+    """
+
+    def __init__(self, msg_type: MessageType, payload: BaseModel):
+        self.data = {"type": msg_type.value, "payload": payload.model_dump()}
+        # Drop the closing brace so the per-send fields can be appended
+        self._prefix = dumps(self.data)[:-1] + ',"timestamp":'
+
+    def render(self, run_id: Optional[str] = None) -> OutboundMessage:
+        timestamp = time.time()
+        text = f'{self._prefix}{timestamp!r},"run_id":{dumps(run_id)}}}'
+        return OutboundMessage({**self.data, "timestamp": timestamp, "run_id": run_id}, text)
@@ -0,0 +1,123 @@
+import io
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# Update kinds
+FULL = "full"  # whole image (keyframe)
+REPEAT = "repeat"  # nothing changed since the last frame sent
+DELTA = "delta"  # only the changed rectangles
+
+
+@dataclass
+class Tile:
+    """A changed rectangle of the screen, PNG-encoded."""
+    x: int
+    y: int
+    width: int
+    height: int
+    data: bytes
+
+
+@dataclass
+class FrameUpdate:
+    kind: str
+    width: int = 0
+    height: int = 0
+    # Encoded image for FULL updates
+    image: bytes = b""
+    tiles: List[Tile] = field(default_factory=list)
+
+
+class FrameDiffer:
+    """Turns a stream of screenshots into keyframes, repeats and tile deltas.
+
+    Frames are compared with the last frame sent to the same client. The
+    screen is split into ``tile_size`` squares; changed tiles are merged
+    into horizontal runs and sent as small PNGs. A keyframe goes out every
+    ``keyframe_interval`` frames, when the screen size changes, or when more
+    than ``max_dirty_ratio`` of the screen changed. With ``tiles`` off only
+    byte-identical frames are suppressed and nothing is decoded.
+    """
+
+    def __init__(
+        self,
+        tiles: bool = True,
+        tile_size: int = 64,
+        keyframe_interval: int = 30,
+        max_dirty_ratio: float = 0.5,
+    ):
+        self.tiles = tiles
+        self.tile_size = max(8, tile_size)
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.max_dirty_ratio = max_dirty_ratio
+        self._previous_bytes: Optional[bytes] = None
+        self._previous: Optional[Image.Image] = None
+        self._since_keyframe = 0
+
+    def diff(self, image: bytes) -> FrameUpdate:
+        if image == self._previous_bytes:
+            return FrameUpdate(REPEAT)
+        self._previous_bytes = image
+        if not self.tiles:
+            return FrameUpdate(FULL, image=image)
+
+        with Image.open(io.BytesIO(image)) as img:
+            current = img.convert("RGB")
+        previous, self._previous = self._previous, current
+        width, height = current.size
+
+        self._since_keyframe += 1
+        if (
+            previous is None
+            or previous.size != current.size
+            or self._since_keyframe >= self.keyframe_interval
+        ):
+            return self._keyframe(image, width, height)
+
+        difference = ImageChops.difference(previous, current)
+        bbox = difference.getbbox()
+        if bbox is None:
+            return FrameUpdate(REPEAT, width, height)
+
+        rects = self._dirty_rects(difference, bbox)
+        dirty = sum(w * h for _, _, w, h in rects)
+        if dirty > self.max_dirty_ratio * width * height:
+            return self._keyframe(image, width, height)
+
+        tiles = [Tile(x, y, w, h, _png(current.crop((x, y, x + w, y + h)))) for x, y, w, h in rects]
+        return FrameUpdate(DELTA, width, height, tiles=tiles)
+
+    def _keyframe(self, image: bytes, width: int, height: int) -> FrameUpdate:
+        self._since_keyframe = 0
+        return FrameUpdate(FULL, width, height, image=image)
+
+    def _dirty_rects(self, difference: Image.Image, bbox: Tuple[int, int, int, int]) -> List[Tuple[int, int, int, int]]:
+        """Changed tiles inside ``bbox``, merged into horizontal runs as (x, y, w, h)."""
+        size = self.tile_size
+        width, height = difference.size
+        left, top, right, bottom = bbox
+        rects = []
+        for y in range(top - top % size, bottom, size):
+            tile_h = min(size, height - y)
+            run: Optional[List[int]] = None  # [start, end] of the current run of changed tiles
+            for x in range(left - left % size, right, size):
+                tile_w = min(size, width - x)
+                if difference.crop((x, y, x + tile_w, y + tile_h)).getbbox() is not None:
+                    if run is None:
+                        run = [x, x + tile_w]
+                    else:
+                        run[1] = x + tile_w
+                elif run is not None:
+                    rects.append((run[0], y, run[1] - run[0], tile_h))
+                    run = None
+            if run is not None:
+                rects.append((run[0], y, run[1] - run[0], tile_h))
+        return rects
+
+
+def _png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=False, compress_level=1)
+    return buffer.getvalue()
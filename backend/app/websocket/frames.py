@@ -0,0 +1,81 @@
+import base64
+import json
+import struct
+from typing import Any, Dict, Optional
+
+from ..cua.message_types import MessageType, ScreenshotDeltaPayload, ScreenshotTile
+from .frame_differ import DELTA, FULL, REPEAT, FrameUpdate
+
+# Binary screenshot frame layout:
+#   4-byte big-endian header length | UTF-8 JSON header | body
+# The header carries the message type, step, timestamp, mime type and
+# encoding. "full" frames carry the whole image as the body, "repeat"
+# frames have no body, and "delta" frames list their tiles in the header
+# ({x, y, width, height, length}) with the tile PNGs concatenated as the body.
+HEADER_LENGTH = struct.Struct(">I")
+
+# Connect with /ws?frames=binary to receive screenshots this way
+BINARY_FRAMES = "binary"
+# Connect with /ws?delta=tiles to receive dirty-rectangle updates between keyframes
+TILE_DELTAS = "tiles"
+
+
+def pack_frame(header: Dict[str, Any], body: bytes = b"") -> bytes:
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return HEADER_LENGTH.pack(len(encoded)) + encoded + body
+
+
+def binary_frame(message: Dict[str, Any], mime: str, update: FrameUpdate) -> bytes:
+    """Encode a screenshot update as one binary WebSocket message."""
+    payload = message.get("payload") or {}
+    header = {
+        "type": message.get("type"),
+        "run_id": message.get("run_id"),
+        "step": payload.get("step"),
+        "timestamp": message.get("timestamp"),
+        "encoding": update.kind,
+        "width": update.width or None,
+        "height": update.height or None,
+    }
+    if update.kind == FULL:
+        header.update(mime=mime, size=len(update.image))
+        return pack_frame(header, update.image)
+    if update.kind == DELTA:
+        header.update(
+            mime="image/png",
+            tiles=[
+                {"x": t.x, "y": t.y, "width": t.width, "height": t.height, "length": len(t.data)}
+                for t in update.tiles
+            ],
+        )
+        return pack_frame(header, b"".join(t.data for t in update.tiles))
+    return pack_frame(header)
+
+
+def delta_message(message: Dict[str, Any], update: FrameUpdate) -> Optional[Dict[str, Any]]:
+    """JSON form of a screenshot update: the original message for keyframes, None for repeats."""
+    if update.kind == FULL:
+        return message
+    if update.kind == REPEAT:
+        return None
+    payload = message.get("payload") or {}
+    return {
+        "type": MessageType.SCREENSHOT_DELTA.value,
+        "payload": ScreenshotDeltaPayload(
+            step=payload.get("step", 0),
+            width=update.width,
+            height=update.height,
+            tiles=[
+                ScreenshotTile(
+                    x=t.x,
+                    y=t.y,
+                    width=t.width,
+                    height=t.height,
+                    image_data=f"data:image/png;base64,{base64.b64encode(t.data).decode('utf-8')}",
+                )
+                for t in update.tiles
+            ],
+        ).model_dump(),
+        "timestamp": message.get("timestamp"),
+        "run_id": message.get("run_id"),
+    }
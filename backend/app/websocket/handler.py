@@ -2,22 +2,36 @@ from fastapi import WebSocket, WebSocketDisconnect
 import json
 import asyncio
 import logging
+import uuid
 from typing import Optional
+from .encoding import StaticMessage, outbound
+from .frames import BINARY_FRAMES, TILE_DELTAS
 from .manager import ConnectionManager
 from ..cua.agent_service import CUAAgentService
 from ..cua.message_types import (
     MessageType,
-    WebSocketMessage,
     StatusPayload,
     APILogPayload,
     APIResponsePayload,
+    APIBatchPayload,
+    APIPartialPayload,
+    RunPayload,
 )
-from ..api.patient_service import PatientAPIService, LogEntry
-from ..api.patient_chart_service import PatientChartAPIService
-from ..api.reports_service import ReportsAPIService
+from ..api.jobs import Job, QueueFullError, get_job_scheduler
+from ..api.workflow import LogEntry
+from ..api.workflows import WORKFLOWS
 
 logger = logging.getLogger(__name__)
 
+# Messages that never change are encoded once; only the timestamp is filled in per send
+CONNECTED = StaticMessage(MessageType.STATUS, StatusPayload(status="idle", message="Connected. Ready to start."))
+CONNECTED_BINARY = StaticMessage(
+    MessageType.STATUS, StatusPayload(status="idle", message="Connected with binary frames. Ready to start.")
+)
+AGENT_ALREADY_RUNNING = StaticMessage(MessageType.ERROR, StatusPayload(status="error", message="Agent is already running"))
+API_ALREADY_RUNNING = StaticMessage(MessageType.ERROR, StatusPayload(status="error", message="An API is already running"))
+STOPPED = StaticMessage(MessageType.STATUS, StatusPayload(status="stopped", message="Stopped by user"))
+
 
 class WebSocketHandler:
     """Handles WebSocket messages and coordinates with CUA agent and APIs."""
@@ -25,25 +39,22 @@ class WebSocketHandler:
     def __init__(self, manager: ConnectionManager):
         self.manager = manager
         self.agent_service: Optional[CUAAgentService] = None
-        self.api_service = None
+        self.api_job: Optional[Job] = None
         self.agent_task: Optional[asyncio.Task] = None
         self.api_task: Optional[asyncio.Task] = None
+        # Channels of the runs this connection started
+        self.agent_run_id: Optional[str] = None
+        self.api_run_id: Optional[str] = None
 
     async def handle_connection(self, websocket: WebSocket) -> None:
         """Main handler for a WebSocket connection."""
-        await self.manager.connect(websocket)
+        # Screenshot framing is negotiated once, at connect time
+        binary_frames = websocket.query_params.get("frames") == BINARY_FRAMES
+        tile_deltas = websocket.query_params.get("delta") == TILE_DELTAS
+        await self.manager.connect(websocket, binary_frames=binary_frames, tile_deltas=tile_deltas)
 
         # Send initial status
-        await self.manager.send_json(
-            websocket,
-            WebSocketMessage(
-                type=MessageType.STATUS,
-                payload=StatusPayload(
-                    status="idle",
-                    message="Connected. Ready to start.",
-                ).model_dump(),
-            ).model_dump(),
-        )
+        await self.manager.send_json(websocket, (CONNECTED_BINARY if binary_frames else CONNECTED).render())
 
         try:
             while True:
@@ -76,152 +87,227 @@ class WebSocketHandler:
             params = payload.get("params", {})
             await self._run_api(websocket, endpoint, params)
 
+        elif msg_type == MessageType.SUBSCRIBE.value:
+            await self._subscribe(websocket, message.get("payload", {}).get("run_id", ""))
+
+        elif msg_type == MessageType.UNSUBSCRIBE.value:
+            self.manager.channels.unsubscribe(message.get("payload", {}).get("run_id", ""), websocket)
+
+    def _open_run(self, websocket: WebSocket, kind: str, name: str) -> str:
+        """Open a channel for a new run, subscribe this connection and announce it."""
+        run_id = uuid.uuid4().hex[:12]
+        channel = self.manager.channels.open(run_id, kind, name, owner=websocket)
+        self.manager.channels.publish(
+            run_id,
+            outbound(
+                MessageType.RUN_STARTED,
+                RunPayload(run_id=run_id, kind=kind, name=name, subscribers=len(channel.subscribers)),
+                run_id=run_id,
+            ),
+        )
+        return run_id
+
+    async def _subscribe(self, websocket: WebSocket, run_id: str) -> None:
+        """Watch another connection's run; recent messages are replayed first."""
+        channel = self.manager.channels.subscribe(run_id, websocket)
+        if channel is None:
+            await self._send_error(websocket, f"Unknown run: {run_id}")
+            return
+        await self.manager.send_json(
+            websocket,
+            outbound(
+                MessageType.SUBSCRIBED,
+                RunPayload(
+                    run_id=run_id,
+                    kind=channel.kind,
+                    name=channel.name,
+                    subscribers=len(channel.subscribers),
+                    finished=channel.finished,
+                ),
+                run_id=run_id,
+            ),
+        )
+
+    async def _send_error(self, websocket: WebSocket, message: str) -> None:
+        await self.manager.send_json(
+            websocket, outbound(MessageType.ERROR, StatusPayload(status="error", message=message))
+        )
+
     async def _start_agent(self, websocket: WebSocket) -> None:
         """Start the CUA agent and stream results."""
-        if self.agent_service and self.agent_service.is_running:
-            await self.manager.send_json(
-                websocket,
-                WebSocketMessage(
-                    type=MessageType.ERROR,
-                    payload=StatusPayload(
-                        status="error",
-                        message="Agent is already running",
-                    ).model_dump(),
-                ).model_dump(),
-            )
+        # The task is set before this returns; is_running only flips once the agent starts
+        if self.agent_task and not self.agent_task.done():
+            await self.manager.send_json(websocket, AGENT_ALREADY_RUNNING.render())
             return
 
         self.agent_service = CUAAgentService()
+        run_id = self.agent_run_id = self._open_run(websocket, "agent", "agent")
+        publish = self.manager.channels.publish
 
         async def run_agent():
             try:
                 async for msg in self.agent_service.run_task():
-                    await self.manager.send_json(websocket, msg.model_dump())
-                    # Small delay to prevent overwhelming the WebSocket
-                    await asyncio.sleep(0.05)
+                    publish(run_id, msg)
             except Exception as e:
                 logger.error(f"Agent error: {e}")
-                await self.manager.send_json(
-                    websocket,
-                    WebSocketMessage(
-                        type=MessageType.ERROR,
-                        payload=StatusPayload(
+                publish(
+                    run_id,
+                    outbound(
+                        MessageType.ERROR,
+                        StatusPayload(
                             status="error",
                             message=str(e),
-                        ).model_dump(),
-                    ).model_dump(),
+                        ),
+                    ),
                 )
+            finally:
+                self.manager.channels.finish(run_id)
 
         self.agent_task = asyncio.create_task(run_agent())
 
     async def _run_api(self, websocket: WebSocket, endpoint: str, params: dict = None) -> None:
         """Run an API endpoint and stream logs."""
-        params = params or {}
-        if self.api_service and hasattr(self.api_service, 'is_running') and self.api_service.is_running:
-            await self.manager.send_json(
-                websocket,
-                WebSocketMessage(
-                    type=MessageType.ERROR,
-                    payload=StatusPayload(
-                        status="error",
-                        message="An API is already running",
-                    ).model_dump(),
-                ).model_dump(),
-            )
+        # Copied so the client's payload is never modified
+        params = dict(params or {})
+        # self.api_job is only assigned inside the task, after the job is submitted
+        if self.api_task and not self.api_task.done():
+            await self.manager.send_json(websocket, API_ALREADY_RUNNING.render())
             return
 
+        run_id = self.api_run_id = self._open_run(websocket, "api", endpoint)
+        publish = self.manager.channels.publish
+
         # Send status that we're starting
-        await self.manager.send_json(
-            websocket,
-            WebSocketMessage(
-                type=MessageType.STATUS,
-                payload=StatusPayload(
+        publish(
+            run_id,
+            outbound(
+                MessageType.STATUS,
+                StatusPayload(
                     status="running",
                     message=f"Starting API: {endpoint}",
-                ).model_dump(),
-            ).model_dump(),
+                ),
+            ),
         )
 
         async def stream_log(log_entry: LogEntry):
             """Callback to stream logs to WebSocket."""
-            await self.manager.send_json(
-                websocket,
-                WebSocketMessage(
-                    type=MessageType.API_LOG,
-                    payload=APILogPayload(
+            publish(
+                run_id,
+                outbound(
+                    MessageType.API_LOG,
+                    APILogPayload(
                         message=log_entry.message,
                         timestamp=log_entry.timestamp,
                         level=log_entry.level,
-                    ).model_dump(),
-                ).model_dump(),
+                    ),
+                ),
             )
 
+        async def stream_event(kind: str, payload: dict):
+            """Callback to stream partial results (decoded rows, row batches) to WebSocket."""
+            if kind == "partial":
+                message = outbound(MessageType.API_PARTIAL, APIPartialPayload(endpoint=endpoint, **payload))
+            else:
+                message = outbound(MessageType.API_BATCH, APIBatchPayload(endpoint=endpoint, kind=kind, **payload))
+            publish(run_id, message)
+
         async def run_api():
             try:
-                if endpoint == "patients":
-                    self.api_service = PatientAPIService(log_callback=stream_log)
-                    result = await self.api_service.run()
-                elif endpoint == "patient_chart":
-                    patient_name = params.get("patient_name", "Jane Smith")
-                    self.api_service = PatientChartAPIService(patient_name=patient_name, log_callback=stream_log)
-                    result = await self.api_service.run()
-                elif endpoint == "reports":
-                    patient_name = params.get("patient_name", "Jane Smith")
-                    self.api_service = ReportsAPIService(patient_name=patient_name, log_callback=stream_log)
-                    result = await self.api_service.run()
-                else:
-                    await self.manager.send_json(
-                        websocket,
-                        WebSocketMessage(
-                            type=MessageType.ERROR,
-                            payload=StatusPayload(
+                workflow = WORKFLOWS.get(endpoint)
+                if workflow is None:
+                    publish(
+                        run_id,
+                        outbound(
+                            MessageType.ERROR,
+                            StatusPayload(
                                 status="error",
                                 message=f"Unknown API endpoint: {endpoint}",
-                            ).model_dump(),
-                        ).model_dump(),
+                            ),
+                        ),
+                    )
+                    return
+
+                missing = [name for name in workflow.params if not params.get(name)]
+                if missing:
+                    publish(
+                        run_id,
+                        outbound(
+                            MessageType.ERROR,
+                            StatusPayload(
+                                status="error",
+                                message=f"Missing parameter(s) for {endpoint}: {', '.join(missing)}",
+                            ),
+                        ),
                     )
                     return
 
+                self.api_job = await get_job_scheduler().submit(
+                    workflow,
+                    params=params,
+                    client_id=f"ws-{id(websocket)}",
+                    log_callback=stream_log,
+                    event_callback=stream_event,
+                )
+                position = get_job_scheduler().position(self.api_job)
+                if position:
+                    await stream_log(LogEntry(
+                        timestamp=self.api_job.created_at,
+                        message=f"Queued behind {position} job(s)",
+                    ))
+                await self.api_job.wait()
+                result = self.api_job.result
+
                 # Send the final response
-                await self.manager.send_json(
-                    websocket,
-                    WebSocketMessage(
-                        type=MessageType.API_RESPONSE,
-                        payload=APIResponsePayload(
+                publish(
+                    run_id,
+                    outbound(
+                        MessageType.API_RESPONSE,
+                        APIResponsePayload(
                             endpoint=endpoint,
                             status=result.status,
                             data=result.data,
                             error=result.error,
-                        ).model_dump(),
-                    ).model_dump(),
+                        ),
+                    ),
                 )
 
                 # Send completion status
-                await self.manager.send_json(
-                    websocket,
-                    WebSocketMessage(
-                        type=MessageType.STATUS,
-                        payload=StatusPayload(
+                publish(
+                    run_id,
+                    outbound(
+                        MessageType.STATUS,
+                        StatusPayload(
                             status="completed",
                             message=f"API {endpoint} completed",
-                        ).model_dump(),
-                    ).model_dump(),
+                        ),
+                    ),
                 )
 
+            except QueueFullError as e:
+                publish(
+                    run_id,
+                    outbound(
+                        MessageType.ERROR,
+                        StatusPayload(
+                            status="error",
+                            message=f"Server busy: {e}",
+                        ),
+                    ),
+                )
             except Exception as e:
                 logger.error(f"API error: {e}")
-                await self.manager.send_json(
-                    websocket,
-                    WebSocketMessage(
-                        type=MessageType.ERROR,
-                        payload=StatusPayload(
+                publish(
+                    run_id,
+                    outbound(
+                        MessageType.ERROR,
+                        StatusPayload(
                             status="error",
                             message=str(e),
-                        ).model_dump(),
-                    ).model_dump(),
+                        ),
+                    ),
                 )
             finally:
-                self.api_service = None
+                self.manager.channels.finish(run_id)
 
         self.api_task = asyncio.create_task(run_api())
 
@@ -230,38 +316,34 @@ class WebSocketHandler:
         if self.agent_service:
             await self.agent_service.stop()
 
-        if self.api_service and hasattr(self.api_service, 'stop'):
-            await self.api_service.stop()
+        if self.api_job:
+            await get_job_scheduler().cancel(self.api_job.id)
 
-        if self.agent_task:
-            self.agent_task.cancel()
-            try:
-                await self.agent_task
-            except asyncio.CancelledError:
-                pass
+        await self._cancel_tasks()
 
-        if self.api_task:
-            self.api_task.cancel()
-            try:
-                await self.api_task
-            except asyncio.CancelledError:
-                pass
+        run_ids = [run_id for run_id in (self.agent_run_id, self.api_run_id) if run_id]
+        if run_ids:
+            # Viewers of the stopped runs see it too
+            for run_id in run_ids:
+                self.manager.channels.publish(run_id, STOPPED.render(run_id))
+        else:
+            await self.manager.send_json(websocket, STOPPED.render())
 
-        await self.manager.send_json(
-            websocket,
-            WebSocketMessage(
-                type=MessageType.STATUS,
-                payload=StatusPayload(
-                    status="stopped",
-                    message="Stopped by user",
-                ).model_dump(),
-            ).model_dump(),
-        )
+    async def _cancel_tasks(self) -> None:
+        """Cancel the agent and API tasks and wait for them to finish."""
+        for task in (self.agent_task, self.api_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
 
     async def _cleanup(self, websocket: WebSocket) -> None:
         """Clean up on disconnect."""
         if self.agent_service:
             await self.agent_service.stop()
-        if self.api_service and hasattr(self.api_service, 'stop'):
-            await self.api_service.stop()
+        if self.api_job:
+            await get_job_scheduler().cancel(self.api_job.id)
+        await self._cancel_tasks()
         await self.manager.disconnect(websocket)
@@ -1,50 +1,98 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Any, Dict, List, Union
 import asyncio
 import logging
 
+from ..config import get_settings
+from .channels import ChannelRegistry
+from .encoding import OutboundMessage
+from .frame_differ import FrameDiffer
+from .outbox import Outbox
+
 logger = logging.getLogger(__name__)
 
 
 class ConnectionManager:
-    """Manages WebSocket connections and message broadcasting."""
+    """Manages WebSocket connections and message broadcasting.
+
+    Every connection gets an ``Outbox`` with its own writer task, so sending
+    only enqueues and a slow client never holds up the others. Runs publish
+    through ``channels`` so several connections can watch the same run.
+    """
 
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.outboxes: Dict[WebSocket, Outbox] = {}
         self._lock = asyncio.Lock()
+        settings = get_settings()
+        self.channels = ChannelRegistry(
+            self, history_size=settings.ws_channel_history, linger=settings.ws_channel_linger
+        )
 
-    async def connect(self, websocket: WebSocket) -> None:
+    async def connect(self, websocket: WebSocket, binary_frames: bool = False, tile_deltas: bool = False) -> None:
         """Accept and register a new WebSocket connection."""
         await websocket.accept()
+        settings = get_settings()
+        outbox = Outbox(
+            websocket,
+            max_size=settings.ws_send_queue_size,
+            hard_limit=settings.ws_send_queue_hard_limit,
+            send_timeout=settings.ws_send_timeout,
+            binary_frames=binary_frames,
+            differ_factory=(lambda: FrameDiffer(
+                tile_size=settings.ws_frame_tile_size,
+                keyframe_interval=settings.ws_keyframe_interval,
+                max_dirty_ratio=settings.ws_delta_max_dirty_ratio,
+            )) if tile_deltas else None,
+            on_close=self._on_outbox_closed,
+        )
+        outbox.start()
         async with self._lock:
             self.active_connections.append(websocket)
-        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+            self.outboxes[websocket] = outbox
+        logger.info(
+            f"Client connected (frames={'binary' if binary_frames else 'json'}, "
+            f"deltas={'tiles' if tile_deltas else 'off'}). "
+            f"Total connections: {len(self.active_connections)}"
+        )
 
     async def disconnect(self, websocket: WebSocket) -> None:
         """Remove a WebSocket connection."""
         async with self._lock:
             if websocket in self.active_connections:
                 self.active_connections.remove(websocket)
+            outbox = self.outboxes.pop(websocket, None)
+        self.channels.unsubscribe_all(websocket)
+        if outbox:
+            await outbox.close()
         logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
 
-    async def send_json(self, websocket: WebSocket, data: dict) -> None:
-        """Send JSON data to a specific client."""
+    async def _on_outbox_closed(self, websocket: WebSocket) -> None:
+        """The writer gave up on a client (send failed or it stopped reading)."""
+        await self.disconnect(websocket)
         try:
-            await websocket.send_json(data)
-        except Exception as e:
-            logger.error(f"Error sending to client: {e}")
-            await self.disconnect(websocket)
-
-    async def broadcast(self, data: dict) -> None:
-        """Broadcast JSON data to all connected clients."""
-        disconnected = []
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def send_json(self, websocket: WebSocket, data: Union[Dict[str, Any], OutboundMessage]) -> None:
+        """Queue JSON data for a specific client."""
+        outbox = self.outboxes.get(websocket)
+        if outbox:
+            outbox.put(data)
+
+    async def broadcast(self, data: Union[Dict[str, Any], OutboundMessage]) -> None:
+        """Queue JSON data for all connected clients; it is encoded once for all of them."""
+        if not isinstance(data, OutboundMessage):
+            data = OutboundMessage(data)
         async with self._lock:
-            for connection in self.active_connections:
-                try:
-                    await connection.send_json(data)
-                except Exception:
-                    disconnected.append(connection)
-
-        # Clean up disconnected clients
-        for conn in disconnected:
-            await self.disconnect(conn)
+            outboxes = list(self.outboxes.values())
+        for outbox in outboxes:
+            outbox.put(data)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "connections": len(self.active_connections),
+            "queued": sum(outbox.stats()["queued"] for outbox in self.outboxes.values()),
+            "runs": len(self.channels.channels),
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Union
+
+from fastapi import WebSocket
+
+from ..aio import split_data_url
+from ..cua.message_types import MessageType
+from ..metrics import metrics
+from .encoding import OutboundMessage, dumps
+from .frame_differ import FrameDiffer
+from .frames import binary_frame, delta_message
+
+logger = logging.getLogger(__name__)
+
+# Only the newest frame matters; a queued one is replaced in place
+COALESCED_TYPES = {MessageType.SCREENSHOT.value}
+# Dropped when the queue is full; everything else is kept
+DROPPABLE_TYPES = {MessageType.API_LOG.value}
+
+
+class SlowClientError(Exception):
+    """The client stopped reading and its queue overflowed with messages that cannot be dropped."""
+
+
+class Outbox:
+    """Bounded outbound queue for one WebSocket, drained by its own writer task.
+
+    ``put`` never waits on the socket. Screenshots are coalesced so at most
+    one per run is queued; when the queue is full a log line is dropped (the
+    incoming one, or the oldest queued one to make room for a message that
+    matters more). Other messages are always kept, up to ``hard_limit``;
+    past that the client is treated as stuck and ``on_close`` is called.
+    The writer sends as fast as the client reads, as text frames of the
+    message's cached JSON, so a message shared by several outboxes is
+    encoded once.
+
+    With ``binary_frames`` screenshots are sent as binary frames (see
+    ``frames.py``) instead of base64 JSON, and with a tile differ only the
+    changed parts of the screen are sent between keyframes. Either
+    conversion happens in the writer, off the event loop, so coalesced
+    frames are never encoded and the diff is always against the frame
+    this client actually received for the same run.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_size: int = 64,
+        hard_limit: int = 256,
+        send_timeout: float = 10.0,
+        binary_frames: bool = False,
+        differ_factory: Optional[Callable[[], FrameDiffer]] = None,
+        on_close: Optional[Callable[[WebSocket], Awaitable[None]]] = None,
+    ):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.hard_limit = max(hard_limit, max_size)
+        self.send_timeout = send_timeout
+        self.binary_frames = binary_frames
+        # Binary clients always get repeat suppression, even without tile deltas
+        if differ_factory is None and binary_frames:
+            differ_factory = lambda: FrameDiffer(tiles=False)
+        self.differ_factory = differ_factory
+        self._differs: Dict[Optional[str], FrameDiffer] = {}
+        self.on_close = on_close
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        # Entries are [type, message] lists so a queued screenshot can be swapped in place
+        self._queue: Deque[List[Any]] = deque()
+        # Queued screenshot entry per run id
+        self._screenshots: Dict[Optional[str], List[Any]] = {}
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        self.closed = True
+        self._queue.clear()
+        self._screenshots.clear()
+        writer, self._writer = self._writer, None
+        if writer and writer is not asyncio.current_task():
+            writer.cancel()
+            try:
+                await writer
+            except asyncio.CancelledError:
+                pass
+
+    def put(self, message: Union[Dict[str, Any], OutboundMessage]) -> bool:
+        """Queue a message; returns False if it was dropped."""
+        if self.closed:
+            return False
+        if not isinstance(message, OutboundMessage):
+            message = OutboundMessage(message)
+        msg_type = message.type
+
+        queued = self._screenshots.get(message.run_id) if msg_type in COALESCED_TYPES else None
+        if queued is not None:
+            queued[1] = message
+            self.coalesced += 1
+            metrics.inc("ws_messages_coalesced_total", type=msg_type)
+            return True
+
+        if len(self._queue) >= self.max_size:
+            if msg_type in DROPPABLE_TYPES:
+                return self._drop(msg_type)
+            if not self._drop_oldest_droppable() and len(self._queue) >= self.hard_limit:
+                self._overflow()
+                return False
+
+        entry = [msg_type, message]
+        if msg_type in COALESCED_TYPES:
+            self._screenshots[message.run_id] = entry
+        self._queue.append(entry)
+        self._ready.set()
+        return True
+
+    def _drop(self, msg_type: str) -> bool:
+        self.dropped += 1
+        metrics.inc("ws_messages_dropped_total", type=msg_type)
+        return False
+
+    def _drop_oldest_droppable(self) -> bool:
+        for entry in self._queue:
+            if entry[0] in DROPPABLE_TYPES:
+                self._queue.remove(entry)
+                self._drop(entry[0])
+                return True
+        return False
+
+    def _overflow(self) -> None:
+        logger.warning(
+            f"[Outbox] Client stopped reading with {len(self._queue)} queued messages, disconnecting"
+        )
+        metrics.inc("ws_slow_client_disconnects_total")
+        self.closed = True
+        self._ready.set()
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    if self.closed:
+                        raise SlowClientError()
+                    self._ready.clear()
+                    await self._ready.wait()
+                if self.closed:
+                    raise SlowClientError()
+
+                msg_type, message = self._queue.popleft()
+                if msg_type in COALESCED_TYPES:
+                    self._screenshots.pop(message.run_id, None)
+                if self.differ_factory is not None and msg_type in COALESCED_TYPES:
+                    frame = await asyncio.to_thread(self._encode_screenshot, message)
+                    if frame is None:
+                        continue
+                    if isinstance(frame, bytes):
+                        metrics.inc("ws_frame_bytes_total", len(frame))
+                        send = self.websocket.send_bytes(frame)
+                    else:
+                        send = self.websocket.send_text(frame)
+                else:
+                    send = self.websocket.send_text(message.text())
+                await asyncio.wait_for(send, timeout=self.send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not isinstance(e, SlowClientError):
+                logger.error(f"Error sending to client: {e}")
+            self.closed = True
+            self._queue.clear()
+            self._screenshots.clear()
+            if self.on_close:
+                await self.on_close(self.websocket)
+
+    def _encode_screenshot(self, message: OutboundMessage) -> Union[bytes, str, None]:
+        """Diff a screenshot against the last one sent; None when there is nothing to send."""
+        data = message.data
+        mime, encoded = split_data_url((data.get("payload") or {}).get("image_data", ""))
+        image = base64.b64decode(encoded)
+        run_id = message.run_id
+        differ = self._differs.get(run_id)
+        if differ is None:
+            differ = self._differs[run_id] = self.differ_factory()
+        update = differ.diff(image)
+        metrics.inc("ws_frames_total", encoding=update.kind)
+        if self.binary_frames:
+            return binary_frame(data, mime, update)
+        delta = delta_message(data, update)
+        if delta is data:
+            # Keyframes go out as the original message, whose JSON may already be cached
+            return message.text()
+        return dumps(delta) if delta is not None else None
+
+    def forget_run(self, run_id: str) -> None:
+        """Drop the frame state kept for a run this client no longer watches."""
+        self._differs.pop(run_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
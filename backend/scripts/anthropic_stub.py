@@ -0,0 +1,97 @@
+"""
+Local stand-in for the Anthropic Messages API.
+
+Lets the extraction path be exercised and benchmarked without network access:
+
+    uvicorn scripts.anthropic_stub:app --port 9000
+    ANTHROPIC_BASE_URL=http://127.0.0.1:9000 python -m scripts.bench_anthropic_client
+
+STUB_LATENCY_MS controls the simulated model latency (default 200). Requests
+with "stream": true get server-sent events, with the JSON text split into
+small deltas spread over the same latency.
+"""
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Anthropic Messages API stub")
+
+STUB_LATENCY_MS = float(os.environ.get("STUB_LATENCY_MS", "200"))
+STUB_CHUNK_CHARS = 24
+
+STUB_RESULT = {
+    "patients": [
+        {
+            "patient_id": 1,
+            "first_name": "Jane",
+            "last_name": "Smith",
+            "age": 42,
+            "wireless_phone": "(503)555-0100",
+            "home_phone": None,
+            "work_phone": None,
+            "address": "1 Main St",
+            "city": "Salem",
+            "status": "Patient",
+        }
+    ],
+    "total_count": 1,
+}
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    """Return a canned extraction after the configured latency."""
+    body = await request.json()
+    images = sum(
+        1
+        for message in body.get("messages", [])
+        for block in message.get("content", [])
+        if block.get("type") == "image"
+    )
+    usage = {"input_tokens": 1500 * images, "output_tokens": 200}
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, usage), media_type="text/event-stream")
+
+    await asyncio.sleep(STUB_LATENCY_MS / 1000.0)
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model"),
+        "content": [{"type": "text", "text": json.dumps(STUB_RESULT)}],
+        "stop_reason": "end_turn",
+        "usage": usage,
+    }
+
+
+def _event(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n"
+
+
+async def _stream(body: dict, usage: dict):
+    """Yield the canned extraction as Messages API streaming events."""
+    text = json.dumps(STUB_RESULT)
+    chunks = [text[i:i + STUB_CHUNK_CHARS] for i in range(0, len(text), STUB_CHUNK_CHARS)]
+    delay = STUB_LATENCY_MS / 1000.0 / max(1, len(chunks))
+
+    yield _event("message_start", {"message": {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model"),
+        "content": [],
+        "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1},
+    }})
+    yield _event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield _event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+    yield _event("content_block_stop", {"index": 0})
+    yield _event("message_delta", {
+        "delta": {"stop_reason": "end_turn"},
+        "usage": {"output_tokens": usage["output_tokens"]},
+    })
+    yield _event("message_stop", {})
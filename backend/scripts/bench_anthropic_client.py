@@ -0,0 +1,56 @@
+"""
+Latency benchmark for the extraction HTTP path.
+
+Run against scripts/anthropic_stub.py to measure connection reuse offline:
+
+    ANTHROPIC_BASE_URL=http://127.0.0.1:9000 python -m scripts.bench_anthropic_client --requests 50
+"""
+import argparse
+import asyncio
+import base64
+import statistics
+import time
+
+from app.api.anthropic_processor import _call_anthropic_multiple, PATIENT_EXTRACTION_MULTIPLE_PROMPT
+from app.api.http_client import start_http_client, close_http_client
+
+# 1x1 transparent PNG
+TINY_PNG = base64.b64encode(
+    bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+        "1f15c4890000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082"
+    )
+).decode("utf-8")
+
+
+async def main(requests: int, concurrency: int) -> None:
+    await start_http_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await _call_anthropic_multiple(
+                [f"data:image/png;base64,{TINY_PNG}"], "stub-key", PATIENT_EXTRACTION_MULTIPLE_PROMPT
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        await close_http_client()
+
+    latencies.sort()
+    print(f"requests={requests} concurrency={concurrency}")
+    print(f"p50={statistics.median(latencies):.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms "
+          f"max={latencies[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,85 @@
+"""
+Event-loop lag benchmark for screenshot file I/O and base64 encoding.
+
+Simulates several concurrent runs, each repeatedly reading a screenshot-sized
+file from disk and base64-encoding it (what the latest-frame fallback used to do
+inline), while a probe task measures how late the loop wakes it up:
+
+    python -m scripts.bench_event_loop_lag --runs 4 --size-mb 2 --seconds 5
+
+"inline" does the work on the event loop; "offloaded" goes through app.aio.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import tempfile
+import time
+
+from app import aio
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    """Sleep for PROBE_INTERVAL and record how late the loop resumes us."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def run_inline(path: str, stop: asyncio.Event, counter: list) -> None:
+    while not stop.is_set():
+        with open(path, "rb") as f:
+            _ = f"data:image/png;base64,{base64.b64encode(f.read()).decode('utf-8')}"
+        counter[0] += 1
+        await asyncio.sleep(0)
+
+
+async def run_offloaded(path: str, stop: asyncio.Event, counter: list) -> None:
+    while not stop.is_set():
+        await aio.to_data_url(await aio.read_bytes(path))
+        counter[0] += 1
+
+
+async def measure(mode: str, path: str, runs: int, seconds: float) -> None:
+    stop = asyncio.Event()
+    lags: list = []
+    counter = [0]
+    worker = run_inline if mode == "inline" else run_offloaded
+    tasks = [asyncio.create_task(probe(lags, stop))]
+    tasks += [asyncio.create_task(worker(path, stop, counter)) for _ in range(runs)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    lags.sort()
+    print(
+        f"{mode:>9}: frames={counter[0]:<6} "
+        f"lag p50={statistics.median(lags):.2f}ms "
+        f"p99={lags[int(len(lags) * 0.99) - 1]:.2f}ms "
+        f"max={lags[-1]:.2f}ms"
+    )
+
+
+async def main(runs: int, size_mb: float, seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "frame.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(int(size_mb * 1024 * 1024)))
+
+        print(f"runs={runs} frame={size_mb}MB duration={seconds}s")
+        for mode in ("inline", "offloaded"):
+            await measure(mode, path, runs, seconds)
+    aio.shutdown_io()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--size-mb", type=float, default=2.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.size_mb, args.seconds))
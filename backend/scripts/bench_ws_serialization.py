@@ -0,0 +1,113 @@
+"""
+Per-message CPU cost of building, publishing and encoding WebSocket messages.
+
+Both paths run a message from where it is produced to the text every
+subscriber is sent:
+
+- "send_json": what the backend used to do. The agent service built
+  ``WebSocketMessage(payload=Payload(...).model_dump())``, the handler
+  dumped it again, the channel copied it with the run id, and each
+  subscriber's ``send_json`` ran the stdlib encoder.
+- "outbound": the production path now. ``CUAAgentService`` and the
+  handler yield ``outbound(...)`` (or a ``StaticMessage``), it is published
+  through a real ``ChannelRegistry``, and every subscriber's outbox sends
+  the message's cached ``text()``.
+
+    python -m scripts.bench_ws_serialization --subscribers 3 --size-mb 1.5
+"""
+import argparse
+import base64
+import json
+import os
+import time
+from typing import Callable, Dict
+
+from app.cua.message_types import (
+    APILogPayload,
+    MessageType,
+    ScreenshotPayload,
+    StatusPayload,
+    WebSocketMessage,
+)
+from app.websocket.channels import ChannelRegistry
+from app.websocket.encoding import StaticMessage, outbound
+
+RUN_ID = "bench"
+
+
+class TextOutbox:
+    """Stands in for an Outbox: does what its writer does for a JSON client."""
+
+    def put(self, message) -> None:
+        message.text()
+
+
+class Manager:
+    def __init__(self, subscribers: int):
+        self.outboxes: Dict[object, TextOutbox] = {object(): TextOutbox() for _ in range(subscribers)}
+
+
+def registry_for(subscribers: int) -> ChannelRegistry:
+    manager = Manager(subscribers)
+    registry = ChannelRegistry(manager, history_size=200)
+    owner, *viewers = manager.outboxes
+    registry.open(RUN_ID, "agent", "bench", owner)
+    for viewer in viewers:
+        registry.subscribe(RUN_ID, viewer)
+    return registry
+
+
+def legacy(msg_type: MessageType, payload, subscribers: int) -> Callable[[], None]:
+    def send() -> None:
+        data = {**WebSocketMessage(type=msg_type, payload=payload.model_dump()).model_dump(), "run_id": RUN_ID}
+        for _ in range(subscribers):
+            json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return send
+
+
+def fast(build: Callable[[], object], subscribers: int) -> Callable[[], None]:
+    registry = registry_for(subscribers)
+    return lambda: registry.publish(RUN_ID, build())
+
+
+def cpu_per_message(send: Callable[[], None], iterations: int) -> float:
+    """Process CPU time per call, in microseconds."""
+    start = time.process_time()
+    for _ in range(iterations):
+        send()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main(iterations: int, subscribers: int, size_mb: float) -> None:
+    image = base64.b64encode(os.urandom(int(size_mb * 1024 * 1024 * 3 / 4))).decode("ascii")
+    screenshot = ScreenshotPayload(image_data=f"data:image/png;base64,{image}", step=7)
+    log = APILogPayload(message="Extracting page 3 of Select Patient grid", timestamp=time.time())
+    status = StatusPayload(status="running", message="Agent started, launching Open Dental...")
+    running = StaticMessage(MessageType.STATUS, status)
+
+    cases = [
+        ("api_log", MessageType.API_LOG, log, lambda: outbound(MessageType.API_LOG, log), iterations),
+        ("status", MessageType.STATUS, status, running.render, iterations),
+        (
+            "screenshot",
+            MessageType.SCREENSHOT,
+            screenshot,
+            lambda: outbound(MessageType.SCREENSHOT, screenshot),
+            max(1, iterations // 100),
+        ),
+    ]
+
+    print(f"subscribers={subscribers} screenshot={size_mb}MB")
+    for name, msg_type, payload, build, count in cases:
+        before = cpu_per_message(legacy(msg_type, payload, subscribers), count)
+        after = cpu_per_message(fast(build, subscribers), count)
+        print(f"{name:>10}: send_json {before:10.1f}us  outbound {after:10.1f}us  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--subscribers", type=int, default=1)
+    parser.add_argument("--size-mb", type=float, default=1.5)
+    args = parser.parse_args()
+    main(args.iterations, args.subscribers, args.size_mb)
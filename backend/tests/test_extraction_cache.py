@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+from app.api.extraction_cache import ExtractionCache
+
+
+def _key(image: bytes = b"png", prompt: str = "prompt", model: str = "model", variant: str = "") -> str:
+    return ExtractionCache.make_key([image], prompt, model, variant)
+
+
+def test_key_changes_with_image_prompt_model_and_variant():
+    base = _key()
+    assert base == _key()
+    assert base != _key(image=b"other")
+    assert base != _key(prompt="other")
+    assert base != _key(model="other")
+    assert base != _key(variant="grid")
+
+
+def test_results_are_copied_in_and_out():
+    cache = ExtractionCache()
+    value = {"patients": [{"patient_id": 1}]}
+    cache.set("k", value)
+    value["patients"].append({"patient_id": 2})
+
+    hit = cache.get("k")
+    assert hit == {"patients": [{"patient_id": 1}]}
+    hit["patients"].clear()
+    assert cache.get("k") == {"patients": [{"patient_id": 1}]}
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 0}
+
+
+def test_expired_entries_miss():
+    cache = ExtractionCache(ttl=-1)
+    cache.set("k", {"a": 1})
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ExtractionCache(max_entries=2)
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    cache.get("a")
+    cache.set("c", {"n": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+
+
+def test_disk_entries_survive_a_new_instance(tmp_path):
+    ExtractionCache(disk_dir=str(tmp_path)).set("k", {"a": 1})
+    assert ExtractionCache(disk_dir=str(tmp_path)).get("k") == {"a": 1}
+
+
+def test_async_accessors_use_the_disk(tmp_path):
+    async def scenario():
+        await ExtractionCache(disk_dir=str(tmp_path)).aset("k", {"a": 1})
+        return await ExtractionCache(disk_dir=str(tmp_path)).aget("k")
+
+    assert asyncio.run(scenario()) == {"a": 1}
+
+
+def test_unreadable_disk_entry_is_discarded(tmp_path):
+    path = tmp_path / "k.json"
+    path.write_text("{not json")
+
+    assert ExtractionCache(disk_dir=str(tmp_path)).get("k") is None
+    assert not os.path.exists(path)
@@ -0,0 +1,66 @@
+import io
+
+from PIL import Image, ImageChops, ImageDraw
+
+from app.websocket.frame_differ import DELTA, FULL, REPEAT, FrameDiffer
+
+
+def _screen(boxes=(), size=(256, 128), compress_level: int = 6) -> bytes:
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for box in boxes:
+        draw.rectangle(box, fill="black")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", compress_level=compress_level)
+    return buffer.getvalue()
+
+
+def _apply(base: bytes, update) -> Image.Image:
+    """What a client shows after painting the update's tiles over ``base``."""
+    screen = Image.open(io.BytesIO(base)).convert("RGB")
+    for tile in update.tiles:
+        screen.paste(Image.open(io.BytesIO(tile.data)), (tile.x, tile.y))
+    return screen
+
+
+def test_first_frame_is_a_keyframe_and_repeats_are_suppressed():
+    differ = FrameDiffer(tile_size=32)
+    blank = _screen()
+    assert differ.diff(blank).kind == FULL
+    assert differ.diff(blank).kind == REPEAT
+    # Same pixels, different encoding
+    assert differ.diff(_screen(compress_level=1)).kind == REPEAT
+
+
+def test_small_change_sends_only_the_dirty_tiles():
+    differ = FrameDiffer(tile_size=32)
+    before, after = _screen(), _screen([(40, 40, 90, 50)])
+    differ.diff(before)
+    update = differ.diff(after)
+
+    assert update.kind == DELTA
+    # The change spans tiles x=32..96 of one tile row, merged into a single run
+    assert [(t.x, t.y, t.width, t.height) for t in update.tiles] == [(32, 32, 64, 32)]
+    expected = Image.open(io.BytesIO(after)).convert("RGB")
+    assert ImageChops.difference(_apply(before, update), expected).getbbox() is None
+
+
+def test_large_changes_and_resizes_send_keyframes():
+    differ = FrameDiffer(tile_size=32, max_dirty_ratio=0.5)
+    differ.diff(_screen())
+    assert differ.diff(_screen([(0, 0, 200, 127)])).kind == FULL
+    assert differ.diff(_screen([(0, 0, 200, 127)], size=(128, 128))).kind == FULL
+
+
+def test_keyframe_interval_forces_a_full_frame():
+    differ = FrameDiffer(tile_size=32, keyframe_interval=3)
+    kinds = [differ.diff(_screen([(x, 0, x + 4, 4)])).kind for x in range(0, 40, 8)]
+    assert kinds == [FULL, DELTA, DELTA, FULL, DELTA]
+
+
+def test_without_tiles_only_identical_bytes_are_suppressed():
+    differ = FrameDiffer(tiles=False)
+    blank = _screen()
+    assert differ.diff(blank).kind == FULL
+    assert differ.diff(blank).kind == REPEAT
+    assert differ.diff(_screen(compress_level=1)).kind == FULL
@@ -0,0 +1,200 @@
+import asyncio
+import base64
+import io
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.api import anthropic_processor, grid_scraper
+from app.api.grid_scraper import PatientGridScraper
+from app.api.image_hash import NearDuplicateIndex, content_digest, extraction_scope
+from app.config import get_settings
+
+
+class Grid:
+    """A fake Select Patient grid of ``pages`` pages, each drawn distinctly."""
+
+    def __init__(self, pages: int, fail_scroll_at: int = None):
+        self.pages = pages
+        self.fail_scroll_at = fail_scroll_at
+        self.position = 0
+        self.right = False
+        self.shots = []
+
+    async def screenshot(self) -> bytes:
+        await asyncio.sleep(0)
+        page = min(self.position, self.pages - 1)
+        img = Image.new("RGB", (120, 90), "white")
+        left = page * 25 + (10 if self.right else 0)
+        ImageDraw.Draw(img).rectangle([left, page * 15, left + 20, page * 15 + 30], fill="black")
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        self.shots.append(buffer.getvalue())
+        return buffer.getvalue()
+
+    async def get_screen_size(self):
+        return {"width": 120, "height": 90}
+
+    async def move_cursor(self, x, y):
+        await asyncio.sleep(0)
+
+    async def scroll(self, dx, dy):
+        await asyncio.sleep(0)
+        self.right = dx > 0
+
+    async def scroll_down(self, clicks):
+        await asyncio.sleep(0)
+        if self.position == self.fail_scroll_at:
+            raise RuntimeError("sandbox went away")
+        self.position += 1
+
+
+class Runner:
+    def __init__(self, grid: Grid):
+        self.is_running = True
+        self.settings = get_settings()
+        self.computer = SimpleNamespace(interface=grid)
+        self.events = []
+        self.logs = []
+
+    def _log(self, message, level="info"):
+        self.logs.append((level, message))
+
+    async def emit(self, event, payload):
+        self.events.append(payload)
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    synced = []
+
+    async def settle(self):
+        pass
+
+    monkeypatch.setattr(PatientGridScraper, "_settle", settle)
+    monkeypatch.setattr(
+        grid_scraper, "get_patient_store",
+        lambda: SimpleNamespace(upsert_patients=lambda rows: synced.append(rows) or {"inserted": len(rows)}),
+    )
+    return synced
+
+
+def _extract(monkeypatch, fail=None, error=None, block=None):
+    """Fake page extraction: one patient per page, PatNum = page number."""
+    calls = []
+
+    async def extract_grid_page(page_key, screenshot, api_key, scrolled=False, digest=None):
+        calls.append((page_key, screenshot, digest))
+        page = int(page_key[4:].split("_")[0])
+        if block is not None:
+            try:
+                await block.wait()
+            except asyncio.CancelledError:
+                calls.append(("cancelled", page_key, None))
+                raise
+        if page == fail:
+            raise RuntimeError("model timed out")
+        if page == error:
+            return {"error": "unparseable"}
+        return {"patients": [{"patient_id": page, "first_name": None if scrolled else f"P{page}"}]}
+
+    monkeypatch.setattr(grid_scraper, "extract_grid_page", extract_grid_page)
+    return calls
+
+
+def test_all_pages_are_stitched_and_synced(monkeypatch, synced):
+    calls = _extract(monkeypatch)
+    grid = Grid(pages=3)
+    result = asyncio.run(PatientGridScraper(Runner(grid)).scrape())
+
+    assert [p["patient_id"] for p in result["patients"]] == [0, 1, 2]
+    assert result["pages"] == 3 and result["complete"] and result["failed_pages"] == []
+    assert result["sync"] == {"inserted": 3}
+    assert len(synced) == 1
+
+    # The digest computed while capturing is handed to extraction, not recomputed
+    settings = get_settings()
+    first_left = calls[0]
+    assert first_left[0] == "page0_left"
+    assert first_left[2] == content_digest(grid.shots[0], settings.phash_mask_regions)
+
+
+@pytest.mark.parametrize("failure", [{"fail": 1}, {"error": 1}])
+def test_failed_page_is_reported_and_not_synced(monkeypatch, synced, failure):
+    _extract(monkeypatch, **failure)
+    result = asyncio.run(PatientGridScraper(Runner(Grid(pages=3))).scrape())
+
+    assert result["failed_pages"] == [2]
+    assert not result["complete"]
+    assert result["sync"] is None and synced == []
+    assert [p["patient_id"] for p in result["patients"]] == [0, 2]
+
+
+def test_scrape_fails_when_every_page_fails(monkeypatch, synced):
+    _extract(monkeypatch, fail=0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(PatientGridScraper(Runner(Grid(pages=1))).scrape())
+    assert synced == []
+
+
+def test_page_tasks_are_cancelled_when_scrolling_fails(monkeypatch, synced):
+    async def scenario():
+        block = asyncio.Event()
+        calls = _extract(monkeypatch, block=block)
+        with pytest.raises(RuntimeError):
+            await PatientGridScraper(Runner(Grid(pages=5, fail_scroll_at=1))).scrape()
+        # Checked before asyncio.run would cancel leftover tasks itself
+        return list(calls)
+
+    calls = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert ("cancelled", "page0_left", None) in calls
+    assert synced == []
+
+
+def test_grid_pages_bypass_the_near_duplicate_index(monkeypatch):
+    """Adjacent pages sharing most rows must not be answered with each other's rows."""
+    requests = []
+
+    class Response:
+        def __init__(self, n):
+            self.n = n
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"content": [{"type": "text", "text": f'{{"patients": [{{"patient_id": {self.n}}}]}}'}]}
+
+    class Client:
+        async def post(self, url, headers, json, timeout):
+            requests.append(json)
+            return Response(len(requests))
+
+    # Every screenshot counts as a near-duplicate of every other one
+    index = NearDuplicateIndex(max_distance=10 ** 6)
+    monkeypatch.setattr(anthropic_processor, "get_near_duplicate_index", lambda: index)
+    monkeypatch.setattr(anthropic_processor, "get_extraction_cache", lambda: None)
+    monkeypatch.setattr(anthropic_processor, "get_http_client", lambda: Client())
+
+    async def scenario():
+        grid = Grid(pages=2)
+        pages = []
+        for _ in range(2):
+            png = await grid.screenshot()
+            pages.append(f"data:image/png;base64,{base64.b64encode(png).decode('ascii')}")
+            await grid.scroll_down(1)
+
+        token = extraction_scope.set("run")
+        try:
+            grid_rows = [await anthropic_processor.extract_patient_grid(page, "key") for page in pages]
+            other = [await anthropic_processor.extract_patient_data(page, "key") for page in pages]
+        finally:
+            extraction_scope.reset(token)
+        return grid_rows, other
+
+    grid_rows, other = asyncio.run(scenario())
+    assert grid_rows[0] != grid_rows[1]
+    # Other extractions still reuse near-identical screens within a run
+    assert other[0] == other[1]
+    assert len(requests) == 3
@@ -0,0 +1,84 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from app.api.image_hash import (
+    NearDuplicateIndex,
+    content_digest,
+    dhash,
+    drop_near_duplicates,
+    hamming,
+    page_fingerprints,
+)
+
+TASKBAR = [(0.0, 0.9, 1.0, 1.0)]
+
+
+def _screen(text_box=None, clock=None) -> bytes:
+    """A 200x100 white screen with optional dark boxes standing in for text."""
+    img = Image.new("RGB", (200, 100), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([10, 10, 190, 30], fill="navy")
+    for box in (text_box, clock):
+        if box:
+            draw.rectangle(box, fill="black")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_masked_regions_do_not_change_hashes():
+    plain, ticking = _screen(), _screen(clock=[170, 92, 190, 98])
+    assert dhash(plain, TASKBAR, 8) == dhash(ticking, TASKBAR, 8)
+    assert content_digest(plain, TASKBAR) == content_digest(ticking, TASKBAR)
+    assert content_digest(plain) != content_digest(ticking)
+
+
+def test_digest_sees_small_text_changes_dhash_does_not():
+    before, after = _screen(text_box=[20, 50, 22, 52]), _screen(text_box=[20, 50, 23, 52])
+    assert hamming(dhash(before, hash_size=8), dhash(after, hash_size=8)) <= 6
+    assert content_digest(before) != content_digest(after)
+
+
+def test_page_fingerprints_match_the_separate_hashes():
+    png = _screen(text_box=[40, 40, 120, 60])
+    assert page_fingerprints(png, TASKBAR, 8) == (dhash(png, TASKBAR, 8), content_digest(png, TASKBAR))
+
+
+def test_lookup_matches_within_distance_and_namespace():
+    index = NearDuplicateIndex(max_distance=2)
+    run_a = index.namespace("prompt", "model", "run-a")
+    index.add(run_a, [0b1111], {"name": "Jane"})
+
+    assert index.lookup(run_a, [0b1110]) == {"name": "Jane"}
+    assert index.lookup(run_a, [0b0000]) is None
+    assert index.lookup(index.namespace("prompt", "model", "run-b"), [0b1111]) is None
+    assert index.lookup(index.namespace("other", "model", "run-a"), [0b1111]) is None
+
+
+def test_lookup_prefers_the_closest_entry_and_copies_it():
+    index = NearDuplicateIndex(max_distance=4)
+    namespace = index.namespace("prompt", "model", "run")
+    index.add(namespace, [0b1000], {"n": "far"})
+    index.add(namespace, [0b1111], {"n": "near"})
+
+    hit = index.lookup(namespace, [0b1110])
+    assert hit == {"n": "near"}
+    hit["n"] = "changed"
+    assert index.lookup(namespace, [0b1111]) == {"n": "near"}
+
+
+def test_entries_expire_and_are_bounded():
+    expired = NearDuplicateIndex(ttl=-1)
+    expired.add("ns", [1], {"a": 1})
+    assert expired.lookup("ns", [1]) is None
+
+    bounded = NearDuplicateIndex(max_distance=0, max_entries=2)
+    for value in (1, 2, 3):
+        bounded.add("ns", [value], {"v": value})
+    assert bounded.lookup("ns", [1]) is None
+    assert bounded.lookup("ns", [3]) == {"v": 3}
+
+
+def test_drop_near_duplicates_keeps_the_first_of_each_group():
+    assert drop_near_duplicates([0b0000, 0b0001, 0b1111, 0b1110], max_distance=1) == [0, 2]
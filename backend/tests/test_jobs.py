@@ -0,0 +1,166 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import jobs, routes
+from app.api.jobs import Job, JobScheduler, QueueFullError, SandboxQueue
+from app.api.workflow import APIResult, Workflow
+
+WORKFLOW = Workflow(
+    name="test",
+    log_prefix="Test",
+    trajectory_prefix="test",
+    instructions="",
+    steps=[],
+    stages={"default": []},
+    assemble=lambda results: results,
+)
+
+
+def _job(client_id: str, n: int) -> Job:
+    return Job(id=f"{client_id}{n}", workflow=WORKFLOW, params={}, client_id=client_id, sandbox_name="sb")
+
+
+class FakeRunner:
+    """Records the order jobs run in instead of driving a sandbox."""
+    ran = []
+
+    def __init__(self, workflow, params=None, **kwargs):
+        self.params = params
+        self.stop_requested = False
+        self.sandbox_failed = False
+        self.logs = []
+        self.events_sent = 0
+
+    async def run(self) -> APIResult:
+        FakeRunner.ran.append(self.params["n"])
+        return APIResult(status="success", data={"n": self.params["n"]})
+
+    async def stop(self) -> None:
+        self.stop_requested = True
+
+
+class FakeRouter:
+    def choose(self, loads, patient=None):
+        return "sb"
+
+    def record_success(self, name):
+        pass
+
+    def record_failure(self, name):
+        return False
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    FakeRunner.ran = []
+    monkeypatch.setattr(jobs, "WorkflowRunner", FakeRunner)
+    monkeypatch.setattr(jobs, "get_sandbox_router", lambda: FakeRouter())
+    return JobScheduler(max_pending=2)
+
+
+def test_queue_rotates_between_clients():
+    async def scenario():
+        queue = SandboxQueue("sb", max_pending=10)
+        for job in (_job("a", 1), _job("a", 2), _job("a", 3), _job("b", 1), _job("c", 1)):
+            await queue.put(job)
+        return [(await queue.get()).id for _ in range(5)]
+
+    assert asyncio.run(scenario()) == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_queue_position_follows_the_rotation():
+    async def scenario():
+        queue = SandboxQueue("sb", max_pending=10)
+        a1, a2, b1 = _job("a", 1), _job("a", 2), _job("b", 1)
+        for job in (a1, a2, b1):
+            await queue.put(job)
+        return queue.position(a1), queue.position(b1), queue.position(a2)
+
+    assert asyncio.run(scenario()) == (0, 1, 2)
+
+
+def test_queue_rejects_jobs_past_max_pending_unless_forced():
+    async def scenario():
+        queue = SandboxQueue("sb", max_pending=1)
+        await queue.put(_job("a", 1))
+        with pytest.raises(QueueFullError):
+            await queue.put(_job("b", 1))
+        await queue.put(_job("b", 1), force=True)
+        return len(queue)
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_removed_job_is_not_dispatched():
+    async def scenario():
+        queue = SandboxQueue("sb", max_pending=10)
+        a1, b1 = _job("a", 1), _job("b", 1)
+        await queue.put(a1)
+        await queue.put(b1)
+        assert await queue.remove(a1)
+        assert not await queue.remove(a1)
+        return (await queue.get()).id, len(queue)
+
+    assert asyncio.run(scenario()) == ("b1", 0)
+
+
+def test_scheduler_runs_a_burst_fairly(scheduler):
+    async def scenario():
+        await scheduler.start(["sb"])
+        scheduler.max_pending = scheduler._queues["sb"].max_pending = 10
+        submitted = [
+            await scheduler.submit(WORKFLOW, params={"n": n}, client_id=client, sandbox_name="sb")
+            for n, client in enumerate(["a", "a", "a", "b"])
+        ]
+        await asyncio.gather(*(job.wait(timeout=5) for job in submitted))
+        await scheduler.close()
+        return [job.status for job in submitted]
+
+    assert asyncio.run(scenario()) == [jobs.SUCCEEDED] * 4
+    assert FakeRunner.ran == [0, 3, 1, 2]
+
+
+def test_scheduler_admission_is_bounded(scheduler):
+    async def scenario():
+        await scheduler.start([])
+        # No workers exist for this sandbox until the first submit, so nothing is dequeued yet
+        for n in range(2):
+            await scheduler.submit(WORKFLOW, params={"n": n}, client_id="a", sandbox_name="sb")
+        try:
+            with pytest.raises(QueueFullError):
+                await scheduler.submit(WORKFLOW, params={"n": 2}, client_id="b", sandbox_name="sb")
+        finally:
+            await scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_scheduler_rejects_missing_params(scheduler):
+    workflow = Workflow(**{**WORKFLOW.__dict__, "params": ["patient_name"]})
+
+    async def scenario():
+        await scheduler.start([])
+        try:
+            with pytest.raises(ValueError):
+                await scheduler.submit(workflow, params={"patient_name": ""}, sandbox_name="sb")
+        finally:
+            await scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_maps_to_429(monkeypatch):
+    class Saturated:
+        async def submit(self, *args, **kwargs):
+            raise QueueFullError("Sandbox 'sb' already has 2 pending job(s)")
+
+    monkeypatch.setattr(routes, "get_job_scheduler", lambda: Saturated())
+    request = SimpleNamespace(headers={}, client=None)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(routes._submit(request, "patients"))
+    assert raised.value.status_code == 429
+    assert raised.value.headers == {"Retry-After": "30"}
@@ -0,0 +1,49 @@
+import json
+
+from app.api.json_stream import IncrementalJSONParser
+
+DOCUMENT = json.dumps({
+    "patient": {"name": "Smith, Jane", "note": "says \"hi\" {not a row}"},
+    "patients": [{"patient_id": 1, "tags": [{"t": "a"}]}, {"patient_id": 2, "name": "O'Brien [Jr]"}],
+    "account": {"transactions": [{"amount": 12.5}, {"amount": -3}]},
+})
+
+
+def _feed(text: str, size: int):
+    parser = IncrementalJSONParser()
+    rows = []
+    for start in range(0, len(text), size):
+        rows.extend(parser.feed(text[start:start + size]))
+    return rows
+
+
+def test_rows_are_reported_with_their_array_path():
+    assert _feed(DOCUMENT, len(DOCUMENT)) == [
+        ("patients", {"patient_id": 1, "tags": [{"t": "a"}]}),
+        ("patients", {"patient_id": 2, "name": "O'Brien [Jr]"}),
+        ("account.transactions", {"amount": 12.5}),
+        ("account.transactions", {"amount": -3}),
+    ]
+
+
+def test_chunk_boundaries_do_not_matter():
+    expected = _feed(DOCUMENT, len(DOCUMENT))
+    for size in (1, 2, 3, 7, 64):
+        assert _feed(DOCUMENT, size) == expected
+
+
+def test_rows_are_reported_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"patients": [{"patient_id": 1}') == [("patients", {"patient_id": 1})]
+    assert parser.feed(', {"patient_id": 2') == []
+    assert parser.feed("}]}") == [("patients", {"patient_id": 2})]
+
+
+def test_text_around_the_document_is_ignored():
+    text = '```json\n{"patients": [{"patient_id": 1}]}\n```\n{"patients": [{"patient_id": 2}]}'
+    assert _feed(text, 5) == [("patients", {"patient_id": 1})]
+
+
+def test_escaped_quotes_and_backslashes_stay_inside_strings():
+    text = r'{"rows": [{"note": "a \\\" } ] \\"}, {"note": "b"}]}'
+    assert _feed(text, 1) == [("rows", json.loads(text)["rows"][0]), ("rows", {"note": "b"})]
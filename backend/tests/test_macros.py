@@ -0,0 +1,49 @@
+from app.api.macros import Macro, MacroAction, MacroRecorder, expand_params
+from app.cua.ui_state import same_patient
+
+
+def _record(text: str, name: str = "Smith, Jane", strict: bool = True) -> MacroRecorder:
+    recorder = MacroRecorder("reports__select", {"patient_name": name}, None, False, strict=strict)
+    recorder.on_action({"type": "type", "text": text})
+    return recorder
+
+
+def test_name_parts_are_expanded_regardless_of_order():
+    for name in ("Smith, Jane", "Jane Smith", "  Smith,Jane A "):
+        params = expand_params({"patient_name": name})
+        assert params["patient_name_last"] == "Smith"
+        assert params["patient_name_first"] == "Jane"
+
+
+def test_partial_names_are_parameterized():
+    assert _record("Smith").actions[0].action["text"] == "{patient_name_last}"
+    assert _record("jane").actions[0].action["text"] == "{patient_name_first}"
+    assert _record("Smith, Jane").actions[0].action["text"] == "{patient_name}"
+
+
+def test_strict_recorder_drops_macros_with_literal_text():
+    recorder = _record("Smi")
+    assert recorder.typed_literal
+    assert recorder.compile() is None
+
+    assert _record("Smi", strict=False).compile() is not None
+
+
+def test_name_inside_a_word_is_not_replaced():
+    assert _record("Smithson").actions[0].action["text"] == "Smithson"
+
+
+def test_literal_text_detection_on_stored_macros():
+    literal = Macro(key="k", actions=[MacroAction(action={"type": "type", "text": "Smith"})])
+    placeholder = Macro(key="k", actions=[MacroAction(action={"type": "type", "text": "{patient_name_last}\n"})])
+    escaped = Macro(key="k", actions=[MacroAction(action={"type": "type", "text": "{{x}}"})])
+
+    assert literal.types_literal_text()
+    assert not placeholder.types_literal_text()
+    assert escaped.types_literal_text()
+
+
+def test_same_patient_ignores_order_and_punctuation():
+    assert same_patient("Jane Smith", "Smith, Jane A")
+    assert not same_patient("Jane Smith", "Smith, John")
+    assert not same_patient("Jane Smith", None)
@@ -0,0 +1,91 @@
+from app.api.anthropic_processor import merge_patient_grids
+
+
+def test_rows_are_joined_by_patient_id():
+    left = {"patients": [
+        {"patient_id": 1, "last_name": "Smith", "home_phone": None},
+        {"patient_id": 2, "last_name": "Jones", "home_phone": None},
+    ]}
+    right = {"patients": [
+        {"patient_id": 2, "last_name": None, "home_phone": "555-0102"},
+        {"patient_id": 1, "last_name": None, "home_phone": "555-0101"},
+    ]}
+
+    merged = merge_patient_grids(left, right)
+
+    assert merged["total_count"] == 2
+    assert merged["patients"] == [
+        {"patient_id": 1, "last_name": "Smith", "home_phone": "555-0101"},
+        {"patient_id": 2, "last_name": "Jones", "home_phone": "555-0102"},
+    ]
+
+
+def test_left_values_are_not_overwritten():
+    left = {"patients": [{"patient_id": 1, "status": "Patient"}]}
+    right = {"patients": [{"patient_id": 1, "status": "Inactive"}]}
+
+    merged = merge_patient_grids(left, right)
+
+    assert merged["patients"] == [{"patient_id": 1, "status": "Patient"}]
+
+
+def test_rows_without_patient_id_are_appended_not_joined_by_position():
+    left = {"patients": [
+        {"patient_id": None, "last_name": "Smith", "home_phone": None},
+        {"patient_id": 2, "last_name": "Jones", "home_phone": None},
+    ]}
+    right = {"patients": [
+        {"patient_id": None, "last_name": None, "home_phone": "555-0199"},
+    ]}
+
+    merged = merge_patient_grids(left, right)
+
+    assert merged["total_count"] == 3
+    assert merged["patients"][0]["home_phone"] is None
+    assert merged["patients"][2] == {"patient_id": None, "last_name": None, "home_phone": "555-0199"}
+
+
+def test_skipped_row_does_not_shift_later_rows():
+    # The right-hand extraction missed patient 2
+    left = {"patients": [
+        {"patient_id": 1, "home_phone": None},
+        {"patient_id": 2, "home_phone": None},
+        {"patient_id": 3, "home_phone": None},
+    ]}
+    right = {"patients": [
+        {"patient_id": 1, "home_phone": "555-0101"},
+        {"patient_id": 3, "home_phone": "555-0103"},
+    ]}
+
+    merged = merge_patient_grids(left, right)
+
+    phones = {p["patient_id"]: p["home_phone"] for p in merged["patients"]}
+    assert phones == {1: "555-0101", 2: None, 3: "555-0103"}
+
+
+def test_unmatched_patient_id_is_appended():
+    left = {"patients": [{"patient_id": 1, "last_name": "Smith"}]}
+    right = {"patients": [{"patient_id": 9, "last_name": None, "city": "Portland"}]}
+
+    merged = merge_patient_grids(left, right)
+
+    assert [p["patient_id"] for p in merged["patients"]] == [1, 9]
+
+
+def test_inputs_are_not_mutated():
+    left = {"patients": [{"patient_id": 1, "home_phone": None}]}
+    right = {"patients": [{"patient_id": 1, "home_phone": "555-0101"}]}
+
+    merge_patient_grids(left, right)
+
+    assert left["patients"][0]["home_phone"] is None
+
+
+def test_one_failed_side_returns_the_other():
+    good = {"patients": [{"patient_id": 1}]}
+    failed = {"error": "API error: 529"}
+
+    assert merge_patient_grids(failed, good) is good
+    assert merge_patient_grids(good, failed) is good
+    assert merge_patient_grids(good, {}) is good
+    assert "error" in merge_patient_grids(failed, {"error": "timeout"})
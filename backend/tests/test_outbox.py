@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from app.websocket.outbox import Outbox
+
+
+class Socket:
+    """Collects what the writer sends; ``paused`` stands in for a client that stopped reading."""
+
+    def __init__(self, paused: bool = False):
+        self.sent = []
+        self.resume = asyncio.Event()
+        if not paused:
+            self.resume.set()
+
+    async def send_text(self, text: str) -> None:
+        await self.resume.wait()
+        self.sent.append(json.loads(text))
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.resume.wait()
+        self.sent.append(data)
+
+
+def _screenshot(step: int, run_id: str = "run") -> dict:
+    return {"type": "screenshot", "payload": {"image_data": f"data:image/png;base64,{step}", "step": step}, "run_id": run_id}
+
+
+def _log(n: int) -> dict:
+    return {"type": "api_log", "payload": {"message": f"log {n}"}, "run_id": "run"}
+
+
+def _status(n: int) -> dict:
+    return {"type": "status", "payload": {"status": "running", "n": n}, "run_id": "run"}
+
+
+async def _drain() -> None:
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_queued_screenshot_is_replaced_by_the_newest_one_per_run():
+    async def scenario():
+        socket = Socket(paused=True)
+        outbox = Outbox(socket)
+        outbox.put(_screenshot(1))
+        outbox.put(_status(1))
+        outbox.put(_screenshot(2))
+        outbox.put(_screenshot(9, run_id="other"))
+        outbox.start()
+        socket.resume.set()
+        await _drain()
+        await outbox.close()
+        return socket.sent, outbox.stats()
+
+    sent, stats = asyncio.run(scenario())
+    assert [(m["type"], m["payload"].get("step"), m["run_id"]) for m in sent] == [
+        ("screenshot", 2, "run"),
+        ("status", None, "run"),
+        ("screenshot", 9, "other"),
+    ]
+    assert stats["coalesced"] == 1 and stats["sent"] == 3
+
+
+def test_full_queue_drops_logs_but_keeps_other_messages():
+    async def scenario():
+        outbox = Outbox(Socket(paused=True), max_size=2, hard_limit=10)
+        assert outbox.put(_log(1))
+        assert outbox.put(_status(1))
+        # Incoming log is dropped while the queue is full
+        assert not outbox.put(_log(2))
+        # A status makes room by dropping the oldest queued log
+        assert outbox.put(_status(2))
+        queued = [entry[1].data for entry in outbox._queue]
+        await outbox.close()
+        return queued, outbox.stats()
+
+    queued, stats = asyncio.run(scenario())
+    assert queued == [_status(1), _status(2)]
+    assert stats["dropped"] == 2
+
+
+def test_client_that_stops_reading_is_disconnected():
+    async def scenario():
+        closed = []
+
+        async def on_close(websocket):
+            closed.append(websocket)
+
+        socket = Socket(paused=True)
+        outbox = Outbox(socket, max_size=2, hard_limit=3, on_close=on_close)
+        outbox.start()
+        results = [outbox.put(_status(n)) for n in range(5)]
+        await _drain()
+        return results, closed == [socket], outbox.closed
+
+    results, disconnected, closed = asyncio.run(scenario())
+    # Statuses are never dropped: past max_size they queue up to the hard limit, then the client is cut off
+    assert results == [True, True, True, False, False]
+    assert disconnected and closed
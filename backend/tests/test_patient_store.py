@@ -0,0 +1,94 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.api import patient_store
+from app.api.patient_store import PatientStore, extract_grid_page
+
+JANE = {"patient_id": 1, "first_name": "Jane", "last_name": "Smith", "age": "41", "city": "Austin", "status": "Patient"}
+JOHN = {"patient_id": 2, "first_name": "John", "last_name": "Doe", "age": 35, "city": "Boston", "status": "Inactive"}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = PatientStore(":memory:")
+    monkeypatch.setattr(patient_store, "get_patient_store", lambda: store)
+    yield store
+    store.close()
+
+
+def test_upsert_counts_inserts_updates_and_no_ops(store):
+    assert store.upsert_patients([JANE, JOHN, {"first_name": "No PatNum"}]) == {
+        "inserted": 2, "updated": 0, "unchanged": 0, "skipped": 1,
+    }
+    moved = {**JANE, "city": "Dallas"}
+    assert store.upsert_patients([moved, JOHN]) == {"inserted": 0, "updated": 1, "unchanged": 1, "skipped": 0}
+
+    assert store.get_patient(1)["city"] == "Dallas"
+    assert store.get_patient(1)["age"] == 41
+    assert store.count() == 2
+
+
+def test_query_filters_sorts_and_pages(store):
+    store.upsert_patients([JANE, JOHN])
+
+    assert [p["patient_id"] for p in store.query(search="smi")[0]] == [1]
+    assert [p["patient_id"] for p in store.query(search="2")[0]] == [2]
+    assert [p["patient_id"] for p in store.query(status="inactive")[0]] == [2]
+    assert [p["patient_id"] for p in store.query(sort="-age")[0]] == [1, 2]
+
+    page, total = store.query(limit=1, offset=1, sort="last_name")
+    assert total == 2 and [p["last_name"] for p in page] == ["Smith"]
+    with pytest.raises(ValueError):
+        store.query(sort="fingerprint; DROP TABLE patients")
+
+
+def test_stored_pages_expire(store):
+    store.set_page("grid_left", "digest", {"patients": [JANE]})
+    assert store.get_page("grid_left", max_age=60) == ("digest", {"patients": [JANE]})
+    assert store.get_page("grid_left", max_age=-1) is None
+    assert store.get_page("grid_left", max_age=60) is None
+
+
+def _grid(rows: str) -> str:
+    """A grid screenshot whose rows are drawn as the given characters."""
+    img = Image.new("RGB", (160, 80), "white")
+    draw = ImageDraw.Draw(img)
+    for line, text in enumerate(rows.splitlines()):
+        draw.text((4, 4 + line * 12), text, fill="black")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+def _extract_grid_page(monkeypatch, screenshots):
+    calls = []
+
+    async def extract_patient_grid(screenshot, api_key, scrolled=False):
+        calls.append(screenshot)
+        return {"patients": [{"patient_id": len(calls)}]}
+
+    monkeypatch.setattr(patient_store, "extract_patient_grid", extract_patient_grid)
+
+    async def scenario():
+        return [await extract_grid_page("grid_left", screenshot, "key") for screenshot in screenshots]
+
+    return asyncio.run(scenario()), calls
+
+
+def test_identical_page_reuses_the_stored_extraction(monkeypatch, store):
+    page = _grid("1 Smith Jane 555-0101\n2 Doe John 555-0102")
+    results, calls = _extract_grid_page(monkeypatch, [page, page])
+    assert len(calls) == 1
+    assert results[0] == results[1]
+
+
+def test_a_changed_phone_number_is_extracted_again(monkeypatch, store):
+    before = _grid("1 Smith Jane 555-0101\n2 Doe John 555-0102")
+    after = _grid("1 Smith Jane 555-0101\n2 Doe John 555-0108")
+    results, calls = _extract_grid_page(monkeypatch, [before, after])
+    assert len(calls) == 2
+    assert results[1] == {"patients": [{"patient_id": 2}]}
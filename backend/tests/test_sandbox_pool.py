@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from app.cua import sandbox_pool
+from app.cua.sandbox_pool import SandboxPool
+
+
+class FakeComputer:
+    """Stands in for a cloud Computer session."""
+    connect_delay = 0.0
+    fail_connect = False
+    created = []
+
+    def __init__(self, **kwargs):
+        self.healthy = True
+        self.disconnected = False
+        self.interface = self
+        FakeComputer.created.append(self)
+
+    async def run(self) -> None:
+        await asyncio.sleep(FakeComputer.connect_delay)
+        if FakeComputer.fail_connect:
+            raise ConnectionError("sandbox unreachable")
+
+    async def get_screen_size(self):
+        if not self.healthy:
+            raise ConnectionError("gone")
+        return {"width": 1024, "height": 768}
+
+    async def disconnect(self) -> None:
+        self.disconnected = True
+
+
+@pytest.fixture(autouse=True)
+def fake_computer(monkeypatch):
+    FakeComputer.connect_delay = 0.0
+    FakeComputer.fail_connect = False
+    FakeComputer.created = []
+    monkeypatch.setattr(sandbox_pool, "Computer", FakeComputer)
+
+
+def test_released_connection_is_reused():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=0, max_size=1)
+        first = await pool.acquire()
+        await pool.release(first)
+        second = await pool.acquire()
+        return first is second, second.lease_count, pool.stats()
+
+    same, leases, stats = asyncio.run(scenario())
+    assert same and leases == 2
+    assert stats["size"] == 1 and stats["leased"] == 1
+    assert len(FakeComputer.created) == 1
+
+
+def test_acquire_waits_for_a_free_slot():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=0, max_size=1)
+        held = await pool.acquire()
+        with pytest.raises(TimeoutError):
+            await pool.acquire(timeout=0.05)
+
+        waiter = asyncio.create_task(pool.acquire(timeout=1))
+        await asyncio.sleep(0.01)
+        await pool.release(held)
+        return await waiter is held
+
+    assert asyncio.run(scenario())
+
+
+def test_failed_connect_frees_the_slot():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=0, max_size=1)
+        FakeComputer.fail_connect = True
+        with pytest.raises(ConnectionError):
+            await pool.acquire()
+        FakeComputer.fail_connect = False
+        await pool.acquire(timeout=0.1)
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["size"] == 1 and stats["leased"] == 1
+
+
+def test_cancelled_connect_frees_the_slot():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=0, max_size=1)
+        FakeComputer.connect_delay = 10
+        pending = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        stats = pool.stats()
+        FakeComputer.connect_delay = 0
+        await pool.acquire(timeout=0.1)
+        return stats
+
+    assert asyncio.run(scenario()) == {"size": 0, "idle": 0, "leased": 0, "min_size": 0, "max_size": 1}
+
+
+def test_failed_lease_with_dead_connection_is_discarded():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=0, max_size=1)
+        sandbox = await pool.acquire()
+        sandbox.computer.healthy = False
+        kept = await pool.release(sandbox, failed=True)
+        return kept, sandbox.computer.disconnected, pool.stats()
+
+    kept, disconnected, stats = asyncio.run(scenario())
+    assert not kept and disconnected
+    assert stats["size"] == 0 and stats["leased"] == 0
+
+
+def test_lease_context_marks_errors_as_failed():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=0, max_size=1)
+        with pytest.raises(RuntimeError):
+            async with pool.lease() as sandbox:
+                sandbox.computer.healthy = False
+                raise RuntimeError("agent crashed")
+        return pool.stats()
+
+    assert asyncio.run(scenario())["size"] == 0
+
+
+def test_start_warms_and_close_disconnects():
+    async def scenario():
+        pool = SandboxPool("sb", "key", min_size=2, max_size=2)
+        await pool.start()
+        warm = pool.stats()["idle"]
+        await pool.close()
+        with pytest.raises(RuntimeError):
+            await pool.acquire()
+        return warm
+
+    assert asyncio.run(scenario()) == 2
+    assert all(computer.disconnected for computer in FakeComputer.created)
@@ -0,0 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.cua import sandbox_router
+from app.cua.sandbox_router import SandboxRouter
+from app.cua.ui_state import UIStateStore
+
+
+@pytest.fixture(autouse=True)
+def ui_states(monkeypatch):
+    store = UIStateStore()
+    monkeypatch.setattr(sandbox_router, "get_ui_state_store", lambda: store)
+    return store
+
+
+def test_least_loaded_sandbox_wins():
+    router = SandboxRouter(["a", "b", "c"])
+    assert router.choose({"a": 2, "b": 0, "c": 1}) == "b"
+
+
+def test_ties_rotate_across_sandboxes():
+    router = SandboxRouter(["a", "b"])
+    assert [router.choose({}) for _ in range(4)] == ["a", "b", "a", "b"]
+
+
+def test_affinity_to_the_selected_patient_within_slack(ui_states):
+    router = SandboxRouter(["a", "b"], affinity_slack=1)
+    ui_states.update("b", "smith, jane", "chart", screen_hash=1)
+
+    assert router.choose({"a": 0, "b": 1}, "Smith,  Jane") == "b"
+    assert router.choose({"a": 0, "b": 2}, "Smith, Jane") == "a"
+    assert router.choose({"a": 0, "b": 1}, "Doe, John") == "a"
+
+
+def test_repeated_failures_drain_a_sandbox(ui_states):
+    router = SandboxRouter(["a", "b"], max_failures=2)
+    ui_states.update("a", "smith, jane", "chart", screen_hash=1)
+
+    assert not router.record_failure("a")
+    router.record_success("a")
+    assert not router.record_failure("a")
+    assert router.record_failure("a")
+    assert not router.record_failure("a")
+
+    assert router.healthy() == ["b"]
+    assert router.choose({"a": 0, "b": 5}) == "b"
+    assert ui_states.current_patient("a") is None
+
+
+def test_all_drained_falls_back_to_the_longest_drained():
+    router = SandboxRouter(["a", "b"], max_failures=1)
+    router.record_failure("a")
+    router.record_failure("b")
+    assert router.choose({}) == "a"
+
+
+def test_probe_readmits_a_recovered_sandbox(monkeypatch):
+    class Pool:
+        @asynccontextmanager
+        async def lease(self, timeout=None):
+            yield object()
+
+    monkeypatch.setattr(sandbox_router, "get_sandbox_pool", lambda name: Pool())
+
+    async def scenario():
+        router = SandboxRouter(["a"], max_failures=1, drain_seconds=0, probe_interval=0.01)
+        router.record_failure("a")
+        await router.start()
+        await asyncio.sleep(0.05)
+        await router.close()
+        return router.healthy(), router.sandboxes["a"].consecutive_failures
+
+    assert asyncio.run(scenario()) == (["a"], 0)
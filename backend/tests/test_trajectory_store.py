@@ -0,0 +1,111 @@
+import io
+import os
+import time
+
+from PIL import Image, ImageDraw
+
+from app.api.trajectory_store import TrajectoryStore
+
+
+def _png(box) -> bytes:
+    img = Image.new("RGB", (96, 64), "white")
+    if box:
+        ImageDraw.Draw(img).rectangle(box, fill="black")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Visibly different screens
+LOGIN, SEARCH, CHART = _png([4, 4, 30, 30]), _png([40, 10, 60, 50]), _png([70, 30, 90, 60])
+
+
+def _write(run, relative: str, image: bytes, at: float) -> None:
+    path = os.path.join(run.path, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(image)
+    os.utime(path, (at, at))
+
+
+def _frames(run):
+    return [frame.path for frame in run.frames]
+
+
+def test_sync_indexes_only_new_frames_in_order(tmp_path):
+    store = TrajectoryStore(str(tmp_path))
+    run = store.create_run("reports")
+    now = time.time()
+    _write(run, "turn_001/a.png", LOGIN, now - 3)
+
+    assert run.sync() == 1
+    assert run.sync() == 0
+    _write(run, "turn_002/b.png", SEARCH, now - 2)
+    _write(run, "turn_001/c.png", SEARCH, now - 1)
+
+    assert run.sync() == 2
+    assert _frames(run) == ["turn_001/a.png", "turn_002/b.png", "turn_001/c.png"]
+    assert store.latest_frame(run) == os.path.join(run.path, "turn_001/c.png")
+
+
+def test_manifests_are_reloaded_and_rebuilt(tmp_path):
+    store = TrajectoryStore(str(tmp_path))
+    run = store.create_run("chart")
+    _write(run, "turn_001/a.png", LOGIN, time.time())
+    store.finish(run)
+
+    legacy = os.path.join(str(tmp_path), "legacy_run", "turn_001")
+    os.makedirs(legacy)
+    with open(os.path.join(legacy, "x.png"), "wb") as f:
+        f.write(CHART)
+    os.makedirs(os.path.join(str(tmp_path), "macros"))
+
+    reloaded = TrajectoryStore(str(tmp_path))
+    reloaded.load()
+    assert set(reloaded.runs) == {run.run_id, "legacy_run"}
+    assert _frames(reloaded.runs[run.run_id]) == ["turn_001/a.png"]
+    assert reloaded.runs["legacy_run"].finished_at is not None
+    assert os.path.exists(os.path.join(str(tmp_path), "legacy_run", "manifest.json"))
+
+
+def test_compaction_keeps_the_last_changed_frame_of_each_turn(tmp_path):
+    store = TrajectoryStore(str(tmp_path), compact_after=0)
+    run = store.create_run("reports")
+    now = time.time() - 100
+    _write(run, "turn_001/a.png", LOGIN, now)
+    _write(run, "turn_001/b.png", SEARCH, now + 1)
+    # A turn whose final screen did not change from the previous turn's
+    _write(run, "turn_002/c.png", SEARCH, now + 2)
+    _write(run, "turn_003/d.png", CHART, now + 3)
+    # The final frame stays even if it looks like the one before
+    _write(run, "turn_004/e.png", CHART, now + 4)
+    store.finish(run)
+    run.finished_at = now + 5
+
+    store.sweep()
+    assert run.compacted
+    assert _frames(run) == ["turn_001/b.png", "turn_003/d.png", "turn_004/e.png"]
+    assert not os.path.exists(os.path.join(run.path, "turn_001/a.png"))
+    assert not os.path.exists(os.path.join(run.path, "turn_002/c.png"))
+    assert all(frame.hash for frame in run.frames)
+
+
+def test_retention_removes_old_runs_then_the_oldest_over_budget(tmp_path):
+    store = TrajectoryStore(str(tmp_path), max_age=3600, max_bytes=2 * len(LOGIN), compact_after=10 ** 9)
+    now = time.time()
+    runs = []
+    for n, age in enumerate((7200, 300, 200, 100)):
+        run = store.create_run(f"run{n}")
+        _write(run, "turn_001/a.png", LOGIN, now - age)
+        store.finish(run)
+        run.created_at = now - age
+        runs.append(run)
+    # Still running: never removed for size
+    active = store.create_run("active")
+    _write(active, "turn_001/a.png", LOGIN, now)
+    active.sync()
+    active.created_at = now - 400
+
+    store.sweep()
+    assert set(store.runs) == {runs[3].run_id, active.run_id}
+    assert not os.path.exists(runs[0].path)
@@ -0,0 +1,91 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from app.api import workflow as workflow_module
+from app.api.image_hash import dhash
+from app.api.workflow import Workflow, WorkflowRunner, WorkflowStep
+from app.cua.ui_state import UIStateStore
+
+CHART_STEP = WorkflowStep(
+    name="Select Patient & Chart",
+    task="Select {patient_name} and open the Chart",
+    capture="chart",
+    module="chart",
+    selects_patient=True,
+    resume_task="Open the Chart",
+)
+
+CHART = Workflow(
+    name="chart",
+    log_prefix="Chart",
+    trajectory_prefix="chart",
+    instructions="",
+    steps=[CHART_STEP],
+    stages={"default": []},
+    assemble=lambda results: results,
+    params=["patient_name"],
+)
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Interface:
+    async def screenshot(self) -> bytes:
+        return _png()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = UIStateStore()
+    monkeypatch.setattr(workflow_module, "get_ui_state_store", lambda: store)
+    settings = workflow_module.get_settings()
+    # The sandbox was left on Jane Smith's chart with this very screen
+    store.update("sb", "jane smith", "chart", dhash(_png(), settings.phash_mask_regions, settings.phash_hash_size))
+    return store
+
+
+def _restore(monkeypatch, shown_name):
+    reads = []
+
+    async def read_selected_patient(screenshot, api_key):
+        reads.append(screenshot)
+        return {"patient_name": shown_name, "patient_id": 7}
+
+    monkeypatch.setattr(workflow_module, "read_selected_patient", read_selected_patient)
+    runner = WorkflowRunner(CHART, params={"patient_name": "Jane Smith"}, sandbox_name="sb")
+    runner.computer = SimpleNamespace(interface=Interface())
+    asyncio.run(runner._restore_ui_state())
+    return runner, reads
+
+
+def test_matching_title_bar_keeps_the_shortcut(monkeypatch, store):
+    runner, reads = _restore(monkeypatch, "Smith, Jane")
+    assert len(reads) == 1
+    assert runner._plan_step(CHART_STEP) == ("skip", None)
+
+
+def test_other_patient_on_screen_forces_the_full_plan(monkeypatch, store):
+    runner, _ = _restore(monkeypatch, "Smith, John")
+    assert runner.ui_patient is None
+    assert runner._plan_step(CHART_STEP) == ("full", "Select Jane Smith and open the Chart")
+    assert store.current_patient("sb") is None
+
+
+def test_unreadable_title_bar_forces_the_full_plan(monkeypatch, store):
+    runner, _ = _restore(monkeypatch, None)
+    assert runner._plan_step(CHART_STEP)[0] == "full"
+
+
+def test_title_bar_is_not_read_for_another_patient(monkeypatch, store):
+    store.update("sb", "john doe", "chart", store.get("sb").screen_hash)
+    runner, reads = _restore(monkeypatch, "Doe, John")
+    assert reads == []
+    assert runner._plan_step(CHART_STEP)[0] == "full"